@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+微基准：数值传感器序列的存储和查询开销
+
+对比两种方式在百万级读数上的写入、窗口统计和降采样：
+保存消息字典列表（ISO时间戳 + JSON载荷，查询时逐条解析），
+与按批写入float64数组、查询时二分定位切片并向量化计算的ColumnarStore。
+
+用法:
+    python benchmarks/bench_columnar_store.py [--points 1000000] [--window 0.25]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.columnar_store import ColumnarStore, NUMPY_AVAILABLE
+
+TOPIC = "classroom/temperature"
+
+
+def dict_list_stats(messages, since):
+    """逐条解析时间戳和载荷后计算统计，与原来基于消息列表的做法相同"""
+    values = []
+    for message in messages:
+        if datetime.fromisoformat(message["timestamp"]).timestamp() >= since:
+            values.append(float(json.loads(message["payload"])["temperature"]))
+    ordered = sorted(values)
+    return {
+        "count": len(values),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": statistics.fmean(values),
+        "std": statistics.pstdev(values),
+        "p95": ordered[int(0.95 * (len(ordered) - 1))]
+    }
+
+
+def dict_list_range(messages, since, max_points):
+    """逐条解析后按等宽时间段降采样"""
+    points = []
+    for message in messages:
+        ts = datetime.fromisoformat(message["timestamp"]).timestamp()
+        if ts >= since:
+            points.append((ts, float(json.loads(message["payload"])["temperature"])))
+    start, end = points[0][0], points[-1][0]
+    width = (end - start) / max_points or 1.0
+    bins = {}
+    for ts, value in points:
+        bins.setdefault(min(int((ts - start) / width), max_points - 1), []).append(value)
+    return [[start + (i + 0.5) * width, sum(v) / len(v), min(v), max(v)] for i, v in sorted(bins.items())]
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar sensor store microbenchmark")
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--window", type=float, default=0.25, help="fraction of the series queried")
+    parser.add_argument("--max-points", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        sys.exit("numpy is required: pip install emqx-mcp-server[columnar]")
+
+    start_ts = float(int(time.time()) - args.points)
+    readings = [(start_ts + i, round(20 + (i % 600) / 100, 2)) for i in range(args.points)]
+    since = start_ts + args.points * (1 - args.window)
+
+    begin = time.perf_counter()
+    messages = [{
+        "topic": TOPIC,
+        "payload": json.dumps({"temperature": value}),
+        "timestamp": datetime.fromtimestamp(ts).isoformat()
+    } for ts, value in readings]
+    list_ingest = time.perf_counter() - begin
+
+    store = ColumnarStore(max_points=args.points)
+    begin = time.perf_counter()
+    for ts, value in readings:
+        store.add(TOPIC, value, ts)
+    store.series(TOPIC).flush()
+    columnar_ingest = time.perf_counter() - begin
+
+    list_stats = timed(lambda: dict_list_stats(messages, since), 1)
+    columnar_stats = timed(lambda: store.stats(TOPIC, since=since), args.repeat)
+    list_range = timed(lambda: dict_list_range(messages, since, args.max_points), 1)
+    columnar_range = timed(lambda: store.range(TOPIC, since=since, max_points=args.max_points), args.repeat)
+    columnar_trend = timed(lambda: store.trend(TOPIC, since=since), args.repeat)
+
+    expected = dict_list_stats(messages, since)
+    actual = store.stats(TOPIC, since=since)
+    assert (expected["count"], expected["max"]) == (actual["count"], actual["max"])
+
+    print(f"{args.points} readings, querying the newest {args.window:.0%}")
+    print(f"{'':<22}{'dict list':>12}{'columnar':>12}{'speedup':>10}")
+    for name, baseline, columnar in (("ingest (s)", list_ingest, columnar_ingest),
+                                     ("stats (ms)", list_stats * 1000, columnar_stats * 1000),
+                                     ("range (ms)", list_range * 1000, columnar_range * 1000)):
+        print(f"{name:<22}{baseline:>12.2f}{columnar:>12.2f}{baseline / columnar:>9.1f}x")
+    print(f"{'trend (ms)':<22}{'-':>12}{columnar_trend * 1000:>12.2f}")
+    print(f"columnar memory: {store.memory_bytes() / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+端到端基准：通过MCP客户端协议驱动EMQXMCPServer
+
+每个场景启动一个新的服务器子进程（stdio传输，与MCP客户端实际使用方式相同），
+MQTT broker替身和EMQX HTTP API替身运行在基准进程内。基准按固定速率向broker
+注入设备消息，同时按固定速率（开环，不等待上一次调用返回）调用工具，记录：
+- ingest_msgs_per_second：服务器实际接收并分发的消息速率（来自get_server_metrics），
+  注入速率超过处理能力时低于--message-rate
+- 每个工具的p50/p99（客户端测得的往返耗时，含stdio和JSON-RPC开销）和错误数
+- 服务器进程的CPU占用和常驻内存（来自进程指标）
+
+结果可用--output保存为JSON；与--baseline比较，任一指标变差超过--tolerance
+（且超过该指标的最小绝对差）时标记为回退，进程以退出码1结束。
+
+场景：
+- sensor_ingest：多教室温湿度上报 + get_temperature/get_humidity/get_ac_status
+- subscription_ingest：订阅bench/#后按设备主题上报 + get_mqtt_messages
+- ac_commands：温湿度上报 + 各教室set_ac_temperature（关闭合并和无变化跳过，每次都发布）
+- http_api：publish_mqtt_message/list_mqtt_clients/get_mqtt_client，经EMQX HTTP API替身
+
+用法:
+    python benchmarks/bench_e2e.py [--scenario sensor_ingest ...] [--duration 10]
+        [--message-rate 2000] [--call-rate 20] [--output results.json]
+        [--baseline benchmarks/e2e_baseline.json] [--save-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from mcp import ClientSession, StdioServerParameters  # noqa: E402
+from mcp.client.stdio import stdio_client  # noqa: E402
+
+from emqx_api_stub import EMQXAPIStub  # noqa: E402
+from mqtt_broker_stub import MQTTBrokerStub  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "e2e_baseline.json")
+SERVER_CODE = "from emqx_mcp_server import main; main()"
+ROOMS = [f"room_{i:02d}" for i in range(20)]
+DEVICES = [f"device_{i:03d}" for i in range(200)]
+
+# 指标 -> (越大越好, 视为回退所需的最小绝对差)
+COMPARED_METRICS = {
+    "ingest_msgs_per_second": (True, 50.0),
+    "tool_p50_ms": (False, 1.0),
+    "tool_p99_ms": (False, 5.0),
+    "cpu_percent": (False, 5.0),
+    "rss_mb": (False, 10.0),
+}
+
+
+class Scenario(NamedTuple):
+    """一个基准场景"""
+    name: str
+    env: Dict[str, str]
+    setup: List[Tuple[str, Dict[str, Any]]]
+    # 第n条上报消息 -> (topic, payload)，为None时不注入消息
+    message: Optional[Callable[[int], Tuple[str, bytes]]]
+    # 第n次工具调用 -> (工具名, 参数)
+    call: Callable[[int], Tuple[str, Dict[str, Any]]]
+
+
+def _reading(n: int) -> Tuple[str, bytes]:
+    room = ROOMS[n % len(ROOMS)]
+    if n % 2:
+        return f"classroom/{room}/humidity", json.dumps({"humidity": 40 + n % 20, "sensor_id": room}).encode()
+    return f"classroom/{room}/temperature", json.dumps({"temperature": 20 + n % 80 / 10, "sensor_id": room}).encode()
+
+
+def _telemetry(n: int) -> Tuple[str, bytes]:
+    device = DEVICES[n % len(DEVICES)]
+    return f"bench/{device}/telemetry", json.dumps({"seq": n, "value": n % 1000 / 10}).encode()
+
+
+def _sensor_call(n: int) -> Tuple[str, Dict[str, Any]]:
+    tool = ("get_temperature", "get_humidity", "get_ac_status")[n % 3]
+    return tool, {"room": ROOMS[n % len(ROOMS)], "wait_seconds": 0}
+
+
+SCENARIOS = {
+    "sensor_ingest": Scenario(
+        "sensor_ingest", {"TOOL_GROUPS": "classroom", "CLASSROOM_MULTI_ROOM": "true"},
+        [], _reading, _sensor_call),
+    "subscription_ingest": Scenario(
+        "subscription_ingest", {"TOOL_GROUPS": "subscriptions", "MESSAGE_HISTORY_SIZE": "100"},
+        [("subscribe_mqtt_topic", {"topic": "bench/#"})], _telemetry,
+        lambda n: ("get_mqtt_messages", {"topic": f"bench/{DEVICES[n % len(DEVICES)]}/telemetry", "limit": 10})),
+    "ac_commands": Scenario(
+        "ac_commands", {"TOOL_GROUPS": "classroom", "CLASSROOM_MULTI_ROOM": "true",
+                        "AC_COMMAND_COALESCE_SECONDS": "0", "AC_SUPPRESS_NOOP": "false"},
+        [], _reading,
+        lambda n: ("set_ac_temperature", {"temperature": 18 + n % 10, "room": ROOMS[n % len(ROOMS)]})),
+    "http_api": Scenario(
+        "http_api", {"TOOL_GROUPS": "messages,clients", "EMQX_API_CACHE_TTL": "0"},
+        [], None,
+        lambda n: (("publish_mqtt_message", {"topic": f"bench/cmd/{n % 50}", "payload": json.dumps({"seq": n})}),
+                   ("list_mqtt_clients", {"page": 1 + n % 5, "limit": 100}),
+                   ("get_mqtt_client", {"clientid": f"bench_client_{n % 500}"}))[n % 3]),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="要运行的场景，可重复，默认全部")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个场景的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="测量前的预热时长（秒）")
+    parser.add_argument("--message-rate", type=float, default=2000.0, help="设备消息注入速率（条/秒）")
+    parser.add_argument("--call-rate", type=float, default=20.0, help="工具调用速率（次/秒）")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="EMQX HTTP API替身的服务端延迟")
+    parser.add_argument("--output", help="结果JSON文件路径")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="用于比较的基线JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写为基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="视为回退的相对变差比例")
+    parser.add_argument("--server-log", help="服务器stderr写入的文件，默认丢弃")
+    return parser.parse_args()
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+def tool_payload(result) -> Dict[str, Any]:
+    """解析工具返回的JSON文本，无法解析时返回空字典"""
+    try:
+        return json.loads(result.content[0].text)
+    except (IndexError, AttributeError, ValueError):
+        return {}
+
+
+class Publisher:
+    """在后台线程中按固定速率向broker注入消息（每10ms一批）"""
+
+    def __init__(self, broker: MQTTBrokerStub, message: Callable[[int], Tuple[str, bytes]], rate: float):
+        self.broker = broker
+        self.message = message
+        self.rate = rate
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-publisher", daemon=True)
+
+    def _run(self):
+        started = time.perf_counter()
+        while not self._stop.wait(0.01):
+            due = int((time.perf_counter() - started) * self.rate)
+            batch = [(*self.message(n), 0, False) for n in range(self.sent, due)]
+            if batch:
+                self.broker.publish_many(batch)
+                self.sent = due
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(5)
+
+
+async def server_metrics(session: ClientSession) -> Dict[str, float]:
+    """读取服务器累计接收消息数、CPU时间和常驻内存"""
+    data = tool_payload(await session.call_tool("get_server_metrics", {"limit": 100000}))
+    metrics = data.get("metrics", {})
+
+    def values(name):
+        entry = metrics.get(name, {}).get("values")
+        return entry if isinstance(entry, list) else [entry] if entry else []
+
+    dispatch = values("mqtt_dispatch_ms")
+    return {
+        "received": sum(item["value"] for item in values("mqtt_messages_received_total")),
+        "applied": sum(item["count"] for item in dispatch),
+        "dispatch_p99_ms": dispatch[0].get("p99") if dispatch else None,
+        "cpu_seconds": values("process_cpu_seconds")[0]["value"],
+        "rss_bytes": values("process_resident_memory_bytes")[0]["value"],
+    }
+
+
+async def run_calls(session: ClientSession, scenario: Scenario, rate: float, duration: float,
+                    latencies: Dict[str, List[float]], errors: Dict[str, int]) -> None:
+    """开环调用：按计划时刻发起，不等待前一次调用返回"""
+    async def one(n: int):
+        tool, arguments = scenario.call(n)
+        started = time.perf_counter()
+        try:
+            result = await session.call_tool(tool, arguments)
+            failed = result.isError or "error" in tool_payload(result)
+        except Exception:
+            failed = True
+        latencies.setdefault(tool, []).append((time.perf_counter() - started) * 1000)
+        if failed:
+            errors[tool] = errors.get(tool, 0) + 1
+
+    tasks = []
+    started = time.perf_counter()
+    for n in range(int(rate * duration)):
+        delay = started + n / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(n)))
+    await asyncio.gather(*tasks)
+
+
+async def run_scenario(scenario: Scenario, args, broker: MQTTBrokerStub, api: EMQXAPIStub, errlog) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.path.abspath(SRC_DIR), env.get("PYTHONPATH")])),
+        "EMQX_BROKER_HOST": "127.0.0.1", "EMQX_BROKER_PORT": str(broker.port), "EMQX_USERNAME": "",
+        "EMQX_USE_SSL": "false", "EMQX_API_URL": api.api_url, "EMQX_API_KEY": "bench",
+        "EMQX_API_SECRET": "bench", "LOG_LEVEL": "WARNING", "MQTT_EAGER_CONNECT": "true",
+        "AC_OUTBOX_FILE": "", "MESSAGE_LOG_DIR": "", "METRICS_PORT": "0",
+    })
+    env.update(scenario.env)
+    params = StdioServerParameters(command=sys.executable, args=["-c", SERVER_CODE], env=env)
+
+    async with stdio_client(params, errlog=errlog) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            for tool, arguments in scenario.setup:
+                await session.call_tool(tool, arguments)
+            # 每种调用先各做一次，建立HTTP连接池等一次性开销不计入测量
+            for n in range(3):
+                await session.call_tool(*scenario.call(n))
+
+            publisher = None
+            if scenario.message is not None and args.message_rate > 0:
+                publisher = Publisher(broker, scenario.message, args.message_rate)
+                publisher.start()
+            await asyncio.sleep(args.warmup)
+
+            before = await server_metrics(session)
+            delivered_before, sent_before = broker.delivered, publisher.sent if publisher else 0
+            latencies: Dict[str, List[float]] = {}
+            errors: Dict[str, int] = {}
+            started = time.perf_counter()
+            await run_calls(session, scenario, args.call_rate, args.duration, latencies, errors)
+            if publisher:
+                publisher.stop()
+            sent = (publisher.sent if publisher else 0) - sent_before
+            # 等待broker已投递的消息全部被服务器分发（最多5秒）
+            deadline = time.perf_counter() + 5
+            while True:
+                after = await server_metrics(session)
+                elapsed = time.perf_counter() - started
+                if after["applied"] - before["applied"] >= broker.delivered - delivered_before \
+                        or time.perf_counter() > deadline:
+                    break
+                await asyncio.sleep(0.05)
+
+    received = after["received"] - before["received"]
+    applied = after["applied"] - before["applied"]
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "duration_seconds": round(elapsed, 3),
+        "messages_sent": sent,
+        "messages_received": received,
+        "messages_applied": applied,
+        "ingest_msgs_per_second": round(applied / elapsed, 1) if scenario.message else None,
+        "dispatch_p99_ms": after["dispatch_p99_ms"],
+        "tool_calls": len(all_latencies),
+        "tool_errors": sum(errors.values()),
+        "tool_p50_ms": percentile(all_latencies, 0.50),
+        "tool_p99_ms": percentile(all_latencies, 0.99),
+        "tools": {tool: {"calls": len(values), "errors": errors.get(tool, 0),
+                         "mean_ms": round(statistics.mean(values), 3),
+                         "p50_ms": percentile(values, 0.50), "p99_ms": percentile(values, 0.99)}
+                  for tool, values in sorted(latencies.items())},
+        "cpu_percent": round((after["cpu_seconds"] - before["cpu_seconds"]) / elapsed * 100, 1),
+        "rss_mb": round(after["rss_bytes"] / 1024 / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """返回相对基线变差超过容差的指标说明"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric, (higher_is_better, min_delta) in COMPARED_METRICS.items():
+            current, previous = result.get(metric), reference.get(metric)
+            if current is None or previous is None:
+                continue
+            delta = previous - current if higher_is_better else current - previous
+            if delta > min_delta and delta > abs(previous) * tolerance:
+                regressions.append(f"{name}.{metric}: {previous} -> {current}")
+    return regressions
+
+
+def print_result(name: str, result: Dict[str, Any]) -> None:
+    ingest = result["ingest_msgs_per_second"]
+    print(f"\n{name}: 测量 {result['duration_seconds']}s，CPU {result['cpu_percent']}%，"
+          f"RSS {result['rss_mb']} MB")
+    if ingest is not None:
+        print(f"  接收 {ingest} 条/秒（注入 {result['messages_sent']}，分发 {result['messages_applied']}，"
+              f"分发p99 {result['dispatch_p99_ms']} ms）")
+    print(f"  工具调用 {result['tool_calls']} 次，错误 {result['tool_errors']}，"
+          f"p50 {result['tool_p50_ms']} ms，p99 {result['tool_p99_ms']} ms")
+    for tool, stats in result["tools"].items():
+        print(f"    {tool:<24} {stats['calls']:>6} 次  p50 {stats['p50_ms']:>8} ms  "
+              f"p99 {stats['p99_ms']:>8} ms  错误 {stats['errors']}")
+
+
+def main():
+    args = parse_args()
+    names = args.scenario or list(SCENARIOS)
+
+    broker = MQTTBrokerStub()
+    broker.start()
+    api = EMQXAPIStub(clients=1000, broker=broker, latency_ms=args.api_latency_ms)
+    api.start()
+    errlog = open(args.server_log, "a") if args.server_log else tempfile.TemporaryFile("w+")
+    results = {}
+    try:
+        for name in names:
+            results[name] = asyncio.run(run_scenario(SCENARIOS[name], args, broker, api, errlog))
+            print_result(name, results[name])
+    finally:
+        errlog.close()
+        api.stop()
+        broker.stop()
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {"duration": args.duration, "warmup": args.warmup, "message_rate": args.message_rate,
+                       "call_rate": args.call_rate, "api_latency_ms": args.api_latency_ms},
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n结果已保存到 {args.output}")
+
+    exit_code = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != report["parameters"]:
+            print(f"\n注意：基线参数 {baseline.get('parameters')} 与本次不同，比较结果仅供参考")
+        regressions = compare(results, baseline.get("scenarios", {}), args.tolerance)
+        if regressions:
+            print(f"\n相对基线的回退（容差 {args.tolerance:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            exit_code = 1
+        else:
+            print(f"\n与基线 {args.baseline} 相比没有回退")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n基线已写入 {args.baseline}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
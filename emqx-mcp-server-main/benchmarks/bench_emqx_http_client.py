@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+微基准：EMQX HTTP API客户端的连接复用
+
+对比旧的"每次调用新建httpx.AsyncClient"方式与EMQXClient共享连接池的
+单次请求延迟。服务端是本地的HTTP/1.1替身，加 --tls 时使用自签名证书，
+此时每次新建客户端都要重新完成TCP和TLS握手。
+
+用法:
+    python benchmarks/bench_emqx_http_client.py [--requests 500] [--concurrency 1] [--tls]
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+
+from emqx_mcp_server.emqx_client import EMQXClient
+
+
+class _APIHandler(BaseHTTPRequestHandler):
+    """模拟EMQX的 GET /clients 接口"""
+
+    protocol_version = "HTTP/1.1"
+    # 头和正文合并为一次写出，避免Nagle与延迟ACK叠加造成的40ms停顿
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    body = json.dumps({"data": [], "meta": {"count": 0, "page": 1, "limit": 100}}).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _self_signed_context(directory):
+    """用cryptography生成自签名证书并返回服务端SSL上下文"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM,
+                                  serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def start_server(tls):
+    """在后台线程中启动API替身，返回(server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _APIHandler)
+    scheme = "http"
+    if tls:
+        directory = tempfile.mkdtemp()
+        server.socket = _self_signed_context(directory).wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+async def run_per_call(client, count, concurrency):
+    """旧实现：每次请求都新建并关闭AsyncClient"""
+    url = f"{client.api_url}/clients"
+
+    async def one():
+        async with httpx.AsyncClient(verify=client.verify) as http:
+            response = await http.get(url, headers=client._get_auth_header(), timeout=30)
+            response.raise_for_status()
+            return response.json()
+
+    return await _timed(one, count, concurrency)
+
+
+async def run_pooled(client, count, concurrency):
+    """新实现：EMQXClient共享的连接池"""
+    # 只比较连接复用：关闭响应缓存，并让每次请求的参数不同，避免并发的相同请求被合并
+    client.cache.ttl = 0
+    pages = itertools.count(1)
+
+    async def one():
+        result = await client.list_clients({"page": next(pages), "limit": 10})
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
+
+    try:
+        return await _timed(one, count, concurrency)
+    finally:
+        await client.aclose()
+
+
+async def _timed(call, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def worker():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(count)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EMQX HTTP API client connection reuse microbenchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--tls", action="store_true", help="use a self-signed HTTPS endpoint")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.tls)
+    logger = logging.getLogger("bench")
+    client = EMQXClient(logger)
+    client.api_url = base_url
+    client.verify = False
+
+    print(f"请求数: {args.requests}, 并发: {args.concurrency}, 端点: {base_url}")
+    results = {}
+    try:
+        for name, func in (("per-call client", run_per_call), ("pooled client", run_pooled)):
+            elapsed, latencies = asyncio.run(func(client, args.requests, args.concurrency))
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            results[name] = elapsed
+            print(f"  {name:<16} p50 {statistics.median(latencies) * 1000:7.3f} ms"
+                  f"  p99 {p99 * 1000:7.3f} ms  {args.requests / elapsed:8.1f} req/s")
+    finally:
+        server.shutdown()
+
+    print(f"  speedup          {results['per-call client'] / results['pooled client']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+微基准：消息历史写入开销
+
+对比旧的"列表追加 + 切片复制裁剪"方式与环形缓冲区存储的单条消息写入耗时。
+
+用法:
+    python benchmarks/bench_message_history.py [--messages 200000] [--topics 50] [--history 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.message_history import MessageHistoryStore
+
+
+def build_messages(topics, count):
+    """预先构造消息，使计时只覆盖历史存储本身"""
+    timestamp = datetime.now().isoformat()
+    return [
+        (topic, {
+            "timestamp": timestamp,
+            "topic": topic,
+            "payload": '{"temperature": 24.5}',
+            "qos": 0,
+            "retain": False
+        })
+        for topic in (topics[i % len(topics)] for i in range(count))
+    ]
+
+
+def ingest_list_slice(messages, max_history_size):
+    """旧实现：每个主题一个列表，超出上限时切片复制"""
+    message_history = {}
+    start = time.perf_counter()
+    for topic, message_data in messages:
+        if topic not in message_history:
+            message_history[topic] = []
+        message_history[topic].append(message_data)
+        if len(message_history[topic]) > max_history_size:
+            message_history[topic] = message_history[topic][-max_history_size:]
+    return time.perf_counter() - start
+
+
+def ingest_ring_buffer(messages, max_history_size):
+    """新实现：预分配的环形缓冲区"""
+    message_history = MessageHistoryStore(max_history_size)
+    start = time.perf_counter()
+    for topic, message_data in messages:
+        message_history.append(topic, message_data)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message history ingest microbenchmark")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    topics = [f"classroom/room_{i:04d}/temperature" for i in range(args.topics)]
+    messages = build_messages(topics, args.messages)
+
+    print(f"消息数: {args.messages}, 主题数: {args.topics}, 历史上限: {args.history}")
+    results = {}
+    for name, func in (("list + slice", ingest_list_slice), ("ring buffer", ingest_ring_buffer)):
+        best = min(func(messages, args.history) for _ in range(args.repeat))
+        results[name] = best
+        print(f"  {name:<14} {best * 1e9 / args.messages:8.1f} ns/msg")
+
+    speedup = results["list + slice"] / results["ring buffer"]
+    print(f"  speedup        {speedup:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+微基准：磁盘消息日志的写入和查询开销
+
+模拟一天的传感器读数写入分段日志，然后对比两种查询方式：
+逐行扫描JSON Lines文件并解析每条记录，与通过mmap沿反向指针链
+只读取记录头、只解码返回记录的MessageLog查询。
+
+用法:
+    python benchmarks/bench_message_log.py [--topics 10] [--interval 1.0] [--hours 24]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.message_log import MessageLog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disk-backed message log microbenchmark")
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between readings per topic")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    topics = [f"classroom/room_{i:03d}/temperature" for i in range(args.topics)]
+    steps = int(args.hours * 3600 / args.interval)
+    start_ts = time.time() - args.hours * 3600
+    directory = tempfile.mkdtemp(prefix="message_log_bench_")
+    jsonl_path = os.path.join(directory, "baseline.jsonl")
+
+    try:
+        log = MessageLog(os.path.join(directory, "log"), segment_bytes=16 * 1024 * 1024,
+                         segment_seconds=args.hours * 3600 + 1, retention_seconds=0)
+        begin = time.perf_counter()
+        with open(jsonl_path, "w") as baseline:
+            for step in range(steps):
+                ts = start_ts + step * args.interval
+                for topic in topics:
+                    message = {"topic": topic, "payload": f'{{"temperature": {20 + step % 10}}}',
+                               "qos": 0, "retain": False}
+                    log.append(topic, message, ts)
+                    baseline.write(json.dumps({"ts": ts, **message}) + "\n")
+        elapsed = time.perf_counter() - begin
+        records = steps * len(topics)
+        print(f"记录数: {records}, 段文件: {log.stats()['segments']}, "
+              f"写入(日志+基线) {elapsed * 1e9 / records:.0f} ns/msg")
+
+        target = topics[0]
+        since = start_ts + args.hours * 3600 / 2
+
+        begin = time.perf_counter()
+        matches = []
+        with open(jsonl_path) as baseline:
+            for line in baseline:
+                record = json.loads(line)
+                if record["topic"] == target and record["ts"] >= since:
+                    matches.append(record)
+        newest = matches[::-1][:args.limit]
+        jsonl_time = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        result = log.query([target], since=since, limit=args.limit)
+        log_time = time.perf_counter() - begin
+        assert [m["payload"] for m in result] == [m["payload"] for m in newest]
+
+        begin = time.perf_counter()
+        count = sum(1 for _ in log.iter_newest([target], since))
+        count_time = time.perf_counter() - begin
+
+        print(f"  JSONL scan + parse      {jsonl_time * 1000:9.2f} ms")
+        print(f"  MessageLog limit={args.limit:<5}  {log_time * 1000:9.2f} ms")
+        print(f"  MessageLog count {count:<7} {count_time * 1000:9.2f} ms (headers only)")
+        log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
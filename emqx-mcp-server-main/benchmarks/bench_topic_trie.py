@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+微基准：主题过滤与消息分发
+
+在上万个教室主题上对比逐个比较（线性扫描）与主题字典树：
+1. 历史查询：按过滤器查找已存储的主题（TopicIndex）
+2. 消息分发：为每条消息找出匹配的消费者过滤器（TopicTrie）
+
+用法:
+    python benchmarks/bench_topic_trie.py [--rooms 5000] [--consumers 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.topic_trie import TopicIndex, TopicTrie, topic_matches
+
+METRICS = ("temperature", "humidity", "ac/power/status", "ac/temperature/status")
+
+
+def timed(func, repeat):
+    """返回多次执行中的最短耗时(秒)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Topic trie benchmark")
+    parser.add_argument("--rooms", type=int, default=5000)
+    parser.add_argument("--consumers", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    topics = [f"classroom/room_{i:05d}/{metric}" for i in range(args.rooms) for metric in METRICS]
+    index = TopicIndex()
+    for topic in topics:
+        index.add(topic)
+    print(f"已存储主题: {len(topics)}")
+
+    print("\n历史查询 (按过滤器查找主题):")
+    for topic_filter in ("classroom/room_00042/#", "classroom/+/temperature",
+                         "classroom/room_00042/ac/+/status", "classroom/+/ac/power/status"):
+        linear = timed(lambda: [t for t in topics if topic_matches(topic_filter, t)], args.repeat)
+        trie = timed(lambda: index.match(topic_filter), args.repeat)
+        matched = len(index.match(topic_filter))
+        print(f"  {topic_filter:<36} 匹配 {matched:>6}  线性 {linear * 1e3:8.2f} ms"
+              f"  字典树 {trie * 1e3:8.3f} ms  ({linear / trie:7.1f}x)")
+
+    # 每个消费者关注一个教室，另有少量全局通配符消费者
+    filters = [f"classroom/room_{i:05d}/#" for i in range(args.consumers)]
+    filters += ["classroom/+/temperature", "classroom/+/ac/+/status", "#"]
+    dispatch = TopicTrie()
+    for topic_filter in filters:
+        dispatch.insert(topic_filter, topic_filter)
+    sample = topics[::max(1, len(topics) // 2000)]
+
+    print(f"\n消息分发 ({len(filters)} 个消费者过滤器, {len(sample)} 条消息):")
+    linear = timed(lambda: [[f for f in filters if topic_matches(f, t)] for t in sample], args.repeat)
+    trie = timed(lambda: [dispatch.match(t) for t in sample], args.repeat)
+    print(f"  线性   {linear * 1e6 / len(sample):10.2f} us/msg")
+    print(f"  字典树 {trie * 1e6 / len(sample):10.2f} us/msg  ({linear / trie:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
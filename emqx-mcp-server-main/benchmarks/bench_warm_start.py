@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+基准：服务重启后第一次温度查询得到答案的耗时
+
+对比两种启动方式（均使用进程内MQTT broker替身）：
+- lazy：第一次工具调用时才建立MQTT连接和订阅，查询不等待，调用方需要重试
+- eager：服务初始化时就连接并订阅全部设备主题，broker下发的保留消息预先填充最新值表，
+  查询在尚无数据时等待第一条数据（SENSOR_FIRST_VALUE_WAIT）
+
+设备按--interval秒的周期上报读数（模拟EdgeX AutoEvent），--no-retain时读数不带保留标志，
+重启后只能等待下一次上报。
+
+用法:
+    python benchmarks/bench_warm_start.py [--interval 15] [--no-retain] [--poll 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18990, help="broker替身监听端口")
+    parser.add_argument("--interval", type=float, default=15.0, help="设备上报周期（秒）")
+    parser.add_argument("--no-retain", action="store_true", help="设备读数不带保留标志")
+    parser.add_argument("--poll", type=float, default=0.5, help="lazy模式下调用方重试间隔（秒）")
+    parser.add_argument("--wait", type=float, default=2.0, help="eager模式下查询等待第一条数据的秒数")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+# 配置在导入时读取
+os.environ.update(EMQX_BROKER_HOST="127.0.0.1", EMQX_BROKER_PORT=str(ARGS.port),
+                  EMQX_USERNAME="", EMQX_USE_SSL="false", CLASSROOM_MULTI_ROOM="false",
+                  AC_OUTBOX_FILE="")
+
+from mcp.server.fastmcp import FastMCP  # noqa: E402
+
+from mqtt_broker_stub import MQTTBrokerStub  # noqa: E402
+from emqx_mcp_server.connection_manager import MQTTConnectionManager  # noqa: E402
+from emqx_mcp_server.tools.temperature_control_tools import TemperatureControlTools  # noqa: E402
+
+
+def tool_result(result):
+    """兼容FastMCP不同版本的call_tool返回值"""
+    content = result[0] if isinstance(result, tuple) else result
+    return json.loads(content[0].text)
+
+
+class Device:
+    """按固定周期上报温度的设备"""
+
+    def __init__(self, broker: MQTTBrokerStub, topic: str, interval: float, retain: bool):
+        self.broker = broker
+        self.topic = topic
+        self.interval = interval
+        self.retain = retain
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def report(self):
+        payload = json.dumps({"temperature": 24.5, "sensor_id": "bench-sensor"}).encode()
+        self.broker.publish(self.topic, payload, qos=0, retain=self.retain)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self.report()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+async def run_scenario(eager: bool, logger: logging.Logger):
+    connection = MQTTConnectionManager(logger, client_id_prefix=f"bench_{'eager' if eager else 'lazy'}")
+    tools = TemperatureControlTools(logger, connection)
+    mcp = FastMCP("bench")
+    tools.register_tools(mcp)
+    if eager:
+        # EMQXMCPServer.__init__ 中的预先连接，随后生命周期开始时调用start()
+        connection.setup_client()
+        tools.start()
+
+    calls = 0
+    first_call_ok = None
+    wait = ARGS.wait if eager else 0
+    deadline = time.monotonic() + ARGS.interval * 2 + 10
+    while time.monotonic() < deadline:
+        result = tool_result(await mcp.call_tool("get_temperature", {"wait_seconds": wait}))
+        calls += 1
+        if first_call_ok is None:
+            first_call_ok = result.get("success", False)
+        if result.get("success"):
+            break
+        await asyncio.sleep(ARGS.poll)
+    warm_start = dict(connection.warm_start)
+    connection.cleanup()
+    return {
+        "mode": "eager" if eager else "lazy",
+        "first_call_answered": first_call_ok,
+        "calls": calls,
+        **warm_start
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("bench_warm_start")
+
+    broker = MQTTBrokerStub(port=ARGS.port)
+    broker.start()
+    device = Device(broker, os.environ.get("CLASSROOM_TOPIC_PREFIX", "classroom") + "/temperature",
+                    ARGS.interval, retain=not ARGS.no_retain)
+    device.start()
+    print(f"设备上报周期 {ARGS.interval:g}s，保留消息: {'否' if ARGS.no_retain else '是'}")
+    try:
+        for eager in (False, True):
+            result = asyncio.run(run_scenario(eager, logger))
+            print(f"{result['mode']:>5}: 首次调用{'有' if result['first_call_answered'] else '无'}数据，"
+                  f"调用{result['calls']}次，首个答案 {result['first_answer_ms']}ms "
+                  f"(连接 {result['connected_ms']}ms，首条消息 {result['first_message_ms']}ms，"
+                  f"保留消息 {result['retained_messages']}条)")
+    finally:
+        device.stop()
+        broker.stop()
+
+
+if __name__ == "__main__":
+    main()
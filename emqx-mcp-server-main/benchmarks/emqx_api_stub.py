@@ -0,0 +1,148 @@
+"""
+进程内EMQX HTTP API替身
+
+实现EMQXClient用到的 /api/v5 接口子集：
+- POST /publish、POST /publish/bulk：给出broker替身时把消息转交给它投递
+- GET /clients（分页，meta带count和hasnext）、GET /clients/{clientid}
+- DELETE /clients/{clientid}：从客户端列表中移除，返回204
+
+不校验鉴权，latency_ms可为每个请求加固定的服务端延迟，只用于本地压测。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+API_PREFIX = "/api/v5"
+
+
+class _APIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 头和正文合并为一次写出，避免Nagle与延迟ACK叠加造成的40ms停顿
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    stub: "EMQXAPIStub" = None
+
+    def _reply(self, status: int, body=None) -> None:
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method: str) -> None:
+        stub = self.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        parts = urlsplit(self.path)
+        path = parts.path[len(API_PREFIX):] if parts.path.startswith(API_PREFIX) else None
+        body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = json.loads(self.rfile.read(length))
+        with stub.lock:
+            stub.requests[f"{method} {path}"] = stub.requests.get(f"{method} {path}", 0) + 1
+
+        if method == "POST" and path == "/publish":
+            self._reply(200, {"id": stub.publish(body)})
+        elif method == "POST" and path == "/publish/bulk":
+            self._reply(200, [{"id": stub.publish(message)} for message in body])
+        elif method == "GET" and path == "/clients":
+            query = parse_qs(parts.query)
+            page = int(query.get("page", ["1"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            with stub.lock:
+                clients = list(stub.clients.values())
+            data = clients[(page - 1) * limit:page * limit]
+            self._reply(200, {"data": data, "meta": {"count": len(clients), "page": page, "limit": limit,
+                                                     "hasnext": page * limit < len(clients)}})
+        elif path and path.startswith("/clients/"):
+            clientid = unquote(path[len("/clients/"):])
+            with stub.lock:
+                client = stub.clients.pop(clientid, None) if method == "DELETE" else stub.clients.get(clientid)
+            if client is None:
+                self._reply(404, {"code": "CLIENTID_NOT_FOUND", "message": "Client ID not found"})
+            elif method == "DELETE":
+                self._reply(204)
+            else:
+                self._reply(200, client)
+        else:
+            self._reply(404, {"code": "NOT_FOUND", "message": f"{method} {parts.path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class EMQXAPIStub:
+    """
+    进程内EMQX HTTP API替身
+
+    在后台线程中运行，start()返回监听端口，api_url为EMQX_API_URL应使用的地址。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, clients: int = 100,
+                 broker=None, latency_ms: float = 0):
+        self.host = host
+        self.port = port
+        self.broker = broker
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.published = 0
+        self.clients = {f"bench_client_{i}": self._client(f"bench_client_{i}", i) for i in range(clients)}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _client(clientid: str, index: int) -> Dict:
+        return {"clientid": clientid, "username": f"user_{index % 10}", "node": "emqx@127.0.0.1",
+                "ip_address": f"10.0.{index // 250}.{index % 250 + 1}", "port": 50000 + index % 10000,
+                "connected": True, "proto_ver": 5, "keepalive": 60, "clean_start": True,
+                "subscriptions_cnt": 2, "connected_at": "2024-01-01T00:00:00.000+00:00"}
+
+    def publish(self, message: Dict) -> str:
+        """记录一条经HTTP API发布的消息，有broker替身时转交投递"""
+        with self.lock:
+            self.published += 1
+            message_id = f"{self.published:032x}"
+        if self.broker is not None:
+            payload = message.get("payload", "")
+            self.broker.publish(message["topic"], payload.encode() if isinstance(payload, str) else payload,
+                                qos=message.get("qos", 0), retain=message.get("retain", False))
+        return message_id
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    def start(self) -> int:
+        """在后台线程中启动HTTP服务，返回监听端口"""
+        handler = type("EMQXAPIHandler", (_APIHandler,), {"stub": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="emqx-api-stub", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self) -> None:
+        """停止HTTP服务"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join(5)
+        self._server = None
@@ -0,0 +1,243 @@
+"""
+进程内MQTT broker替身
+
+只实现基准测试需要的MQTT 3.1.1子集：CONNECT、PUBLISH(QoS 0/1/2)、
+SUBSCRIBE/UNSUBSCRIBE（支持+和#）、保留消息、PINGREQ和DISCONNECT。
+不做鉴权、会话持久化和QoS 1/2的重发，只用于本地压测。
+"""
+
+import asyncio
+import struct
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from emqx_mcp_server.topic_trie import topic_matches
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _packet(first_byte: int, body: bytes) -> bytes:
+    return bytes([first_byte]) + _encode_length(len(body)) + body
+
+
+def _string(value: bytes) -> bytes:
+    return struct.pack("!H", len(value)) + value
+
+
+class _Session:
+    """单个客户端连接"""
+
+    def __init__(self, broker: "MQTTBrokerStub", reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        self.client_id = ""
+        self.subscriptions: Dict[str, int] = {}
+        self._next_id = 0
+
+    def next_packet_id(self) -> int:
+        self._next_id = self._next_id % 65535 + 1
+        return self._next_id
+
+    def send(self, data: bytes) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def deliver(self, topic: bytes, payload: bytes, qos: int, retain: bool = False) -> None:
+        flags = (qos << 1) | (1 if retain else 0)
+        body = _string(topic)
+        if qos:
+            body += struct.pack("!H", self.next_packet_id())
+        self.send(_packet(0x30 | flags, body + payload))
+
+    async def read_packet(self) -> Tuple[int, bytes]:
+        first = (await self.reader.readexactly(1))[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = (await self.reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await self.reader.readexactly(length) if length else b""
+        return first, body
+
+    async def run(self) -> None:
+        try:
+            while True:
+                first, body = await self.read_packet()
+                packet_type = first >> 4
+                if packet_type == 1:
+                    self._on_connect(body)
+                elif packet_type == 3:
+                    self._on_publish(first, body)
+                elif packet_type == 6:
+                    # PUBREL -> PUBCOMP
+                    self.send(_packet(0x70, body[:2]))
+                elif packet_type == 8:
+                    self._on_subscribe(body)
+                elif packet_type == 10:
+                    self._on_unsubscribe(body)
+                elif packet_type == 12:
+                    self.send(b"\xd0\x00")
+                elif packet_type == 14:
+                    break
+                # PUBACK/PUBREC/PUBCOMP from subscribers are ignored
+                await self.writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.broker.sessions.discard(self)
+            self.writer.close()
+
+    def _on_connect(self, body: bytes) -> None:
+        name_len = struct.unpack("!H", body[:2])[0]
+        offset = 2 + name_len + 4
+        client_len = struct.unpack("!H", body[offset:offset + 2])[0]
+        self.client_id = body[offset + 2:offset + 2 + client_len].decode()
+        self.broker.connects += 1
+        self.send(b"\x20\x02\x00\x00")
+
+    def _on_publish(self, first: int, body: bytes) -> None:
+        qos = (first >> 1) & 0x03
+        retain = bool(first & 0x01)
+        topic_len = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + topic_len]
+        offset = 2 + topic_len
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            # QoS1 -> PUBACK, QoS2 -> PUBREC
+            self.send(_packet(0x40 if qos == 1 else 0x50, packet_id))
+        self.broker.route(topic, body[offset:], qos, retain)
+
+    def _on_subscribe(self, body: bytes) -> None:
+        packet_id = body[:2]
+        offset = 2
+        granted = []
+        new_filters = []
+        while offset < len(body):
+            length = struct.unpack("!H", body[offset:offset + 2])[0]
+            topic_filter = body[offset + 2:offset + 2 + length].decode()
+            qos = body[offset + 2 + length] & 0x03
+            offset += 3 + length
+            self.subscriptions[topic_filter] = qos
+            granted.append(qos)
+            new_filters.append((topic_filter, qos))
+        self.send(_packet(0x90, packet_id + bytes(granted)))
+        for topic_filter, qos in new_filters:
+            for topic, (payload, retained_qos) in list(self.broker.retained.items()):
+                if topic_matches(topic_filter, topic.decode()):
+                    self.deliver(topic, payload, min(qos, retained_qos), retain=True)
+
+    def _on_unsubscribe(self, body: bytes) -> None:
+        packet_id = body[:2]
+        offset = 2
+        while offset < len(body):
+            length = struct.unpack("!H", body[offset:offset + 2])[0]
+            self.subscriptions.pop(body[offset + 2:offset + 2 + length].decode(), None)
+            offset += 2 + length
+        self.send(_packet(0xB0, packet_id))
+
+
+class MQTTBrokerStub:
+    """
+    进程内MQTT broker替身
+
+    在独立线程的事件循环中运行，start()返回监听端口。
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.sessions: Set[_Session] = set()
+        self.retained: Dict[bytes, Tuple[bytes, int]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.connects = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def route(self, topic: bytes, payload: bytes, qos: int, retain: bool) -> None:
+        """把一条消息投递给所有匹配的订阅者"""
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        topic_str = topic.decode()
+        for session in list(self.sessions):
+            best = -1
+            for topic_filter, sub_qos in session.subscriptions.items():
+                if sub_qos > best and topic_matches(topic_filter, topic_str):
+                    best = sub_qos
+            if best >= 0:
+                session.deliver(topic, payload, min(qos, best))
+                self.delivered += 1
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False) -> None:
+        """从任意线程注入一条消息（例如预置设备的保留消息）"""
+        if self._loop is None:
+            self.route(topic.encode(), payload, qos, retain)
+        else:
+            self._loop.call_soon_threadsafe(self.route, topic.encode(), payload, qos, retain)
+
+    def publish_many(self, messages: List[Tuple[str, bytes, int, bool]]) -> None:
+        """从任意线程批量注入(topic, payload, qos, retain)，整批只切换一次线程"""
+        encoded = [(topic.encode(), payload, qos, retain) for topic, payload, qos, retain in messages]
+        if self._loop is None:
+            for message in encoded:
+                self.route(*message)
+        else:
+            self._loop.call_soon_threadsafe(lambda: [self.route(*message) for message in encoded])
+
+    async def _handle(self, reader, writer) -> None:
+        session = _Session(self, reader, writer)
+        self.sessions.add(session)
+        await session.run()
+
+    def start(self) -> int:
+        """在后台线程中启动broker，返回监听端口"""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            self._ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="mqtt-broker-stub", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self.port
+
+    def stop(self) -> None:
+        """停止broker"""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for session in list(self.sessions):
+                session.writer.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
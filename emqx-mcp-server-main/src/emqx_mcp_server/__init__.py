@@ -4,18 +4,38 @@ EMQX MCP Server Package
 This is the main package for the EMQX MCP Server
 """
 
-from .server import EMQXMCPServer
+import argparse
+import sys
+
+
+def __getattr__(name):
+    # 延迟导入服务器（以及mcp），只使用topic_trie等子模块时不必加载整个服务
+    if name == "EMQXMCPServer":
+        from .server import EMQXMCPServer
+        return EMQXMCPServer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
     """
     EMQX MCP服务器主入口点
-    
-    创建并启动EMQX MCP服务器实例。
+
+    创建并启动EMQX MCP服务器实例；--profile-startup时只打印启动导入耗时分解。
     """
+    parser = argparse.ArgumentParser(prog="emqx-mcp-server", description="EMQX MCP Server")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="在子进程中用 -X importtime 启动服务器，打印导入耗时分解后退出")
+    parser.add_argument("--top", type=int, default=20,
+                        help="--profile-startup 时列出的最慢模块数量")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from .startup_profile import profile_startup
+        sys.exit(profile_startup(args.top))
+
     # Main entry point for the EMQX MCP Server
+    from .server import EMQXMCPServer
     server = EMQXMCPServer()
     server.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
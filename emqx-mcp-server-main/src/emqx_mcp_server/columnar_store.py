@@ -0,0 +1,278 @@
+"""
+数值传感器列式存储模块
+
+为温湿度等数值主题保存可增长的float64时间戳数组和数值数组，
+接收路径只把读数追加到待写缓冲区，按批写入数组；统计、区间和趋势查询
+通过二分查找定位时间切片后使用NumPy向量化计算，不再逐条解析JSON。
+
+NumPy是可选依赖（pip install emqx-mcp-server[columnar]），未安装时
+NUMPY_AVAILABLE为False，ColumnarStore不可用。NumPy在创建第一个序列时才导入，
+不拖慢服务启动。
+
+每个数据点占16字节（时间戳和数值各8字节），数组扩容余量最多再翻一倍。
+除了每个主题的点数上限，还可以设置所有主题共享的总点数预算，新主题加入时
+每个主题的上限降为预算的平均份额。
+"""
+
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional
+
+NUMPY_AVAILABLE = find_spec("numpy") is not None
+np: Any = None
+
+
+def _load_numpy() -> None:
+    """首次使用时导入NumPy"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+class NumericSeries:
+    """
+    单个主题的数值时间序列
+
+    时间戳单调不减；超过max_points时丢弃最旧的数据（摊还O(1)）。
+    """
+
+    __slots__ = ("_ts", "_values", "_size", "_start", "max_points", "batch_size",
+                 "_pending_ts", "_pending_values", "_last_ts")
+
+    def __init__(self, max_points: int = 100_000, batch_size: int = 256,
+                 initial_capacity: int = 1024):
+        """
+        初始化时间序列
+
+        Args:
+            max_points: 最多保留的数据点数量
+            batch_size: 待写缓冲区达到该数量时写入数组
+            initial_capacity: 数组的初始容量
+        """
+        _load_numpy()
+        capacity = max(16, min(initial_capacity, max_points))
+        self._ts = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._start = 0
+        self._size = 0
+        self.max_points = max_points
+        self.batch_size = batch_size
+        self._pending_ts: List[float] = []
+        self._pending_values: List[float] = []
+        self._last_ts = float("-inf")
+
+    def append(self, timestamp: float, value: float) -> None:
+        """追加一个读数（先进入待写缓冲区），早于上一个读数的时间戳会被抬升"""
+        if timestamp < self._last_ts:
+            timestamp = self._last_ts
+        self._last_ts = timestamp
+        self._pending_ts.append(timestamp)
+        self._pending_values.append(value)
+        if len(self._pending_ts) >= self.batch_size:
+            self.flush()
+
+    def extend(self, timestamps, values) -> None:
+        """批量追加读数（时间戳必须已按时间排序）"""
+        self.flush()
+        self._write(np.asarray(timestamps, dtype=np.float64), np.asarray(values, dtype=np.float64))
+        if self._size:
+            self._last_ts = float(self._ts[self._start + self._size - 1])
+
+    def flush(self) -> None:
+        """把待写缓冲区写入数组"""
+        if self._pending_ts:
+            ts = np.fromiter(self._pending_ts, dtype=np.float64, count=len(self._pending_ts))
+            values = np.fromiter(self._pending_values, dtype=np.float64, count=len(self._pending_values))
+            self._pending_ts.clear()
+            self._pending_values.clear()
+            self._write(ts, values)
+
+    def _write(self, ts, values) -> None:
+        count = len(ts)
+        if count > self.max_points:
+            ts, values, count = ts[-self.max_points:], values[-self.max_points:], self.max_points
+        end = self._start + self._size
+        if end + count > len(self._ts):
+            # 先丢弃超出上限的最旧数据并把有效数据移到数组开头，仍然不够时再扩容；
+            # 容量最多为2*max_points，达到上限后每max_points个读数才整体移动一次
+            keep = min(self._size, self.max_points - count)
+            first = end - keep
+            capacity = len(self._ts)
+            if keep + count > capacity // 2 and capacity < 2 * self.max_points:
+                capacity = min(max(capacity * 2, keep + count), 2 * self.max_points)
+                new_ts = np.empty(capacity, dtype=np.float64)
+                new_values = np.empty(capacity, dtype=np.float64)
+            else:
+                new_ts, new_values = self._ts, self._values
+            new_ts[:keep] = self._ts[first:end]
+            new_values[:keep] = self._values[first:end]
+            self._ts, self._values = new_ts, new_values
+            self._start, self._size = 0, keep
+            end = keep
+        self._ts[end:end + count] = ts
+        self._values[end:end + count] = values
+        self._size += count
+        if self._size > self.max_points:
+            drop = self._size - self.max_points
+            self._start += drop
+            self._size -= drop
+
+    def resize(self, max_points: int) -> None:
+        """修改点数上限：丢弃超出的最旧数据，数组容量超过新上限两倍时缩小"""
+        self.flush()
+        self.max_points = max_points
+        if self._size > max_points:
+            drop = self._size - max_points
+            self._start += drop
+            self._size -= drop
+        if len(self._ts) > 2 * max_points:
+            capacity = max(16, self._size)
+            end = self._start + self._size
+            new_ts = np.empty(capacity, dtype=np.float64)
+            new_values = np.empty(capacity, dtype=np.float64)
+            new_ts[:self._size] = self._ts[self._start:end]
+            new_values[:self._size] = self._values[self._start:end]
+            self._ts, self._values = new_ts, new_values
+            self._start = 0
+
+    def window(self, since: Optional[float] = None, until: Optional[float] = None):
+        """返回时间范围内的(时间戳, 数值)数组视图，不复制数据"""
+        self.flush()
+        ts = self._ts[self._start:self._start + self._size]
+        values = self._values[self._start:self._start + self._size]
+        lo = int(np.searchsorted(ts, since, side="left")) if since is not None else 0
+        hi = int(np.searchsorted(ts, until, side="right")) if until is not None else len(ts)
+        return ts[lo:hi], values[lo:hi]
+
+    def __len__(self) -> int:
+        return self._size + len(self._pending_ts)
+
+
+class ColumnarStore:
+    """按主题保存NumericSeries，并提供向量化的统计、区间和趋势查询"""
+
+    def __init__(self, max_points: int = 100_000, batch_size: int = 256,
+                 initial_capacity: int = 64, total_points: int = 0):
+        """
+        初始化列式存储
+
+        Args:
+            max_points: 每个主题最多保留的数据点数量
+            batch_size: 每个主题待写缓冲区的批大小
+            initial_capacity: 新主题数组的初始容量（多教室时主题很多，按需倍增）
+            total_points: 所有主题共享的总点数预算，0表示只按主题限制
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for the columnar store (pip install numpy)")
+        self.max_points = max_points
+        self.total_points = total_points
+        self.batch_size = batch_size
+        self.initial_capacity = initial_capacity
+        self._series: Dict[str, NumericSeries] = {}
+
+    def points_per_topic(self, topics: Optional[int] = None) -> int:
+        """每个主题的点数上限（有总预算时为预算按主题数的平均份额）"""
+        if not self.total_points:
+            return self.max_points
+        topics = len(self._series) if topics is None else topics
+        return max(1, min(self.max_points, self.total_points // max(1, topics)))
+
+    def add(self, topic: str, value: float, timestamp: float) -> None:
+        """追加一个读数"""
+        series = self._series.get(topic)
+        if series is None:
+            limit = self.points_per_topic(len(self._series) + 1)
+            for existing in self._series.values():
+                if existing.max_points > limit:
+                    existing.resize(limit)
+            series = self._series[topic] = NumericSeries(limit, self.batch_size, self.initial_capacity)
+        series.append(timestamp, value)
+
+    def series(self, topic: str) -> Optional[NumericSeries]:
+        """获取主题的时间序列"""
+        return self._series.get(topic)
+
+    def stats(self, topic: str, since: Optional[float] = None,
+              until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """时间范围内的count/min/max/mean/std/p50/p95/last，没有数据时返回None"""
+        series = self._series.get(topic)
+        if series is None:
+            return None
+        ts, values = series.window(since, until)
+        if len(values) == 0:
+            return None
+        p50, p95 = np.percentile(values, [50, 95])
+        return {
+            "count": int(len(values)),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "mean": round(float(values.mean()), 3),
+            "std": round(float(values.std()), 3),
+            "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3),
+            "last": float(values[-1]),
+            "first_ts": float(ts[0]),
+            "last_ts": float(ts[-1])
+        }
+
+    def range(self, topic: str, since: Optional[float] = None, until: Optional[float] = None,
+              max_points: int = 200) -> Optional[Dict[str, Any]]:
+        """
+        时间范围内的数据点，超过max_points时按等宽时间段降采样为每段的均值/最小/最大
+
+        Returns:
+            Dict: {"points": [[时间戳, 均值, 最小值, 最大值], ...], "count": 原始点数}
+        """
+        series = self._series.get(topic)
+        if series is None:
+            return None
+        ts, values = series.window(since, until)
+        count = len(values)
+        if count == 0:
+            return None
+        if count <= max_points:
+            points = np.column_stack((ts, values, values, values))
+        else:
+            edges = np.linspace(ts[0], ts[-1], max_points + 1)
+            bins = np.clip(np.searchsorted(edges, ts, side="right") - 1, 0, max_points - 1)
+            counts = np.bincount(bins, minlength=max_points)
+            sums = np.bincount(bins, weights=values, minlength=max_points)
+            mins = np.full(max_points, np.inf)
+            maxs = np.full(max_points, -np.inf)
+            np.minimum.at(mins, bins, values)
+            np.maximum.at(maxs, bins, values)
+            filled = counts > 0
+            centers = (edges[:-1] + edges[1:]) / 2
+            points = np.column_stack((centers[filled], sums[filled] / counts[filled],
+                                      mins[filled], maxs[filled]))
+        return {"count": int(count), "points": np.round(points, 3).tolist()}
+
+    def trend(self, topic: str, since: Optional[float] = None,
+              until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """最小二乘线性趋势：每小时变化量和拟合优度，少于2个点时返回None"""
+        series = self._series.get(topic)
+        if series is None:
+            return None
+        ts, values = series.window(since, until)
+        if len(values) < 2 or ts[-1] == ts[0]:
+            return None
+        hours = (ts - ts[0]) / 3600.0
+        slope, intercept = np.polyfit(hours, values, 1)
+        fitted = slope * hours + intercept
+        residual = float(((values - fitted) ** 2).sum())
+        total = float(((values - values.mean()) ** 2).sum())
+        return {
+            "count": int(len(values)),
+            "slope_per_hour": round(float(slope), 4),
+            "r_squared": round(1 - residual / total, 4) if total > 0 else 1.0,
+            "start_value": round(float(intercept), 3),
+            "end_value": round(float(fitted[-1]), 3)
+        }
+
+    def topics(self) -> List[str]:
+        """获取有数据的主题"""
+        return list(self._series)
+
+    def memory_bytes(self) -> int:
+        """数组占用的内存"""
+        return sum(s._ts.nbytes + s._values.nbytes for s in self._series.values())
@@ -0,0 +1,274 @@
+"""
+离线命令发件箱模块
+
+MQTT未连接时，空调控制命令进入有界发件箱而不是直接失败，连接恢复后按顺序发送。
+同一设备同一属性的后一条命令覆盖前一条（只有最新的设置有意义），每条命令有自己的
+有效期，过期的命令不再发送。
+
+发件箱可以用追加写入的JSON Lines文件持久化：每次入队写一条put记录，发送、覆盖或过期
+写一条done记录；启动时重放文件恢复未发送的命令。死记录过多时整体重写文件。
+同一轮事件循环中写入的记录合并为一次fsync（批量设置上千个教室时只同步一次）。
+
+过期命令按到期时间的小顶堆惰性移除，入队和取出时只检查堆顶。
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+
+class OutboxEntry:
+    """发件箱中的一条命令"""
+
+    __slots__ = ("seq", "room", "attribute", "topic", "payload", "queued_at", "expires_at")
+
+    def __init__(self, seq: int, room: str, attribute: str, topic: str, payload: str,
+                 queued_at: float, expires_at: float):
+        self.seq = seq
+        self.room = room
+        self.attribute = attribute
+        self.topic = topic
+        self.payload = payload
+        self.queued_at = queued_at
+        self.expires_at = expires_at
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"op": "put", "seq": self.seq, "room": self.room, "attribute": self.attribute,
+                "topic": self.topic, "payload": self.payload, "queued_at": self.queued_at,
+                "expires_at": self.expires_at}
+
+
+class CommandOutbox:
+    """
+    有界的离线命令发件箱
+
+    所有方法都在事件循环中调用。
+    """
+
+    def __init__(self, logger: logging.Logger, path: Optional[str] = None,
+                 max_size: int = 1000, ttl: float = 300.0):
+        """
+        初始化发件箱
+
+        Args:
+            logger: 日志记录器实例
+            path: 持久化文件路径，为空时只保存在内存中
+            max_size: 最多保存的命令数量（按设备和属性去重后）
+            ttl: 命令默认的有效期（秒）
+        """
+        self.logger = logger
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        # (教室, 属性) -> 命令，字典按入队顺序排列
+        self._entries: Dict[Tuple[str, str], OutboxEntry] = {}
+        # (到期时间, 序号, 键)，被覆盖或已发送的命令留在堆中，取出时按序号识别并跳过
+        self._expiry: List[Tuple[float, int, Tuple[str, str]]] = []
+        self._seq = 0
+        self._file: Optional[TextIO] = None
+        self._file_records = 0
+        self._unsynced = False
+        self._sync_scheduled = False
+        self.enqueued = 0
+        self.replaced = 0
+        self.expired = 0
+        self.flushed = 0
+        self.rejected = 0
+        if path:
+            self._load(path)
+
+    # ------------------------------------------------------------------
+    # 入队与出队
+    # ------------------------------------------------------------------
+
+    def put(self, room: str, attribute: str, topic: str, payload: str,
+            ttl: Optional[float] = None, now: Optional[float] = None) -> Optional[OutboxEntry]:
+        """
+        加入一条命令，覆盖同一设备同一属性的旧命令
+
+        Returns:
+            OutboxEntry: 入队的命令；发件箱已满时返回None
+        """
+        now = time.time() if now is None else now
+        self.expire(now)
+        key = (room, attribute)
+        previous = self._entries.pop(key, None)
+        if previous is None and len(self._entries) >= self.max_size:
+            self.rejected += 1
+            return None
+        self._seq += 1
+        entry = OutboxEntry(self._seq, room, attribute, topic, payload, now,
+                            now + (self.ttl if ttl is None else ttl))
+        self._entries[key] = entry
+        heapq.heappush(self._expiry, (entry.expires_at, entry.seq, key))
+        if previous is not None:
+            self.replaced += 1
+            self._append({"op": "done", "seq": previous.seq})
+        self._append(entry.to_record())
+        self.enqueued += 1
+        return entry
+
+    def take(self, now: Optional[float] = None) -> List[OutboxEntry]:
+        """按入队顺序返回所有未过期的命令（不移除，发送成功后调用complete）"""
+        self.expire(time.time() if now is None else now)
+        return list(self._entries.values())
+
+    def complete(self, entry: OutboxEntry) -> bool:
+        """命令已被broker确认，从发件箱移除（期间被新命令覆盖时不移除新命令）"""
+        key = (entry.room, entry.attribute)
+        current = self._entries.get(key)
+        if current is None or current.seq != entry.seq:
+            return False
+        del self._entries[key]
+        self.flushed += 1
+        self._append({"op": "done", "seq": entry.seq})
+        self._maybe_compact()
+        return True
+
+    def discard(self, room: str, attribute: str) -> bool:
+        """丢弃设备尚未发送的命令（例如连接恢复后又直接发送了新命令）"""
+        entry = self._entries.pop((room, attribute), None)
+        if entry is None:
+            return False
+        self.replaced += 1
+        self._append({"op": "done", "seq": entry.seq})
+        return True
+
+    def expire(self, now: float) -> int:
+        """移除过期的命令，返回移除数量"""
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, seq, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            if entry is None or entry.seq != seq:
+                continue
+            del self._entries[key]
+            self._append({"op": "done", "seq": seq})
+            expired += 1
+        self.expired += expired
+        if len(self._expiry) > 2 * len(self._entries) + 100:
+            self._rebuild_expiry()
+        return expired
+
+    def _rebuild_expiry(self) -> None:
+        self._expiry = [(entry.expires_at, entry.seq, key) for key, entry in self._entries.items()]
+        heapq.heapify(self._expiry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def _load(self, path: str) -> None:
+        """重放持久化文件，恢复尚未发送的命令"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        by_seq: Dict[int, OutboxEntry] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写入中断留下的半行
+                        continue
+                    try:
+                        seq = int(record["seq"])
+                        if record["op"] == "put":
+                            by_seq[seq] = OutboxEntry(seq, str(record["room"]), str(record["attribute"]),
+                                                      str(record["topic"]), str(record["payload"]),
+                                                      float(record["queued_at"]), float(record["expires_at"]))
+                        elif record["op"] == "done":
+                            by_seq.pop(seq, None)
+                    except (KeyError, TypeError, ValueError):
+                        # 截断或手工修改过的记录：跳过，不影响启动
+                        self.logger.warning(f"Skipping malformed outbox record at {path}:{number}")
+                        continue
+                    self._seq = max(self._seq, seq)
+        for seq in sorted(by_seq):
+            entry = by_seq[seq]
+            self._entries.pop((entry.room, entry.attribute), None)
+            self._entries[(entry.room, entry.attribute)] = entry
+        self._rebuild_expiry()
+        self._rewrite()
+        if self._entries:
+            self.logger.info(f"Recovered {len(self._entries)} queued AC commands from {path}")
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file_records += 1
+        self._unsynced = True
+        if self._sync_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中（启动恢复、测试）：立即同步
+            self.sync()
+            return
+        # 本轮事件循环中的其他记录一起在下一轮开始前同步
+        self._sync_scheduled = True
+        loop.call_soon(self.sync)
+
+    def sync(self) -> None:
+        """把已写入的记录刷到磁盘（同一轮事件循环中的多条记录共用一次fsync）"""
+        self._sync_scheduled = False
+        if self._file is None or not self._unsynced:
+            return
+        self._unsynced = False
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _maybe_compact(self) -> None:
+        if self._file is not None and self._file_records > 2 * len(self._entries) + 100:
+            self._rewrite()
+
+    def _rewrite(self) -> None:
+        """只保留存活的命令重写文件（写临时文件后原子替换）"""
+        path = self.path
+        if not path:
+            return
+        if self._file is not None:
+            self._file.close()
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry.to_record(), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self._file = open(path, "a", encoding="utf-8")
+        self._file_records = len(self._entries)
+        self._unsynced = False
+
+    def close(self) -> None:
+        """同步并关闭持久化文件"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """获取发件箱统计"""
+        oldest = min((entry.queued_at for entry in self._entries.values()), default=None)
+        return {
+            "depth": len(self._entries),
+            "max_size": self.max_size,
+            "default_ttl_seconds": self.ttl,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest is not None else None,
+            "enqueued": self.enqueued,
+            "replaced": self.replaced,
+            "expired": self.expired,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "durable": bool(self.path),
+            "file_records": self._file_records
+        }
@@ -0,0 +1,137 @@
+"""
+空调命令合并调度模块
+
+每条空调命令都会变成一次MQTT发布、一次eKuiper REST动作和一次EdgeX core-command写入。
+CommandScheduler按(教室, 属性)合并短时间内的连续命令：窗口外的第一条命令立即发送并
+打开一个合并窗口，窗口内后到的命令互相覆盖（最后一次写入生效），窗口结束时只发送最新的值。
+单独的一次设置因此没有额外延迟，只有连续设置才会被合并。
+如果设备缓存的状态已经等于要设置的值，则不发送（空操作抑制）。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Slot:
+    """等待合并窗口结束的命令"""
+
+    __slots__ = ("value", "command", "options", "future", "task")
+
+    def __init__(self):
+        # 窗口内没有等待发送的命令时future为None
+        self.value: Any = None
+        self.command: Dict[str, Any] = {}
+        self.options: Dict[str, Any] = {}
+        self.future: Optional[asyncio.Future] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class CommandScheduler:
+    """
+    按设备合并命令的调度器
+
+    所有方法都在事件循环中调用。
+    """
+
+    def __init__(self, send: Callable[..., Awaitable[Dict[str, Any]]],
+                 window: float = 1.0,
+                 is_noop: Optional[Callable[[str, str, Any], bool]] = None):
+        """
+        初始化调度器
+
+        Args:
+            send: 发送命令的协程函数，参数为(教室, 命令, **options)，返回发送结果
+            window: 合并窗口（秒），0表示不合并
+            is_noop: 判断设备当前状态是否已经等于目标值的函数，参数为(教室, 属性, 值)
+        """
+        self.send = send
+        self.window = window
+        self.is_noop = is_noop
+        self._slots: Dict[Tuple[str, str], _Slot] = {}
+        self.submitted = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.suppressed = 0
+
+    async def submit(self, room: str, attribute: str, value: Any,
+                     command: Dict[str, Any], **options: Any) -> Dict[str, Any]:
+        """
+        提交一条命令，等待它被发送、被后续命令覆盖或被判定为空操作
+
+        Args:
+            options: 发送时传给send的关键字参数（被覆盖时使用最新命令的参数）
+
+        Returns:
+            Dict: 发送结果；被覆盖时为 {"success": True, "coalesced": True, "superseded_by": 新值}，
+            空操作时为 {"success": True, "no_op": True}
+        """
+        self.submitted += 1
+        if self.window <= 0:
+            return await self._dispatch(room, attribute, value, command, options)
+
+        key = (room, attribute)
+        slot = self._slots.get(key)
+        if slot is None:
+            # 窗口外的第一条命令立即发送，同时打开合并窗口
+            slot = self._slots[key] = _Slot()
+            slot.task = asyncio.get_running_loop().create_task(self._close_window(key, slot))
+            return await self._dispatch(room, attribute, value, command, options)
+
+        if slot.future is not None:
+            self._resolve_superseded(slot, value)
+        future = asyncio.get_running_loop().create_future()
+        slot.value, slot.command, slot.options, slot.future = value, command, options, future
+        # 调用方被取消时不影响窗口结束后的发送
+        return await asyncio.shield(future)
+
+    def supersede(self, room: str, attribute: str, value: Any) -> bool:
+        """其他途径（如批量命令）已经写入同一设备时，丢弃等待中的命令并关闭合并窗口"""
+        slot = self._slots.pop((room, attribute), None)
+        if slot is None:
+            return False
+        if slot.task is not None:
+            slot.task.cancel()
+        if slot.future is None:
+            return False
+        self._resolve_superseded(slot, value)
+        return True
+
+    def _resolve_superseded(self, slot: _Slot, value: Any) -> None:
+        self.coalesced += 1
+        if slot.future is not None and not slot.future.done():
+            slot.future.set_result({"success": True, "coalesced": True, "superseded_by": value})
+
+    async def _close_window(self, key: Tuple[str, str], slot: _Slot) -> None:
+        await asyncio.sleep(self.window)
+        if self._slots.get(key) is slot:
+            del self._slots[key]
+        if slot.future is None:
+            return
+        try:
+            outcome = await self._dispatch(key[0], key[1], slot.value, slot.command, slot.options)
+        except Exception as e:
+            outcome = {"success": False, "error": str(e)}
+        if not slot.future.done():
+            slot.future.set_result(outcome)
+
+    async def _dispatch(self, room: str, attribute: str, value: Any,
+                        command: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+        if self.is_noop is not None and self.is_noop(room, attribute, value):
+            self.suppressed += 1
+            return {"success": True, "no_op": True}
+        self.sent += 1
+        return await self.send(room, command, **options)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计：saved_writes为没有发送到下游的命令数"""
+        saved = self.coalesced + self.suppressed
+        return {
+            "window_seconds": self.window,
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "suppressed_noop": self.suppressed,
+            "saved_writes": saved,
+            "saved_ratio": round(saved / self.submitted, 4) if self.submitted else 0.0,
+            "pending": sum(1 for slot in self._slots.values() if slot.future is not None)
+        }
@@ -17,6 +17,27 @@ EMQX_API_URL = os.getenv("EMQX_API_URL", "")  # Base URL for the EMQX HTTP API
 EMQX_API_KEY = os.getenv("EMQX_API_KEY", "")  # API key for authentication
 EMQX_API_SECRET = os.getenv("EMQX_API_SECRET", "")  # API secret for authentication
 
+# EMQX HTTP API connection pool configuration
+EMQX_HTTP2 = os.getenv("EMQX_HTTP2", "true").lower() == "true"  # Use HTTP/2 when the h2 package is installed
+EMQX_HTTP_TIMEOUT = float(os.getenv("EMQX_HTTP_TIMEOUT", "30"))  # Request timeout in seconds
+EMQX_HTTP_MAX_CONNECTIONS = int(os.getenv("EMQX_HTTP_MAX_CONNECTIONS", "20"))  # Max concurrent connections
+EMQX_HTTP_MAX_KEEPALIVE = int(os.getenv("EMQX_HTTP_MAX_KEEPALIVE", "10"))  # Max idle keep-alive connections
+EMQX_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("EMQX_HTTP_KEEPALIVE_EXPIRY", "60"))  # Idle connection lifetime (s)
+EMQX_API_VERIFY_SSL = os.getenv("EMQX_API_VERIFY_SSL", "true").lower() == "true"  # Verify HTTPS certificates
+
+# EMQX bulk publish configuration (POST /publish/bulk)
+EMQX_BULK_PUBLISH_CHUNK_SIZE = int(os.getenv("EMQX_BULK_PUBLISH_CHUNK_SIZE", "100"))  # Messages per bulk request
+EMQX_BULK_PUBLISH_CONCURRENCY = int(os.getenv("EMQX_BULK_PUBLISH_CONCURRENCY", "4"))  # Bulk requests in flight
+
+# EMQX read-only API response cache (list_clients / get_client_info)
+EMQX_API_CACHE_TTL = float(os.getenv("EMQX_API_CACHE_TTL", "5"))  # Seconds a response stays fresh, 0 disables
+EMQX_API_CACHE_SIZE = int(os.getenv("EMQX_API_CACHE_SIZE", "256"))  # Max cached responses (LRU)
+
+# EMQX client listing pagination (GET /clients)
+EMQX_CLIENT_PAGE_SIZE = int(os.getenv("EMQX_CLIENT_PAGE_SIZE", "1000"))  # Clients per page (max 10000)
+EMQX_CLIENT_PAGE_CONCURRENCY = int(os.getenv("EMQX_CLIENT_PAGE_CONCURRENCY", "4"))  # Page requests in flight
+EMQX_CLIENT_BATCH_CONCURRENCY = int(os.getenv("EMQX_CLIENT_BATCH_CONCURRENCY", "16"))  # Per-client calls in flight
+
 # EMQX MQTT Broker configuration for direct MQTT connections
 # Used for subscribing to topics and real-time message monitoring
 EMQX_BROKER_HOST = os.getenv("EMQX_BROKER_HOST", "")  # MQTT broker hostname
@@ -26,12 +47,71 @@ EMQX_PASSWORD = os.getenv("EMQX_PASSWORD", "")  # MQTT password
 EMQX_USE_SSL = os.getenv("EMQX_USE_SSL", "false").lower() == "true"  # Enable SSL/TLS
 
 # Temperature Control System specific configuration
-CLASSROOM_ID = os.getenv("CLASSROOM_ID", "classroom_01")  # Default classroom ID
+CLASSROOM_ID = os.getenv("CLASSROOM_ID", "classroom_01")  # Default classroom ID (the only room in single-room mode)
 CLASSROOM_TOPIC_PREFIX = os.getenv("CLASSROOM_TOPIC_PREFIX", "classroom")  # Topic prefix for classroom messages
+# Multi-room mode: subscribe to {prefix}/+/temperature etc. and index state by room
+CLASSROOM_MULTI_ROOM = os.getenv("CLASSROOM_MULTI_ROOM", "false").lower() == "true"
+MQTT_EAGER_CONNECT = os.getenv("MQTT_EAGER_CONNECT", "true").lower() == "true"  # Connect and subscribe device topics at startup
+SENSOR_FIRST_VALUE_WAIT = float(os.getenv("SENSOR_FIRST_VALUE_WAIT", "2.0"))  # Seconds a query waits for a first reading, 0 = don't wait
 
 # Temperature Control tool configuration
 MESSAGE_HISTORY_SIZE = int(os.getenv("MESSAGE_HISTORY_SIZE", "20"))  # Number of messages to keep in history
 AC_TEMP_MIN = float(os.getenv("AC_TEMP_MIN", "18"))  # Minimum AC temperature (°C)
 AC_TEMP_MAX = float(os.getenv("AC_TEMP_MAX", "28"))  # Maximum AC temperature (°C)
+AC_ROUNDTRIP_TIMEOUT = float(os.getenv("AC_ROUNDTRIP_TIMEOUT", "120"))  # Seconds for a command to show up in AC status
+# The first command for a device is sent at once; later ones within the window are coalesced (last write wins)
+AC_COMMAND_COALESCE_SECONDS = float(os.getenv("AC_COMMAND_COALESCE_SECONDS", "1.0"))  # Coalesce window, 0 = off
+AC_SUPPRESS_NOOP = os.getenv("AC_SUPPRESS_NOOP", "true").lower() == "true"  # Skip commands matching cached AC status
+AC_OUTBOX_SIZE = int(os.getenv("AC_OUTBOX_SIZE", "1000"))  # Commands kept while MQTT is down, 0 = fail instead
+AC_OUTBOX_TTL = float(os.getenv("AC_OUTBOX_TTL", "300"))  # Default seconds a queued command stays valid
+AC_OUTBOX_FILE = os.getenv("AC_OUTBOX_FILE", "")  # Append-only outbox file, empty keeps the outbox in memory
 MQTT_KEEPALIVE = int(os.getenv("MQTT_KEEPALIVE", "60"))  # MQTT keepalive timeout
-SSL_VERIFY_CERTS = os.getenv("SSL_VERIFY_CERTS", "false").lower() == "true"  # Verify SSL certificates
\ No newline at end of file
+SSL_VERIFY_CERTS = os.getenv("SSL_VERIFY_CERTS", "false").lower() == "true"  # Verify SSL certificates
+MQTT_MAX_INFLIGHT = int(os.getenv("MQTT_MAX_INFLIGHT", "100"))  # Unacknowledged QoS 1/2 publishes on the connection
+MQTT_PUBLISH_ACK_TIMEOUT = float(os.getenv("MQTT_PUBLISH_ACK_TIMEOUT", "10"))  # Seconds to wait for PUBACK
+
+# Optional disk-backed message log (append-only segments, read through mmap)
+MESSAGE_LOG_DIR = os.getenv("MESSAGE_LOG_DIR", "")  # Segment directory, empty disables the disk log
+MESSAGE_LOG_SEGMENT_MB = float(os.getenv("MESSAGE_LOG_SEGMENT_MB", "64"))  # Rotate a segment after this size
+MESSAGE_LOG_SEGMENT_SECONDS = float(os.getenv("MESSAGE_LOG_SEGMENT_SECONDS", "3600"))  # ... or after this age
+MESSAGE_LOG_RETENTION_HOURS = float(os.getenv("MESSAGE_LOG_RETENTION_HOURS", "168"))  # 0 keeps segments forever
+MESSAGE_LOG_INDEX_INTERVAL = int(os.getenv("MESSAGE_LOG_INDEX_INTERVAL", "64"))  # Records per sparse index point
+if not 0 < MESSAGE_LOG_SEGMENT_MB < 4096:
+    # Record headers store in-segment offsets as u32
+    raise ValueError(f"MESSAGE_LOG_SEGMENT_MB must be between 0 and 4096 (got {MESSAGE_LOG_SEGMENT_MB:g})")
+
+# Optional NumPy columnar store for numeric sensor series
+COLUMNAR_STORE = os.getenv("COLUMNAR_STORE", "auto").lower()  # auto (use if numpy is installed) or off
+# A point costs 16 bytes (timestamp + value), up to 32 bytes with array growth headroom:
+# 100k points per topic is 1.6-3.2 MB, the 4M point total budget is 64-128 MB across all topics
+COLUMNAR_MAX_POINTS = int(os.getenv("COLUMNAR_MAX_POINTS", "100000"))  # Points kept per sensor topic
+COLUMNAR_TOTAL_POINTS = int(os.getenv("COLUMNAR_TOTAL_POINTS", "4000000"))  # Shared by all topics, 0 = per-topic cap only
+
+# Sensor rollups (min/max/avg per time bucket). A bucket costs about 200 bytes, so the default
+# tiers hold about 2800 buckets (0.6 MB) per topic once their retention has filled up
+ROLLUP_TIERS = os.getenv("ROLLUP_TIERS", "1m:24h,15m:7d,1h:30d")  # Bucket width:retention per tier
+ROLLUP_MAX_TOPICS = int(os.getenv("ROLLUP_MAX_TOPICS", "200"))  # Least recently updated topics evicted beyond this, 0 = unlimited
+
+# MQTT ingest queue configuration (paho network thread -> asyncio event loop)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))  # Max pending messages before overflow
+INGEST_OVERFLOW_POLICY = os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest")  # drop_oldest or drop_newest
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))  # Messages applied per event loop batch
+# Topics routed through the priority lane (never dropped behind sensor floods)
+INGEST_PRIORITY_TOPICS = [t.strip() for t in os.getenv(
+    "INGEST_PRIORITY_TOPICS",
+    f"{CLASSROOM_TOPIC_PREFIX}/ac/power/status,{CLASSROOM_TOPIC_PREFIX}/ac/temperature/status"
+).split(",") if t.strip()]
+
+# Tool groups registered at startup (messages, clients, subscriptions, classroom); modules of
+# disabled groups are never imported
+TOOL_GROUPS = [g.strip() for g in os.getenv("TOOL_GROUPS", "messages,clients,subscriptions,classroom").split(",") if g.strip()]
+
+# Server metrics: optional Prometheus text endpoint (GET /metrics) on a local port
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Port for the Prometheus endpoint, 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Bind address for the Prometheus endpoint
+
+# Logging pipeline configuration (queue-based, rate limited per MQTT topic)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # Root log level
+LOG_TOPIC_RATE = int(os.getenv("LOG_TOPIC_RATE", "5"))  # Per-topic message log lines per window, 0 = unlimited
+LOG_TOPIC_INTERVAL = float(os.getenv("LOG_TOPIC_INTERVAL", "10"))  # Rate limit window in seconds
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Pending log records before new ones are dropped
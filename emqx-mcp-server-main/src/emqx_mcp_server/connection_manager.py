@@ -0,0 +1,433 @@
+"""
+MQTT连接管理模块
+
+基于BaseMQTTClient提供进程内唯一的MQTT连接：一个broker连接、一个网络线程、
+一份消息历史。各工具类不再创建自己的paho客户端，而是向连接管理器注册
+主题消费者，由管理器负责订阅、断线重连后的重新订阅和消息分发。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import paho.mqtt.client as mqtt
+from .mqtt_base import BaseMQTTClient
+from .log_pipeline import TOPIC_ATTR
+from .metrics import HistogramSet
+from .publish_tracker import PublishTracker
+from .topic_trie import topic_matches, validate_filter
+from .config import MQTT_MAX_INFLIGHT, MQTT_PUBLISH_ACK_TIMEOUT
+
+
+class TopicConsumer:
+    """
+    主题消费者
+
+    parser在MQTT网络线程中对消息做预处理（如JSON解析），
+    handler在事件循环中接收消息和预处理结果。
+    """
+
+    __slots__ = ("name", "topic_filter", "handler", "parser", "priority", "qos",
+                 "messages", "errors", "dispatch_ns", "max_dispatch_ns", "parse_ns")
+
+    def __init__(self, name: str, topic_filter: str, handler: Callable[[Dict, Any], None],
+                 parser: Optional[Callable[[Dict, float], Any]] = None,
+                 priority: bool = False, qos: int = 0):
+        self.name = name
+        self.topic_filter = topic_filter
+        self.handler = handler
+        self.parser = parser
+        self.priority = priority
+        self.qos = qos
+        self.messages = 0
+        self.errors = 0
+        self.dispatch_ns = 0
+        self.max_dispatch_ns = 0
+        self.parse_ns = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """获取消费者的分发开销统计"""
+        messages = self.messages or 1
+        return {
+            "name": self.name,
+            "topic_filter": self.topic_filter,
+            "priority": self.priority,
+            "messages": self.messages,
+            "errors": self.errors,
+            "avg_dispatch_us": round(self.dispatch_ns / messages / 1000, 3),
+            "max_dispatch_us": round(self.max_dispatch_ns / 1000, 3),
+            "avg_parse_us": round(self.parse_ns / messages / 1000, 3),
+            "total_cost_ms": round((self.dispatch_ns + self.parse_ns) / 1e6, 3)
+        }
+
+
+class MQTTConnectionManager(BaseMQTTClient):
+    """
+    进程级MQTT连接管理器
+
+    所有工具共享同一个连接和消息历史，订阅按过滤器引用计数，
+    连接建立（包括重连）时自动恢复全部订阅。
+    """
+
+    def __init__(self, logger: logging.Logger, client_id_prefix: str = "emqx_mcp_server"):
+        """
+        初始化连接管理器
+
+        Args:
+            logger: 日志记录器实例
+            client_id_prefix: 客户端ID前缀
+        """
+        super().__init__(logger, client_id_prefix)
+        self._lock = threading.RLock()
+        self._consumers: List[TopicConsumer] = []
+        self._subscription_refs: Dict[str, int] = {}
+        self._subscription_qos: Dict[str, int] = {}
+        self._connect_listeners: List[Callable[[bool], None]] = []
+        self.publish_tracker = PublishTracker()
+        # 每个主题发布到broker确认的滚动延迟直方图（毫秒）和未确认次数
+        self.publish_latency = HistogramSet()
+        self.publish_timeouts: Dict[str, int] = {}
+        # 启动耗时：从创建连接管理器到连接建立、收到第一条消息和工具第一次给出答案（毫秒）
+        self.started_at = time.monotonic()
+        self.warm_start: Dict[str, Any] = {"connected_ms": None, "first_message_ms": None,
+                                           "first_answer_ms": None, "retained_messages": 0}
+
+    # ------------------------------------------------------------------
+    # 消费者与订阅管理
+    # ------------------------------------------------------------------
+
+    def register_consumer(self, name: str, topic_filter: str,
+                          handler: Callable[[Dict, Any], None],
+                          parser: Optional[Callable[[Dict, float], Any]] = None,
+                          priority: bool = False, qos: int = 0) -> TopicConsumer:
+        """
+        注册主题消费者并订阅其过滤器
+
+        Args:
+            name: 消费者名称，用于统计
+            topic_filter: MQTT主题过滤器（支持+和#）
+            handler: 在事件循环中调用，参数为(消息数据, parser结果)
+            parser: 在网络线程中调用的预处理函数，参数为(消息数据, 接收时间)
+            priority: 匹配的消息是否走优先通道
+            qos: 订阅的服务质量等级
+
+        Returns:
+            TopicConsumer: 注册的消费者
+        """
+        consumer = TopicConsumer(name, topic_filter, handler, parser, priority, qos)
+        with self._lock:
+            self.topic_consumers.insert(topic_filter, consumer)
+            self._consumers.append(consumer)
+            if priority:
+                self.priority_filters.insert(topic_filter, name)
+        self._acquire_subscription(topic_filter, qos)
+        return consumer
+
+    def unregister_consumer(self, consumer: TopicConsumer) -> None:
+        """注销主题消费者，过滤器不再被引用时取消订阅"""
+        with self._lock:
+            if consumer not in self._consumers:
+                return
+            self._consumers.remove(consumer)
+            self.topic_consumers.remove(consumer.topic_filter, consumer)
+            if consumer.priority:
+                self.priority_filters.remove(consumer.topic_filter, consumer.name)
+        self._release_subscription(consumer.topic_filter)
+
+    def subscribe(self, topic_filter: str, qos: int = 0):
+        """
+        订阅主题（不注册消费者，消息只进入共享历史）
+
+        Returns:
+            tuple: (结果码, 消息ID)，尚未连接时订阅会在连接建立后生效
+        """
+        return self._acquire_subscription(topic_filter, qos)
+
+    def unsubscribe(self, topic_filter: str):
+        """
+        取消订阅主题，仍被消费者引用的过滤器不会真正从broker取消
+
+        Returns:
+            tuple: (结果码, 消息ID)
+        """
+        return self._release_subscription(topic_filter)
+
+    def subscriptions(self) -> Dict[str, Dict]:
+        """获取当前的订阅及其引用计数"""
+        with self._lock:
+            return {
+                topic_filter: {"qos": self._subscription_qos[topic_filter], "refs": refs}
+                for topic_filter, refs in self._subscription_refs.items()
+            }
+
+    def add_connect_listener(self, callback: Callable[[bool], None]) -> None:
+        """注册连接状态监听器，连接建立或断开时在网络线程中调用callback(connected)"""
+        with self._lock:
+            self._connect_listeners.append(callback)
+
+    def _acquire_subscription(self, topic_filter: str, qos: int):
+        validate_filter(topic_filter)
+        with self._lock:
+            refs = self._subscription_refs.get(topic_filter, 0)
+            self._subscription_refs[topic_filter] = refs + 1
+            upgraded = qos > self._subscription_qos.get(topic_filter, -1)
+            if upgraded:
+                self._subscription_qos[topic_filter] = qos
+            client = self.mqtt_client
+        if client is not None and self.connected and (refs == 0 or upgraded):
+            return client.subscribe(topic_filter, qos)
+        return mqtt.MQTT_ERR_SUCCESS, None
+
+    def _release_subscription(self, topic_filter: str):
+        with self._lock:
+            refs = self._subscription_refs.get(topic_filter, 0)
+            if refs <= 1:
+                self._subscription_refs.pop(topic_filter, None)
+                self._subscription_qos.pop(topic_filter, None)
+            else:
+                self._subscription_refs[topic_filter] = refs - 1
+            client = self.mqtt_client
+        if refs == 1 and client is not None and self.connected:
+            return client.unsubscribe(topic_filter)
+        return mqtt.MQTT_ERR_SUCCESS, None
+
+    # ------------------------------------------------------------------
+    # 连接与消息回调
+    # ------------------------------------------------------------------
+
+    def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False):
+        """通过共享连接发布消息，返回paho的MQTTMessageInfo"""
+        if self.mqtt_client is None:
+            raise RuntimeError("MQTT client not initialized")
+        return self.mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+
+    async def publish_and_wait(self, topic: str, payload: str, qos: int = 1,
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        发布消息并等待broker确认（QoS 0只等待进入发送队列）
+
+        Args:
+            topic: 消息主题
+            payload: 消息内容
+            qos: 服务质量等级
+            timeout: 等待PUBACK的秒数，默认MQTT_PUBLISH_ACK_TIMEOUT
+
+        Returns:
+            Dict: {"success", "mid", "acked", "latency_ms"}，失败时包含error
+        """
+        timeout = MQTT_PUBLISH_ACK_TIMEOUT if timeout is None else timeout
+        started_at = time.monotonic()
+        try:
+            info = self.publish(topic, payload, qos=qos)
+        except Exception as e:
+            return {"success": False, "acked": False, "error": str(e)}
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return {"success": False, "mid": info.mid, "acked": False,
+                    "error": f"publish failed: {mqtt.error_string(info.rc)}"}
+        if qos == 0:
+            return {"success": True, "mid": info.mid, "acked": False}
+
+        future = self.publish_tracker.register(info.mid, started_at)
+        try:
+            acked_at = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.publish_tracker.discard(info.mid)
+            self.publish_timeouts[topic] = self.publish_timeouts.get(topic, 0) + 1
+            return {"success": False, "mid": info.mid, "acked": False,
+                    "error": f"no broker acknowledgement within {timeout}s"}
+        except asyncio.CancelledError:
+            self.publish_tracker.discard(info.mid)
+            raise
+        latency_ms = (acked_at - started_at) * 1000
+        self.publish_latency.observe(topic, latency_ms)
+        return {"success": True, "mid": info.mid, "acked": True, "latency_ms": round(latency_ms, 3)}
+
+    async def publish_many(self, messages: Sequence[Tuple[str, str]], qos: int = 1,
+                           window: Optional[int] = None,
+                           timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        流水线发布一批消息：最多window条消息同时等待确认，不逐条等待往返
+
+        Args:
+            messages: (主题, 内容) 列表
+            qos: 服务质量等级
+            window: 同时未确认的最大消息数，默认MQTT_MAX_INFLIGHT
+            timeout: 每条消息等待PUBACK的秒数
+
+        Returns:
+            List[Dict]: 与messages顺序一致的publish_and_wait结果
+        """
+        semaphore = asyncio.Semaphore(max(1, window or MQTT_MAX_INFLIGHT))
+
+        async def publish_one(topic: str, payload: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.publish_and_wait(topic, payload, qos, timeout)
+
+        return await asyncio.gather(*(publish_one(topic, payload) for topic, payload in messages))
+
+    def _on_publish(self, client, userdata, mid):
+        """网络线程：broker确认后完成等待中的Future"""
+        self.publish_tracker.on_publish(mid)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        """连接建立后恢复全部订阅并通知监听器"""
+        super()._on_connect(client, userdata, flags, rc)
+        if rc == 0:
+            self._mark_warm_start("connected_ms")
+            with self._lock:
+                subscriptions = list(self._subscription_qos.items())
+            if subscriptions:
+                client.subscribe(subscriptions)
+                self.logger.info(f"Subscribed to {len(subscriptions)} topic filters on shared MQTT connection")
+        self._notify_listeners(rc == 0)
+
+    def _on_disconnect(self, client, userdata, rc):
+        super()._on_disconnect(client, userdata, rc)
+        self._notify_listeners(False)
+
+    def _notify_listeners(self, connected: bool) -> None:
+        with self._lock:
+            listeners = list(self._connect_listeners)
+        for callback in listeners:
+            try:
+                callback(connected)
+            except Exception as e:
+                self.logger.error(f"Connection listener error: {str(e)}")
+
+    def _on_message(self, client, userdata, msg):
+        """网络线程：解码消息，执行消费者预处理后交给事件循环"""
+        started = time.perf_counter()
+        topic = msg.topic
+        self._count_message(topic, len(msg.payload))
+        payload = msg.payload.decode('utf-8')
+        received_at = time.time()
+        if msg.retain:
+            self.warm_start["retained_messages"] += 1
+        if self.warm_start["first_message_ms"] is None:
+            self._mark_warm_start("first_message_ms")
+
+        message_data = {
+            "timestamp": datetime.fromtimestamp(received_at).isoformat(),
+            "topic": topic,
+            "payload": payload,
+            "qos": msg.qos,
+            "retain": msg.retain
+        }
+
+        deliveries = []
+        priority = False
+        for consumer in self.topic_consumers.match(topic):
+            parsed = None
+            if consumer.parser is not None:
+                start = time.perf_counter_ns()
+                try:
+                    parsed = consumer.parser(message_data, received_at)
+                except Exception as e:
+                    consumer.errors += 1
+                    self.logger.error(f"Consumer {consumer.name} failed to parse {topic}: {str(e)}")
+                consumer.parse_ns += time.perf_counter_ns() - start
+            deliveries.append((consumer, parsed))
+            priority = priority or consumer.priority
+
+        self.ingest_queue.put((topic, message_data, received_at, deliveries),
+                              priority=priority or self.priority_filters.has_match(topic))
+
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Received message from %s: %s", topic, payload, extra={TOPIC_ATTR: topic})
+        self._ingest_callback_ms.observe((time.perf_counter() - started) * 1000)
+
+    def _mark_warm_start(self, key: str) -> None:
+        if self.warm_start[key] is None:
+            self.warm_start[key] = round((time.monotonic() - self.started_at) * 1000, 3)
+
+    def record_first_answer(self) -> None:
+        """工具第一次用设备数据给出答案时调用，记录启动到首个答案的耗时"""
+        if self.warm_start["first_answer_ms"] is None:
+            self._mark_warm_start("first_answer_ms")
+            self.logger.info(f"First device answer {self.warm_start['first_answer_ms']}ms after startup")
+
+    def _apply_message(self, item):
+        """事件循环：写入共享历史并分发给消费者，记录每个消费者的分发开销"""
+        started = time.perf_counter()
+        topic, message_data, received_at, deliveries = item
+        self.message_history.append(topic, message_data, received_at)
+        if self.message_log is not None:
+            self._append_to_log(topic, message_data, received_at)
+        for consumer, parsed in deliveries:
+            start = time.perf_counter_ns()
+            try:
+                consumer.handler(message_data, parsed)
+            except Exception as e:
+                consumer.errors += 1
+                self.logger.error(f"Consumer {consumer.name} failed on {topic}: {str(e)}")
+            elapsed = time.perf_counter_ns() - start
+            consumer.messages += 1
+            consumer.dispatch_ns += elapsed
+            if elapsed > consumer.max_dispatch_ns:
+                consumer.max_dispatch_ns = elapsed
+        self._dispatch_ms.observe((time.perf_counter() - started) * 1000)
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def publish_latency_stats(self, topic_filter: Optional[str] = None,
+                              limit: int = 20) -> Dict[str, Any]:
+        """
+        获取发布到broker确认的延迟统计
+
+        Args:
+            topic_filter: 只返回匹配该过滤器的主题
+            limit: 最多返回的主题数量（按p95从高到低）
+
+        Returns:
+            Dict: 每个主题滚动窗口内的延迟分位数和未确认次数
+        """
+        topics = self.publish_latency.snapshot()
+        if topic_filter:
+            topics = {topic: stats for topic, stats in topics.items() if topic_matches(topic_filter, topic)}
+        for topic, stats in topics.items():
+            stats["timeouts"] = self.publish_timeouts.get(topic, 0)
+        return {
+            "tracked_topics": len(self.publish_latency),
+            "total_timeouts": sum(self.publish_timeouts.values()),
+            "topics": dict(list(topics.items())[:max(0, limit)])
+        }
+
+    def consumer_stats(self) -> List[Dict[str, Any]]:
+        """获取每个消费者的分发开销统计"""
+        with self._lock:
+            consumers = list(self._consumers)
+        return [consumer.stats() for consumer in consumers]
+
+    def status(self) -> Dict[str, Any]:
+        """获取共享连接的整体状态"""
+        return {
+            "connected": self.connected,
+            "client_initialized": self.mqtt_client is not None,
+            "subscriptions": self.subscriptions(),
+            "history_topics": len(self.message_history),
+            "message_log": self.message_log.stats() if self.message_log is not None else None,
+            "ingest": self.ingest_queue.stats(),
+            "publish_acks": {
+                **self.publish_tracker.stats(),
+                "timeouts": sum(self.publish_timeouts.values())
+            },
+            "consumers": self.consumer_stats(),
+            "warm_start": dict(self.warm_start)
+        }
+
+
+_manager: Optional[MQTTConnectionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_connection_manager(logger: logging.Logger) -> MQTTConnectionManager:
+    """获取进程内唯一的MQTT连接管理器（首次调用时创建）"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = MQTTConnectionManager(logger)
+        return _manager
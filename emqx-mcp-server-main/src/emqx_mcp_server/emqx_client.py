@@ -5,10 +5,25 @@ This module provides a client for interacting with the EMQX MQTT broker's HTTP A
 It handles authentication, request formatting, and response processing.
 """
 
+import asyncio
 import httpx
 import base64
 import logging
-from .config import EMQX_API_URL, EMQX_API_KEY, EMQX_API_SECRET
+import time
+from importlib.util import find_spec
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from .config import (EMQX_API_URL, EMQX_API_KEY, EMQX_API_SECRET, EMQX_HTTP2, EMQX_HTTP_TIMEOUT,
+                     EMQX_HTTP_MAX_CONNECTIONS, EMQX_HTTP_MAX_KEEPALIVE, EMQX_HTTP_KEEPALIVE_EXPIRY,
+                     EMQX_API_VERIFY_SSL, EMQX_BULK_PUBLISH_CHUNK_SIZE, EMQX_BULK_PUBLISH_CONCURRENCY,
+                     EMQX_CLIENT_PAGE_SIZE, EMQX_CLIENT_PAGE_CONCURRENCY, EMQX_API_CACHE_TTL,
+                     EMQX_API_CACHE_SIZE, EMQX_CLIENT_BATCH_CONCURRENCY)
+from .metrics import get_registry
+from .response_cache import TTLCache
+
+
+def _http2_available() -> bool:
+    """HTTP/2 support in httpx requires the optional h2 package"""
+    return find_spec("h2") is not None
 
 class EMQXClient:
     """
@@ -17,10 +32,18 @@ class EMQXClient:
     Provides methods to interact with EMQX Cloud or self-hosted EMQX broker 
     through its HTTP API. Handles authentication and error processing.
     
+    All requests share one long-lived, pooled httpx.AsyncClient so TCP and TLS
+    connections to EMQX are reused across tool calls. Call aclose() on shutdown.
+    
+    Read-only client lookups are served from a short-lived TTL cache, and
+    identical concurrent lookups share a single HTTP call.
+    
     Attributes:
         api_url (str): The base URL for the EMQX HTTP API
         api_key (str): API key for authentication
         api_secret (str): API secret for authentication
+        verify (bool): Whether to verify the API server's TLS certificate
+        cache (TTLCache): Response cache for read-only endpoints
         logger (Logger): Logger instance for logging messages
     """
 
@@ -34,16 +57,81 @@ class EMQXClient:
         self.api_url = EMQX_API_URL
         self.api_key = EMQX_API_KEY
         self.api_secret = EMQX_API_SECRET
+        self.verify = EMQX_API_VERIFY_SSL
         self.logger = logger
+        self._auth_header = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Error responses are never cached
+        self.cache = TTLCache(EMQX_API_CACHE_TTL, EMQX_API_CACHE_SIZE,
+                              cacheable=lambda result: "error" not in result)
+        # Request latency and outcome per endpoint template (e.g. /clients/{clientid})
+        registry = get_registry()
+        self._request_ms = registry.histogram(
+            "emqx_api_request_ms", "EMQX HTTP API request latency (ms)", ("method", "endpoint"))
+        self._requests = registry.counter(
+            "emqx_api_requests_total", "EMQX HTTP API requests by status code", ("method", "endpoint", "status"))
         
     def _get_auth_header(self):
-        """Create authorization header for EMQX Cloud API"""
-        auth_string = f"{self.api_key}:{self.api_secret}"
-        encoded_auth = base64.b64encode(auth_string.encode()).decode()
-        return {
-            "Authorization": f"Basic {encoded_auth}",
-            "Content-Type": "application/json"
-        }
+        """Create authorization header for EMQX Cloud API (computed once)"""
+        if self._auth_header is None:
+            auth_string = f"{self.api_key}:{self.api_secret}"
+            encoded_auth = base64.b64encode(auth_string.encode()).decode()
+            self._auth_header = {
+                "Authorization": f"Basic {encoded_auth}",
+                "Content-Type": "application/json"
+            }
+        return self._auth_header
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared pooled HTTP client, creating it on first use.
+        
+        The client is bound to the event loop it was created on; if called from a
+        different loop (e.g. after a restart in tests) a fresh client is created.
+        """
+        loop = asyncio.get_running_loop()
+        if self._http_client is not None and not self._http_client.is_closed \
+                and self._http_client_loop is loop:
+            return self._http_client
+        
+        http2 = EMQX_HTTP2 and _http2_available()
+        if EMQX_HTTP2 and not http2:
+            self.logger.info("h2 package not installed, EMQX API client falling back to HTTP/1.1")
+        self._http_client = httpx.AsyncClient(
+            headers=self._get_auth_header(),
+            http2=http2,
+            verify=self.verify,
+            timeout=httpx.Timeout(EMQX_HTTP_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=EMQX_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=EMQX_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=EMQX_HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        self._http_client_loop = loop
+        self.logger.info(f"EMQX API connection pool created (HTTP/2: {http2})")
+        return self._http_client
+    
+    async def aclose(self):
+        """Close the pooled HTTP client and its keep-alive connections"""
+        client, self._http_client = self._http_client, None
+        self._http_client_loop = None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+            self.logger.info("EMQX API connection pool closed")
+    
+    async def _request(self, method: str, endpoint: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request on the pooled client, recording latency and status for the endpoint template"""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._get_http_client().request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            self._request_ms.labels(method, endpoint).observe((time.perf_counter() - started) * 1000)
+            self._requests.labels(method, endpoint, status).inc()
     
     def _handle_response(self, response):
         """Process API response, extract data and handle errors"""
@@ -82,16 +170,96 @@ class EMQXClient:
             "retain": retain
         }
         self.logger.info(f"Publishing message to topic {topic}")
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, headers=self._get_auth_header(), json=data, timeout=30)
-                response.raise_for_status()
-                return self._handle_response(response)
-            except Exception as e:
-                self.logger.error(f"Error publishing message: {str(e)}")
-                return {"error": str(e)}
+        try:
+            response = await self._request("POST", "/publish", url, json=data)
+            response.raise_for_status()
+            return self._handle_response(response)
+        except Exception as e:
+            self.logger.error(f"Error publishing message: {str(e)}")
+            return {"error": str(e)}
+    
+    async def publish_batch(self, messages: List[Dict], chunk_size: Optional[int] = None,
+                            concurrency: Optional[int] = None):
+        """
+        Publish many messages through the EMQX bulk publish API.
+        
+        Messages are split into chunks sent to POST /publish/bulk, with at most
+        `concurrency` chunk requests in flight. EMQX answers each chunk with one
+        result per message, so results are reported per message in input order.
+        
+        Args:
+            messages (list): Entries with topic, payload and optional qos/retain
+            chunk_size (int, optional): Messages per bulk request. Defaults to
+                EMQX_BULK_PUBLISH_CHUNK_SIZE.
+            concurrency (int, optional): Max chunk requests in flight. Defaults to
+                EMQX_BULK_PUBLISH_CONCURRENCY.
+            
+        Returns:
+            dict: Summary counts and a per-message "results" list
+        """
+        url = f"{self.api_url}/publish/bulk"
+        chunk_size = max(1, chunk_size or EMQX_BULK_PUBLISH_CHUNK_SIZE)
+        semaphore = asyncio.Semaphore(max(1, concurrency or EMQX_BULK_PUBLISH_CONCURRENCY))
+        
+        entries = [{
+            "topic": message["topic"],
+            "payload": message["payload"],
+            "qos": message.get("qos", 0),
+            "retain": message.get("retain", False)
+        } for message in messages]
+        results: List[Optional[Dict]] = [None] * len(entries)
+        
+        async def send_chunk(start: int):
+            chunk = entries[start:start + chunk_size]
+            body = None
+            async with semaphore:
+                try:
+                    response = await self._request("POST", "/publish/bulk", url, json=chunk)
+                except Exception as e:
+                    self.logger.error(f"Error bulk publishing {len(chunk)} messages: {str(e)}")
+                    response, error = None, str(e)
+            if response is not None:
+                try:
+                    body = response.json()
+                except ValueError:
+                    pass
             
-    async def list_clients(self, params=None):
+            if isinstance(body, list) and len(body) == len(chunk):
+                # EMQX returns one entry per message: {"id": ...} on success,
+                # {"reason_code": ..., "message": ...} otherwise
+                for offset, item in enumerate(body):
+                    item = item if isinstance(item, dict) else {}
+                    result = {"index": start + offset, "topic": chunk[offset]["topic"]}
+                    if "reason_code" in item:
+                        result.update(success=False, reason_code=item["reason_code"],
+                                      error=item.get("message", ""))
+                    else:
+                        result.update(success=True, id=item.get("id"))
+                    results[start + offset] = result
+                return
+            
+            if response is not None:
+                error = f"EMQX API Error: {response.status_code} - {response.text}"
+                self.logger.error(error)
+            for offset, entry in enumerate(chunk):
+                results[start + offset] = {"index": start + offset, "topic": entry["topic"],
+                                           "success": False, "error": error}
+        
+        starts = range(0, len(entries), chunk_size)
+        self.logger.info(f"Bulk publishing {len(entries)} messages in {len(starts)} requests")
+        await asyncio.gather(*(send_chunk(start) for start in starts))
+        
+        published = sum(1 for result in results if result is not None and result["success"])
+        return {
+            "success": published == len(entries),
+            "total": len(entries),
+            "published": published,
+            "failed": len(entries) - published,
+            "requests": len(starts),
+            "results": results
+        }
+            
+    async def list_clients(self, params=None, use_cache: bool = True):
         """
         Get a list of connected MQTT clients.
 
@@ -110,6 +278,8 @@ class EMQXClient:
                 - like_clientid: Fuzzy search by client ID pattern
                 - like_username: Fuzzy search by username pattern
                 - like_ip_address: Fuzzy search by IP address pattern
+            use_cache (bool, optional): Serve fresh cached responses. Pass False
+                when the result drives a destructive action.
 
         Returns:
             dict: Response from the EMQX API containing client data or error information
@@ -120,22 +290,85 @@ class EMQXClient:
         if params is None:
             params = {"page": 1, "limit": 10}
 
-        self.logger.info("Retrieving list of MQTT clients")
-
-        async with httpx.AsyncClient() as client:
+        async def load():
+            self.logger.info("Retrieving list of MQTT clients")
             try:
-                response = await client.get(
-                    url,
-                    headers=self._get_auth_header(),
-                    params=params,
-                    timeout=30
-                )
+                response = await self._request("GET", "/clients", url, params=params)
                 response.raise_for_status()
                 return self._handle_response(response)
             except Exception as e:
                 self.logger.error(f"Error retrieving clients: {str(e)}")
                 return {"error": str(e)}
+
+        if not use_cache:
+            return await load()
+        key = ("clients", tuple(sorted((k, str(v)) for k, v in params.items())))
+        return await self.cache.get_or_load(key, load)
                 
+    async def iter_clients(self, params: Optional[Dict] = None, page_size: Optional[int] = None,
+                           concurrency: Optional[int] = None, use_cache: bool = True) -> AsyncIterator[Dict]:
+        """
+        Iterate over all MQTT clients matching the filters, across every page.
+        
+        The first page reports the total count; the remaining pages are then
+        fetched concurrently (at most `concurrency` requests in flight) and
+        their clients are yielded as each page arrives, so page order is not
+        preserved. When EMQX omits the count (fuzzy "like_*" searches), pages
+        are followed one by one using meta.hasnext.
+        
+        Args:
+            params (dict, optional): Filters accepted by list_clients (page/limit are ignored)
+            page_size (int, optional): Clients per page. Defaults to EMQX_CLIENT_PAGE_SIZE.
+            concurrency (int, optional): Max page requests in flight. Defaults to
+                EMQX_CLIENT_PAGE_CONCURRENCY.
+            use_cache (bool, optional): Serve pages from the response cache. Pass
+                False when the clients are about to be kicked, so the iteration
+                reflects the broker's current state.
+            
+        Yields:
+            dict: Client records as returned by the EMQX API
+            
+        Raises:
+            RuntimeError: If any page request fails
+        """
+        filters = {k: v for k, v in (params or {}).items() if k not in ("page", "limit")}
+        page_size = min(max(1, page_size or EMQX_CLIENT_PAGE_SIZE), 10000)
+        semaphore = asyncio.Semaphore(max(1, concurrency or EMQX_CLIENT_PAGE_CONCURRENCY))
+        
+        async def fetch(page: int) -> Dict:
+            async with semaphore:
+                result: Dict = await self.list_clients({**filters, "page": page, "limit": page_size}, use_cache)
+            if "error" in result:
+                raise RuntimeError(f"Failed to fetch clients page {page}: {result['error']}")
+            return result
+        
+        first = await fetch(1)
+        for client in first.get("data", []):
+            yield client
+        
+        meta = first.get("meta", {})
+        count = meta.get("count")
+        if count is None:
+            page, hasnext = 1, meta.get("hasnext", False)
+            while hasnext:
+                page += 1
+                result = await fetch(page)
+                for client in result.get("data", []):
+                    yield client
+                hasnext = result.get("meta", {}).get("hasnext", False)
+            return
+        
+        pages = (count + page_size - 1) // page_size
+        tasks = [asyncio.ensure_future(fetch(page)) for page in range(2, pages + 1)]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                result = await next_page
+                for client in result.get("data", []):
+                    yield client
+        finally:
+            for task in tasks:
+                task.cancel()
+    
     async def get_client_info(self, clientid: str):
         """
         Get detailed information about a specific MQTT client by client ID.
@@ -151,20 +384,17 @@ class EMQXClient:
         """
         url = f"{self.api_url}/clients/{clientid}"
         
-        self.logger.info(f"Retrieving information for client ID: {clientid}")
-        
-        async with httpx.AsyncClient() as client:
+        async def load():
+            self.logger.info(f"Retrieving information for client ID: {clientid}")
             try:
-                response = await client.get(
-                    url,
-                    headers=self._get_auth_header(),
-                    timeout=30
-                )
+                response = await self._request("GET", "/clients/{clientid}", url)
                 response.raise_for_status()
                 return self._handle_response(response)
             except Exception as e:
                 self.logger.error(f"Error retrieving client info for {clientid}: {str(e)}")
                 return {"error": str(e)}
+        
+        return await self.cache.get_or_load(("client", clientid), load)
                 
     async def kick_client(self, clientid: str):
         """
@@ -182,18 +412,66 @@ class EMQXClient:
         
         self.logger.info(f"Kicking out client with ID: {clientid}")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.delete(
-                    url,
-                    headers=self._get_auth_header(),
-                    timeout=30
-                )
-                response.raise_for_status()
-                # For successful delete operations, return a success message
-                if response.status_code == 204:  # No Content
-                    return {"success": True, "message": f"Client {clientid} has been disconnected"}
-                return self._handle_response(response)
-            except Exception as e:
-                self.logger.error(f"Error kicking out client {clientid}: {str(e)}")
-                return {"error": str(e)}
\ No newline at end of file
+        try:
+            response = await self._request("DELETE", "/clients/{clientid}", url)
+            response.raise_for_status()
+            # For successful delete operations, return a success message
+            if response.status_code == 204:  # No Content
+                return {"success": True, "message": f"Client {clientid} has been disconnected"}
+            return self._handle_response(response)
+        except Exception as e:
+            self.logger.error(f"Error kicking out client {clientid}: {str(e)}")
+            return {"error": str(e)}
+        finally:
+            # Cached lookups fetched before the kick no longer reflect the broker
+            self.invalidate_client(clientid)
+    
+    async def get_clients_info(self, clientids: List[str], concurrency: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Get detailed information for many clients with bounded concurrency.
+        
+        Args:
+            clientids (list): Client IDs to look up (duplicates are fetched once)
+            concurrency (int, optional): Max requests in flight. Defaults to
+                EMQX_CLIENT_BATCH_CONCURRENCY.
+            
+        Returns:
+            dict: Client ID -> client data or error information, in input order
+        """
+        return await self._fan_out(clientids, self.get_client_info, concurrency)
+    
+    async def kick_clients(self, clientids: List[str], concurrency: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Disconnect many clients with bounded concurrency.
+        
+        Args:
+            clientids (list): Client IDs to disconnect (duplicates are kicked once)
+            concurrency (int, optional): Max requests in flight. Defaults to
+                EMQX_CLIENT_BATCH_CONCURRENCY.
+            
+        Returns:
+            dict: Client ID -> result of the disconnect or error information, in input order
+        """
+        return await self._fan_out(clientids, self.kick_client, concurrency)
+    
+    async def _fan_out(self, clientids: List[str], call: Callable[[str], Awaitable[Dict]],
+                       concurrency: Optional[int]) -> Dict[str, Dict]:
+        semaphore = asyncio.Semaphore(max(1, concurrency or EMQX_CLIENT_BATCH_CONCURRENCY))
+        unique_ids = list(dict.fromkeys(clientids))
+        
+        async def one(clientid):
+            async with semaphore:
+                return await call(clientid)
+        
+        results = await asyncio.gather(*(one(clientid) for clientid in unique_ids))
+        return dict(zip(unique_ids, results))
+    
+    def invalidate_client(self, clientid: str):
+        """
+        Drop cached responses that may contain the given client.
+        
+        Removes the client's detail entry and every cached client list, since
+        list pages shift when a client disconnects.
+        """
+        self.cache.invalidate(("client", clientid))
+        self.cache.invalidate_where(lambda key: isinstance(key, tuple) and key[0] == "clients")
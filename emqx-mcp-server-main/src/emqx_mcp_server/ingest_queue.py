@@ -0,0 +1,185 @@
+"""
+MQTT消息接收队列模块
+
+paho网络线程只负责把消息放入有界队列，由asyncio事件循环批量取出并写入
+消息历史等共享状态，避免工具处理函数遍历字典时被网络线程并发修改。
+
+队列分为普通通道和优先通道：优先通道（如空调状态主题）有独立的容量，
+不会因为传感器消息洪峰而被丢弃，并且总是先于普通通道被处理。
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# 队列已满时的处理策略
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最旧的消息，保留新消息
+OVERFLOW_DROP_NEWEST = "drop_newest"  # 丢弃新到达的消息
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+
+class IngestQueue:
+    """
+    网络线程到事件循环的有界消息交接队列
+
+    put()可以在任意线程调用；drain()在事件循环线程中批量处理消息。
+    """
+
+    def __init__(self, handler: Callable[[Any], None], maxsize: int = 10000,
+                 overflow_policy: str = OVERFLOW_DROP_OLDEST, batch_size: int = 500,
+                 priority_maxsize: Optional[int] = None, logger: Optional[logging.Logger] = None):
+        """
+        初始化接收队列
+
+        Args:
+            handler: 在事件循环中处理单条消息的回调
+            maxsize: 普通通道的最大积压数量
+            overflow_policy: 普通通道已满时的处理策略(drop_oldest/drop_newest)
+            batch_size: 每次调度最多处理的消息数量
+            priority_maxsize: 优先通道的最大积压数量，默认与maxsize相同
+            logger: 记录处理失败的日志记录器
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow_policy}")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.priority_maxsize = priority_maxsize or maxsize
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._normal: Deque[Any] = deque()
+        self._priority: Deque[Any] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._drain_scheduled = False
+
+        # 统计计数
+        self.enqueued = 0
+        self.drained = 0
+        self.dropped = 0
+        self.priority_dropped = 0
+        self.max_backlog = 0
+        self.errors = 0
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环，之后新消息到达时自动调度批量处理"""
+        if self._loop is loop:
+            return
+        with self._lock:
+            self._loop = loop
+            self._drain_scheduled = False
+            pending = bool(self._normal or self._priority)
+        if pending:
+            self._schedule()
+
+    def put(self, item: Any, priority: bool = False) -> bool:
+        """
+        放入一条消息（网络线程调用）
+
+        Args:
+            item: 消息
+            priority: 是否走优先通道
+
+        Returns:
+            bool: 消息是否被接收（drop_newest策略下队列已满时返回False）
+        """
+        accepted = True
+        with self._lock:
+            if priority:
+                if len(self._priority) >= self.priority_maxsize:
+                    self._priority.popleft()
+                    self.priority_dropped += 1
+                self._priority.append(item)
+            elif len(self._normal) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    self._normal.popleft()
+                    self._normal.append(item)
+                else:
+                    accepted = False
+            else:
+                self._normal.append(item)
+            if accepted:
+                self.enqueued += 1
+            backlog = len(self._normal) + len(self._priority)
+            if backlog > self.max_backlog:
+                self.max_backlog = backlog
+            wake = self._loop is not None and not self._drain_scheduled
+            if wake:
+                self._drain_scheduled = True
+        if wake:
+            self._schedule()
+        return accepted
+
+    def drain(self, max_items: Optional[int] = None) -> int:
+        """
+        批量处理积压的消息，优先通道先处理
+
+        Args:
+            max_items: 本次最多处理的消息数量，为空时处理全部积压
+
+        Returns:
+            int: 本次处理的消息数量
+        """
+        with self._drain_lock:
+            with self._lock:
+                batch: List[Any] = []
+                limit = max_items if max_items is not None else len(self._priority) + len(self._normal)
+                while self._priority and len(batch) < limit:
+                    batch.append(self._priority.popleft())
+                while self._normal and len(batch) < limit:
+                    batch.append(self._normal.popleft())
+            for item in batch:
+                try:
+                    self.handler(item)
+                except Exception:
+                    # 单条消息处理失败不影响同一批中的其他消息
+                    self.errors += 1
+                    self.logger.exception("Ingest handler failed")
+            self.drained += len(batch)
+            return len(batch)
+
+    def backlog(self) -> int:
+        """当前积压的消息数量"""
+        return len(self._normal) + len(self._priority)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取队列统计信息"""
+        return {
+            "backlog": len(self._normal),
+            "priority_backlog": len(self._priority),
+            "max_backlog": self.max_backlog,
+            "enqueued": self.enqueued,
+            "drained": self.drained,
+            "dropped": self.dropped,
+            "priority_dropped": self.priority_dropped,
+            "errors": self.errors,
+            "overflow_policy": self.overflow_policy
+        }
+
+    def _schedule(self) -> None:
+        """从任意线程调度一次批量处理"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._drain_batch)
+        except RuntimeError:
+            # 事件循环已关闭，等待下次绑定
+            with self._lock:
+                self._drain_scheduled = False
+
+    def _drain_batch(self) -> None:
+        """事件循环中的批量处理回调，积压未清空时让出后继续"""
+        try:
+            self.drain(self.batch_size)
+        finally:
+            with self._lock:
+                more = bool(self._normal or self._priority)
+                self._drain_scheduled = more
+        if more and self._loop is not None:
+            self._loop.call_soon(self._drain_batch)
@@ -0,0 +1,256 @@
+"""
+传感器与空调状态最新值缓存模块
+
+为每个已知主题预先编译一个字段提取器，在MQTT线程接收消息时只解析一次，
+把结果写入类型化的最新值表。工具查询时直接读取字典，不再重复解析JSON。
+
+多教室模式下用一个通配符订阅接收整栋楼的消息，RoomTopicLayout把主题拆分为
+(教室, 数据类型)，RoomStateIndex按教室保存最新值，更新和读取都是O(1)。
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 解析结果的错误类型
+ERROR_JSON = "json"          # JSON解析失败
+ERROR_FORMAT = "format"      # 缺少期望的字段
+ERROR_DEVICE = "device"      # 设备上报了error字段
+
+
+@dataclass
+class LatestValue:
+    """
+    单个主题的最新值
+
+    Attributes:
+        topic: 消息主题
+        value: 提取出的值，解析失败时为None
+        unit: 单位
+        device_id: 设备或传感器ID
+        received_at: 接收时间(epoch秒)
+        timestamp: 接收时间(ISO格式)
+        raw: 原始消息内容
+        error: 解析失败时的错误类型(ERROR_JSON/ERROR_FORMAT/ERROR_DEVICE)
+        detail: 设备上报的错误信息
+    """
+    topic: str
+    value: Any
+    unit: Optional[str]
+    device_id: Optional[str]
+    received_at: float
+    timestamp: str
+    raw: str
+    error: Optional[str] = None
+    detail: Optional[Any] = None
+
+    @property
+    def ok(self) -> bool:
+        """是否成功提取到值"""
+        return self.error is None
+
+
+class FieldExtractor:
+    """
+    预编译的字段提取器
+
+    支持数组和对象两种消息格式（数组取第一个元素），按顺序尝试候选字段名。
+    """
+
+    __slots__ = ("fields", "default_unit", "device_field", "default_device",
+                 "report_device_error")
+
+    def __init__(self, fields: Sequence[str], default_unit: Optional[str] = None,
+                 device_field: str = "device_id", default_device: Optional[str] = None,
+                 report_device_error: bool = False):
+        """
+        初始化字段提取器
+
+        Args:
+            fields: 候选值字段名，按优先级排列
+            default_unit: 消息中没有unit字段时使用的单位
+            device_field: 设备ID字段名
+            default_device: 消息中没有设备ID时使用的默认值
+            report_device_error: 缺少值字段时是否把消息中的error字段识别为设备错误
+        """
+        self.fields = tuple(fields)
+        self.default_unit = default_unit
+        self.device_field = device_field
+        self.default_device = default_device
+        self.report_device_error = report_device_error
+
+    def extract(self, topic: str, payload: str, received_at: float,
+                timestamp: str) -> LatestValue:
+        """解析消息并生成最新值记录"""
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, TypeError):
+            return LatestValue(topic, None, None, None, received_at, timestamp, payload,
+                               error=ERROR_JSON)
+
+        # 如果是数组，取第一个元素
+        if isinstance(data, list) and data:
+            data = data[0]
+        if not isinstance(data, dict):
+            return LatestValue(topic, None, None, None, received_at, timestamp, payload,
+                               error=ERROR_FORMAT)
+
+        value = None
+        for field in self.fields:
+            value = data.get(field)
+            if value is not None:
+                break
+
+        unit = data.get("unit", self.default_unit)
+        device_id = data.get(self.device_field, self.default_device)
+        if value is not None:
+            return LatestValue(topic, value, unit, device_id, received_at, timestamp, payload)
+        if self.report_device_error and "error" in data:
+            return LatestValue(topic, None, unit, device_id, received_at, timestamp, payload,
+                               error=ERROR_DEVICE, detail=data["error"])
+        return LatestValue(topic, None, unit, device_id, received_at, timestamp, payload,
+                           error=ERROR_FORMAT)
+
+
+class RoomTopicLayout:
+    """
+    教室主题布局
+
+    单教室模式：{prefix}/{suffix}，所有消息属于同一个教室；
+    多教室模式：{prefix}/{教室}/{suffix}，每种数据类型只需一个 {prefix}/+/{suffix} 订阅。
+    """
+
+    def __init__(self, prefix: str, suffixes: Dict[str, str], default_room: str,
+                 multi_room: bool = False):
+        """
+        初始化主题布局
+
+        Args:
+            prefix: 主题前缀
+            suffixes: 数据类型 -> 主题后缀，如 {"temperature": "temperature"}
+            default_room: 默认教室ID（单教室模式下是唯一的教室）
+            multi_room: 是否在主题中包含教室ID
+        """
+        self.prefix = prefix.rstrip("/")
+        self.suffixes = dict(suffixes)
+        self.default_room = default_room
+        self.multi_room = multi_room
+        self._by_suffix = {suffix: kind for kind, suffix in self.suffixes.items()}
+        self._by_topic = {f"{self.prefix}/{suffix}": kind for kind, suffix in self.suffixes.items()}
+        self._room_start = len(self.prefix) + 1
+
+    def topic(self, kind: str, room: Optional[str] = None) -> str:
+        """生成教室某种数据的具体主题"""
+        if self.multi_room:
+            return f"{self.prefix}/{room or self.default_room}/{self.suffixes[kind]}"
+        return f"{self.prefix}/{self.suffixes[kind]}"
+
+    def filter(self, kind: str) -> str:
+        """生成订阅某种数据的主题过滤器（多教室模式下为通配符）"""
+        if self.multi_room:
+            return f"{self.prefix}/+/{self.suffixes[kind]}"
+        return self.topic(kind)
+
+    def parse(self, topic: str) -> Optional[Tuple[str, str]]:
+        """把主题拆分为(教室, 数据类型)，不属于该布局时返回None"""
+        if not self.multi_room:
+            kind = self._by_topic.get(topic)
+            return (self.default_room, kind) if kind is not None else None
+        if not topic.startswith(self.prefix) or topic[self._room_start - 1:self._room_start] != "/":
+            return None
+        room, _, suffix = topic[self._room_start:].partition("/")
+        kind = self._by_suffix.get(suffix)
+        if kind is None or not room:
+            return None
+        return room, kind
+
+    def validate_room(self, room: Optional[str]) -> str:
+        """
+        校验并返回教室ID，为空时返回默认教室
+
+        Raises:
+            ValueError: 教室ID包含主题分隔符或通配符，或单教室模式下指定了其他教室
+        """
+        if not room:
+            return self.default_room
+        if any(c in room for c in "/+#"):
+            raise ValueError(f"Invalid room id: {room}")
+        if not self.multi_room and room != self.default_room:
+            raise ValueError(f"Unknown room: {room} (single-room mode serves {self.default_room}, "
+                             f"set CLASSROOM_MULTI_ROOM=true for multiple rooms)")
+        return room
+
+
+class RoomStateIndex:
+    """
+    按教室索引的最新值表
+
+    提取器按数据类型注册，所有教室共用；解析在MQTT线程中完成，
+    写入和读取都在事件循环中进行。
+    """
+
+    def __init__(self, layout: RoomTopicLayout):
+        """
+        初始化教室状态索引
+
+        Args:
+            layout: 主题布局
+        """
+        self.layout = layout
+        self._extractors: Dict[str, FieldExtractor] = {}
+        self._rooms: Dict[str, Dict[str, LatestValue]] = {}
+        self.parse_failures: Dict[str, int] = {}
+
+    def register(self, kind: str, extractor: FieldExtractor) -> None:
+        """为数据类型注册字段提取器"""
+        self._extractors[kind] = extractor
+
+    def parse(self, topic: str, payload: str, received_at: float,
+              timestamp: str) -> Optional[Tuple[str, str, LatestValue]]:
+        """
+        解析一条消息但不写入索引（可在MQTT网络线程中调用）
+
+        Returns:
+            tuple: (教室, 数据类型, 最新值记录)；主题不属于布局或没有提取器时返回None
+        """
+        parsed = self.layout.parse(topic)
+        if parsed is None:
+            return None
+        extractor = self._extractors.get(parsed[1])
+        if extractor is None:
+            return None
+        return parsed[0], parsed[1], extractor.extract(topic, payload, received_at, timestamp)
+
+    def update(self, room: str, kind: str, record: LatestValue) -> None:
+        """写入解析结果，解析失败按数据类型计数"""
+        if record.error is not None:
+            self.parse_failures[kind] = self.parse_failures.get(kind, 0) + 1
+        state = self._rooms.get(room)
+        if state is None:
+            state = self._rooms[room] = {}
+        state[kind] = record
+
+    def get(self, room: str, kind: str) -> Optional[LatestValue]:
+        """读取教室某种数据的最新值"""
+        state = self._rooms.get(room)
+        return state.get(kind) if state is not None else None
+
+    def room(self, room: str) -> Dict[str, LatestValue]:
+        """读取教室全部数据类型的最新值"""
+        return self._rooms.get(room, {})
+
+    def rooms(self) -> List[str]:
+        """获取已收到数据的教室（按ID排序）"""
+        return sorted(self._rooms)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            "rooms": len(self._rooms),
+            "multi_room": self.layout.multi_room,
+            "parse_failures": dict(self.parse_failures),
+            "total_parse_failures": sum(self.parse_failures.values())
+        }
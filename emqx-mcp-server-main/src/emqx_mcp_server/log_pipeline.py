@@ -0,0 +1,201 @@
+"""
+日志管道模块
+
+消息热路径（paho网络线程、事件循环）只把日志记录放入有界内存队列，
+由独立的监听线程完成格式化和写出，日志I/O不会阻塞消息接收。
+
+- 按主题限流：携带 extra={"mqtt_topic": topic} 的日志在每个时间窗口内
+  每个主题最多输出 rate 条，其余计入被抑制的数量
+- 惰性格式化：入队时不拼接消息字符串，只有真正写出的记录才会被格式化
+- 队列已满时丢弃新记录并计数，而不是阻塞调用方
+"""
+
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+TOPIC_ATTR = "mqtt_topic"
+
+
+class TopicRateLimitFilter(logging.Filter):
+    """
+    按MQTT主题限流的日志过滤器
+
+    没有携带主题的日志记录不受限制。
+    """
+
+    def __init__(self, rate: int = 5, interval: float = 10.0, max_topics: int = 10000):
+        """
+        初始化限流过滤器
+
+        Args:
+            rate: 每个主题在一个时间窗口内最多输出的日志条数，0表示不限流
+            interval: 时间窗口长度（秒）
+            max_topics: 最多跟踪的主题数量，超出时清空重新计数
+        """
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        # 主题 -> [窗口开始时间, 窗口内已输出条数, 窗口内被抑制条数]
+        self._windows: Dict[str, list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        topic = getattr(record, TOPIC_ATTR, None)
+        if topic is None or self.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(topic)
+            if window is None:
+                if len(self._windows) >= self.max_topics:
+                    self._windows.clear()
+                window = self._windows[topic] = [now, 0, 0]
+            elif now - window[0] >= self.interval:
+                previously_suppressed = window[2]
+                window[0], window[1], window[2] = now, 0, 0
+                if previously_suppressed:
+                    # 在新窗口的第一条日志上报告上个窗口被抑制的数量
+                    record.suppressed = previously_suppressed
+                    if isinstance(record.args, tuple):
+                        msg = str(record.msg) if record.args else str(record.msg).replace("%", "%%")
+                        record.msg = msg + " [%d similar lines suppressed]"
+                        record.args = record.args + (previously_suppressed,)
+
+            if window[1] < self.rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计"""
+        with self._lock:
+            return {
+                "rate_per_topic": self.rate,
+                "interval_seconds": self.interval,
+                "tracked_topics": len(self._windows),
+                "suppressed": self.suppressed
+            }
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用线程格式化的队列处理器
+
+    标准QueueHandler会在入队前调用format()，这里直接把原始记录交给
+    监听线程，由监听线程的处理器格式化；队列已满时丢弃并计数。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    基于队列的日志管道
+
+    start()把LazyQueueHandler安装到根日志记录器，并启动写出日志的监听线程。
+    根日志记录器上已有的处理器（如FastMCP安装的同步StreamHandler）会被暂时移除，
+    否则每条记录会再同步写出一次，且不受限流；stop()时恢复。
+    """
+
+    def __init__(self, level: int = logging.INFO,
+                 fmt: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                 rate: int = 5, interval: float = 10.0, queue_size: int = 10000,
+                 stream=None):
+        """
+        初始化日志管道
+
+        Args:
+            level: 根日志级别
+            fmt: 日志格式
+            rate: 每个主题每个时间窗口最多输出的日志条数，0表示不限流
+            interval: 限流时间窗口（秒）
+            queue_size: 待写出日志的最大积压数量
+            stream: 输出流，默认标准错误（标准输出留给MCP stdio协议）
+        """
+        self.level = level
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.rate_filter = TopicRateLimitFilter(rate, interval)
+        self.queue_handler = LazyQueueHandler(self.queue)
+        self.queue_handler.addFilter(self.rate_filter)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(logging.Formatter(fmt))
+        self.listener = logging.handlers.QueueListener(self.queue, output)
+        self._replaced_handlers: list = []
+        self._started = False
+
+    def start(self) -> "LogPipeline":
+        """安装到根日志记录器并启动监听线程"""
+        if not self._started:
+            root = logging.getLogger()
+            root.setLevel(self.level)
+            self._replaced_handlers = list(root.handlers)
+            for handler in self._replaced_handlers:
+                root.removeHandler(handler)
+            root.addHandler(self.queue_handler)
+            self.listener.start()
+            self._started = True
+        return self
+
+    def stop(self) -> None:
+        """从根日志记录器移除、恢复原有的处理器并写出剩余的日志"""
+        if self._started:
+            root = logging.getLogger()
+            root.removeHandler(self.queue_handler)
+            for handler in self._replaced_handlers:
+                root.addHandler(handler)
+            self._replaced_handlers = []
+            self.listener.stop()
+            self._started = False
+
+    def stats(self) -> Dict[str, Any]:
+        """获取日志管道统计"""
+        return {
+            "backlog": self.queue.qsize(),
+            "dropped": self.queue_handler.dropped,
+            **self.rate_filter.stats()
+        }
+
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def setup_logging(**kwargs) -> LogPipeline:
+    """
+    启动进程内唯一的日志管道（替代logging.basicConfig）
+
+    重复调用时先停止之前的管道，参数见LogPipeline。
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+        _pipeline = LogPipeline(**kwargs).start()
+        return _pipeline
+
+
+def get_log_pipeline() -> Optional[LogPipeline]:
+    """获取当前的日志管道，尚未启动时返回None"""
+    return _pipeline
@@ -0,0 +1,248 @@
+"""
+MQTT消息历史存储模块
+
+为每个主题提供预分配的定长环形缓冲区，追加和淘汰都是O(1)，
+避免在每条消息到达时重新分配和复制整个历史列表。
+
+每条消息同时记录一个单调递增的数值时间戳，时间范围查询使用二分查找，
+跨主题查询使用k路堆归并，只处理实际返回的消息。
+"""
+
+import heapq
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .topic_trie import TopicIndex, is_wildcard
+
+
+class TopicRingBuffer:
+    """
+    单个主题的定长环形缓冲区
+
+    在创建时一次性分配固定容量的槽位，写满后新消息直接覆盖最旧的消息。
+    逻辑顺序始终为从旧到新，对应的数值时间戳保存在并行数组中且单调不减。
+    """
+
+    __slots__ = ("_items", "_timestamps", "_capacity", "_start", "_size")
+
+    def __init__(self, capacity: int):
+        """
+        初始化环形缓冲区
+
+        Args:
+            capacity: 最多保留的消息数量，必须大于0
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+        # 预分配的槽位，只有[_start, _start + _size)范围内的槽位存放消息，其余为None
+        self._items: List[Any] = [None] * capacity
+        self._timestamps: List[float] = [0.0] * capacity
+        self._capacity = capacity
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        """缓冲区容量"""
+        return self._capacity
+
+    def append(self, item: Dict, timestamp: Optional[float] = None) -> None:
+        """
+        追加一条消息，缓冲区已满时覆盖最旧的消息
+
+        Args:
+            item: 消息数据
+            timestamp: 接收时间(epoch秒)，为空时使用当前时间；
+                       早于上一条消息的时间戳会被抬升，保证时间序单调
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self._size:
+            last = self._timestamps[(self._start + self._size - 1) % self._capacity]
+            if timestamp < last:
+                timestamp = last
+        if self._size < self._capacity:
+            slot = (self._start + self._size) % self._capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self._capacity
+        self._items[slot] = item
+        self._timestamps[slot] = timestamp
+
+    def latest(self) -> Optional[Dict]:
+        """获取最新的一条消息"""
+        if self._size == 0:
+            return None
+        return self[-1]
+
+    def oldest_timestamp(self) -> Optional[float]:
+        """获取最旧一条消息的时间戳"""
+        if self._size == 0:
+            return None
+        return self._timestamps[self._start]
+
+    def latest_timestamp(self) -> Optional[float]:
+        """获取最新一条消息的时间戳"""
+        if self._size == 0:
+            return None
+        return self._timestamps[(self._start + self._size - 1) % self._capacity]
+
+    def index_since(self, since: float) -> int:
+        """二分查找第一条时间戳不早于since的消息的逻辑位置"""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._timestamps[(self._start + mid) % self._capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_newest(self, since: Optional[float] = None) -> Iterator[Tuple[float, Dict]]:
+        """从新到旧遍历(时间戳, 消息)，since不为空时在第一条早于since的消息处停止"""
+        first = self.index_since(since) if since is not None else 0
+        for index in range(self._size - 1, first - 1, -1):
+            slot = (self._start + index) % self._capacity
+            yield self._timestamps[slot], self._items[slot]
+
+    def tail(self, limit: Optional[int] = None) -> List[Dict]:
+        """获取最近的limit条消息（从旧到新），limit为空时返回全部"""
+        count = self._size if not limit else min(limit, self._size)
+        first = (self._start + self._size - count) % self._capacity
+        end = first + count
+        if end <= self._capacity:
+            return self._items[first:end]
+        return self._items[first:] + self._items[:end - self._capacity]
+
+    def clear(self) -> None:
+        """清空缓冲区（保留已分配的槽位）"""
+        self._items[:] = [None] * self._capacity
+        self._start = 0
+        self._size = 0
+
+    def __getitem__(self, index: int) -> Dict:
+        """按逻辑位置读取消息，支持负数下标"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        item: Dict = self._items[(self._start + index) % self._capacity]
+        return item
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.tail())
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class MessageHistoryStore:
+    """
+    按主题分组的消息历史存储
+
+    每个主题对应一个TopicRingBuffer，供各工具类共享使用。
+    """
+
+    def __init__(self, max_size_per_topic: int):
+        """
+        初始化消息历史存储
+
+        Args:
+            max_size_per_topic: 每个主题最多保留的消息数量
+        """
+        self.max_size_per_topic = max_size_per_topic
+        self._buffers: Dict[str, TopicRingBuffer] = {}
+        self._index = TopicIndex()
+
+    def append(self, topic: str, message: Dict, timestamp: Optional[float] = None) -> None:
+        """保存一条消息到指定主题的历史记录，timestamp为接收时间(epoch秒)"""
+        buffer = self._buffers.get(topic)
+        if buffer is None:
+            buffer = self._buffers[topic] = TopicRingBuffer(self.max_size_per_topic)
+            self._index.add(topic)
+        buffer.append(message, timestamp)
+
+    def latest(self, topic: str) -> Optional[Dict]:
+        """获取指定主题的最新消息"""
+        buffer = self._buffers.get(topic)
+        return buffer.latest() if buffer is not None else None
+
+    def history(self, topic: str, limit: Optional[int] = None) -> List[Dict]:
+        """获取指定主题最近的消息（从旧到新）"""
+        buffer = self._buffers.get(topic)
+        return buffer.tail(limit) if buffer is not None else []
+
+    def query(self, topics: Optional[Iterable[str]] = None, since: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict]:
+        """
+        跨主题查询消息，按时间从新到旧返回
+
+        每个主题内部通过二分查找定位since，多个主题之间做k路堆归并，
+        取满limit条后立即停止，不会遍历或排序全部历史。
+
+        Args:
+            topics: 要查询的主题，为空时查询全部主题
+            since: 只返回该时间(epoch秒)之后的消息
+            limit: 最多返回的消息数量，为空或0时不限制
+
+        Returns:
+            List[Dict]: 消息列表（从新到旧）
+        """
+        merged = self.iter_newest(topics, since)
+        return [message for _, message in islice(merged, limit or None)]
+
+    def iter_newest(self, topics: Optional[Iterable[str]] = None,
+                    since: Optional[float] = None) -> Iterator[Tuple[float, Dict]]:
+        """跨主题从新到旧遍历(时间戳, 消息)，参数含义同query()"""
+        buffers: Iterable[TopicRingBuffer]
+        if topics is None:
+            buffers = self._buffers.values()
+        else:
+            buffers = [self._buffers[t] for t in topics if t in self._buffers]
+
+        streams = []
+        for buffer in buffers:
+            latest = buffer.latest_timestamp()
+            if latest is None or (since is not None and latest < since):
+                continue
+            streams.append(buffer.iter_newest(since))
+
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams, key=_timestamp_key, reverse=True)
+
+    def oldest_timestamp(self, topic: str) -> Optional[float]:
+        """获取指定主题内存中最旧一条消息的时间戳"""
+        buffer = self._buffers.get(topic)
+        return buffer.oldest_timestamp() if buffer is not None else None
+
+    def match_topics(self, topic_filter: str) -> List[str]:
+        """按MQTT过滤器（支持+和#）查找有历史记录的主题"""
+        if not is_wildcard(topic_filter):
+            return [topic_filter] if topic_filter in self._buffers else []
+        return self._index.match(topic_filter)
+
+    def topics(self) -> List[str]:
+        """获取所有有历史记录的主题"""
+        return list(self._buffers)
+
+    def items(self) -> List[Tuple[str, TopicRingBuffer]]:
+        """获取(主题, 缓冲区)列表"""
+        return list(self._buffers.items())
+
+    def clear(self) -> None:
+        """清空所有主题的历史记录"""
+        self._buffers.clear()
+        self._index = TopicIndex()
+
+    def __contains__(self, topic: object) -> bool:
+        return topic in self._buffers
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+def _timestamp_key(entry: Tuple[float, Any]) -> float:
+    """堆归并使用的排序键"""
+    return entry[0]
@@ -0,0 +1,468 @@
+"""
+磁盘消息日志模块
+
+为消息历史提供可选的持久化存储，保留时间远超内存中的环形缓冲区：
+
+- 消息按到达顺序追加写入段文件（segment），段文件达到大小或时间上限后封存，
+  超过保留期的封存段整体删除
+- 每条记录带有同一主题上一条记录在本段内的偏移（反向指针链），按主题从新到旧
+  遍历时只访问该主题的记录，不扫描其他主题
+- 每个主题每隔若干条记录保存一个稀疏时间索引点，用于定位时间范围的上界
+- 读取通过mmap进行，遍历时只解析定长的记录头，只有真正返回的记录才会
+  解码主题和载荷、构造Python对象
+
+记录格式（小端）：
+    时间戳 f64 | 上一条同主题记录偏移 u32 | 主题长度 u16 | 载荷长度 u32 | 标志 u8 | 主题 | 载荷
+标志的低两位为QoS，第3位为retain。
+"""
+
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from .topic_trie import TopicIndex, is_wildcard
+
+HEADER = struct.Struct("<dIHIB")
+NO_PREVIOUS = 0xFFFFFFFF
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+
+
+class _TopicIndex:
+    """单个段内某个主题的索引"""
+
+    __slots__ = ("first_ts", "last_ts", "last_offset", "count", "sparse_ts", "sparse_offsets")
+
+    def __init__(self, first_ts: float):
+        self.first_ts = first_ts
+        self.last_ts = first_ts
+        self.last_offset = NO_PREVIOUS
+        self.count = 0
+        self.sparse_ts: List[float] = []
+        self.sparse_offsets: List[int] = []
+
+    def to_json(self) -> Dict:
+        return {
+            "first_ts": self.first_ts, "last_ts": self.last_ts,
+            "last_offset": self.last_offset, "count": self.count,
+            "sparse": [list(pair) for pair in zip(self.sparse_ts, self.sparse_offsets)]
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "_TopicIndex":
+        index = cls(data["first_ts"])
+        index.last_ts = data["last_ts"]
+        index.last_offset = data["last_offset"]
+        index.count = data["count"]
+        for ts, offset in data["sparse"]:
+            index.sparse_ts.append(ts)
+            index.sparse_offsets.append(offset)
+        return index
+
+
+def _truncate(path: str, size: int) -> None:
+    with open(path, "r+b") as f:
+        f.truncate(size)
+
+
+class _Segment:
+    """一个段文件及其每个主题的索引"""
+
+    def __init__(self, path: str, created_at: float):
+        self.path = path
+        self.created_at = created_at
+        self.size = 0
+        self.records = 0
+        self.topics: Dict[str, _TopicIndex] = {}
+        self.sealed = False
+        self._map: Optional[mmap.mmap] = None
+        self._map_size = 0
+
+    @property
+    def last_ts(self) -> float:
+        return max((index.last_ts for index in self.topics.values()), default=self.created_at)
+
+    def view(self) -> Optional[mmap.mmap]:
+        """返回覆盖当前文件内容的只读mmap，文件增长后重新映射"""
+        if self.size == 0:
+            return None
+        if self._map is None or self._map_size != self.size:
+            self.close_map()
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            self._map_size = self.size
+        return self._map
+
+    def close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def save_index(self) -> None:
+        data = {
+            "created_at": self.created_at,
+            "size": self.size,
+            "records": self.records,
+            "topics": {topic: index.to_json() for topic, index in self.topics.items()}
+        }
+        tmp_path = self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["_Segment"]:
+        """读取封存段的索引文件，索引缺失时返回None"""
+        index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        segment = cls(path, data["created_at"])
+        segment.size = data["size"]
+        segment.records = data["records"]
+        segment.topics = {topic: _TopicIndex.from_json(index) for topic, index in data["topics"].items()}
+        segment.sealed = True
+        return segment
+
+
+class MessageLog:
+    """
+    追加写入的分段消息日志
+
+    append()在事件循环线程中调用；查询与写入在同一线程，不需要加锁。
+    """
+
+    def __init__(self, directory: str, logger: Optional[logging.Logger] = None,
+                 segment_bytes: int = 64 * 1024 * 1024, segment_seconds: float = 3600,
+                 retention_seconds: float = 7 * 24 * 3600, index_interval: int = 64):
+        """
+        初始化消息日志
+
+        Args:
+            directory: 段文件所在目录，不存在时自动创建
+            logger: 日志记录器实例
+            segment_bytes: 段文件大小上限，超过后封存并新建段
+            segment_seconds: 段文件时间跨度上限（秒）
+            retention_seconds: 封存段的保留时间（秒），0表示永久保留
+            index_interval: 每个主题每隔多少条记录保存一个稀疏时间索引点
+        """
+        self.directory = directory
+        self.logger = logger or logging.getLogger(__name__)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.retention_seconds = retention_seconds
+        self.index_interval = max(1, index_interval)
+        self._segments: List[_Segment] = []
+        self._active: Optional[_Segment] = None
+        self._writer: Optional[BinaryIO] = None
+        self._dirty = False
+        self._last_ts: Dict[str, float] = {}
+        self._topic_index = TopicIndex()
+        self._next_seq = 0
+        self.write_errors = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_segments()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def append(self, topic: str, message: Dict, timestamp: Optional[float] = None) -> None:
+        """
+        追加一条消息
+
+        Args:
+            topic: 消息主题
+            message: 消息数据（使用其中的payload、qos和retain字段）
+            timestamp: 接收时间(epoch秒)，早于同主题上一条记录时会被抬升
+        
+        Raises:
+            OSError: 写入失败（计入write_errors，当前段被封存，下一条消息写入新段）
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        last = self._last_ts.get(topic)
+        if last is not None and timestamp < last:
+            timestamp = last
+
+        try:
+            segment = self._active_segment(timestamp)
+        except OSError:
+            self.write_errors += 1
+            raise
+        writer = self._writer
+        assert writer is not None
+        topic_bytes = topic.encode("utf-8")
+        payload = message.get("payload", "")
+        payload_bytes = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+        flags = (message.get("qos", 0) & 0x03) | (0x04 if message.get("retain") else 0)
+
+        index = segment.topics.get(topic)
+        if index is None:
+            index = segment.topics[topic] = _TopicIndex(timestamp)
+        offset = segment.size
+        try:
+            writer.write(HEADER.pack(timestamp, index.last_offset, len(topic_bytes),
+                                     len(payload_bytes), flags))
+            writer.write(topic_bytes)
+            writer.write(payload_bytes)
+        except OSError:
+            self.write_errors += 1
+            self._abandon_active()
+            raise
+        self._dirty = True
+
+        if index.count % self.index_interval == 0:
+            index.sparse_ts.append(timestamp)
+            index.sparse_offsets.append(offset)
+        index.count += 1
+        index.last_ts = timestamp
+        index.last_offset = offset
+        segment.size = offset + HEADER.size + len(topic_bytes) + len(payload_bytes)
+        segment.records += 1
+
+        if last is None:
+            self._topic_index.add(topic)
+        self._last_ts[topic] = timestamp
+
+    def flush(self) -> None:
+        """把缓冲的写入刷到文件"""
+        if self._writer is not None and self._dirty:
+            self._writer.flush()
+            self._dirty = False
+
+    def close(self) -> None:
+        """封存当前段并释放所有映射"""
+        if self._active is not None:
+            self._seal_active()
+        for segment in self._segments:
+            segment.close_map()
+
+    def _active_segment(self, timestamp: float) -> _Segment:
+        active = self._active
+        if active is not None and (active.size >= self.segment_bytes
+                                   or timestamp - active.created_at >= self.segment_seconds):
+            self._seal_active()
+            self._apply_retention(timestamp)
+            active = None
+        if active is None:
+            path = os.path.join(self.directory, f"{self._next_seq:010d}{SEGMENT_SUFFIX}")
+            self._next_seq += 1
+            self._writer = open(path, "ab")
+            active = self._active = _Segment(path, timestamp)
+            self._segments.append(active)
+        return active
+
+    def _abandon_active(self) -> None:
+        """写入失败后截掉当前段中未记账的尾部并封存，保证已记录的偏移量仍然有效"""
+        writer, self._writer, self._dirty = self._writer, None, False
+        segment, self._active = self._active, None
+        if writer is None or segment is None:
+            return
+        for cleanup in (writer.close, lambda: _truncate(segment.path, segment.size), segment.save_index):
+            try:
+                cleanup()
+            except OSError as e:
+                self.logger.warning("Cleanup of message log segment %s failed: %s", segment.path, e)
+        segment.sealed = True
+
+    def _seal_active(self) -> None:
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._active is not None:
+            self._active.sealed = True
+            self._active.save_index()
+            self._active = None
+
+    def _apply_retention(self, now: float) -> None:
+        if self.retention_seconds <= 0:
+            return
+        cutoff = now - self.retention_seconds
+        while self._segments and self._segments[0].sealed and self._segments[0].last_ts < cutoff:
+            segment = self._segments.pop(0)
+            segment.close_map()
+            for path in (segment.path, segment.path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.logger.warning("Failed to remove expired segment %s: %s", path, e)
+            self.logger.info("Removed expired message log segment %s", segment.path)
+
+    # ------------------------------------------------------------------
+    # 启动恢复
+    # ------------------------------------------------------------------
+
+    def _load_segments(self) -> None:
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            segment = _Segment.load(path)
+            if segment is None:
+                # 未封存的段（进程异常退出）：顺序扫描重建索引并截断残缺的尾部
+                segment = self._recover(path)
+                if segment is None:
+                    continue
+            self._segments.append(segment)
+            self._next_seq = max(self._next_seq, int(name[:-len(SEGMENT_SUFFIX)]) + 1)
+            for topic, index in segment.topics.items():
+                if topic not in self._last_ts:
+                    self._topic_index.add(topic)
+                self._last_ts[topic] = max(self._last_ts.get(topic, index.last_ts), index.last_ts)
+
+    def _recover(self, path: str) -> Optional[_Segment]:
+        file_size = os.path.getsize(path)
+        if file_size == 0:
+            os.remove(path)
+            return None
+        segment = _Segment(path, os.path.getmtime(path))
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), file_size, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                while offset + HEADER.size <= file_size:
+                    timestamp, _, topic_len, payload_len, _ = HEADER.unpack_from(data, offset)
+                    end = offset + HEADER.size + topic_len + payload_len
+                    if end > file_size:
+                        break
+                    topic = data[offset + HEADER.size:offset + HEADER.size + topic_len].decode("utf-8")
+                    index = segment.topics.get(topic)
+                    if index is None:
+                        index = segment.topics[topic] = _TopicIndex(timestamp)
+                        segment.created_at = min(segment.created_at, timestamp)
+                    if index.count % self.index_interval == 0:
+                        index.sparse_ts.append(timestamp)
+                        index.sparse_offsets.append(offset)
+                    index.count += 1
+                    index.last_ts = timestamp
+                    index.last_offset = offset
+                    segment.records += 1
+                    offset = end
+            finally:
+                data.close()
+        if offset < file_size:
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+            self.logger.warning("Truncated torn tail of message log segment %s", path)
+        segment.size = offset
+        segment.sealed = True
+        segment.save_index()
+        return segment
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def query(self, topics: Optional[Iterable[str]] = None, since: Optional[float] = None,
+              limit: Optional[int] = None, before: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """
+        跨主题查询消息，按时间从新到旧返回
+
+        Args:
+            topics: 要查询的主题，为空时查询全部主题
+            since: 只返回该时间(epoch秒)及之后的消息
+            limit: 最多返回的消息数量，为空或0时不限制
+            before: 主题 -> 时间上界（不含），用于跳过内存中已有的消息
+
+        Returns:
+            List[Dict]: 消息列表（从新到旧），格式与内存历史相同
+        """
+        merged = self.iter_newest(topics, since, before)
+        return [self.read(handle) for _, handle in islice(merged, limit or None)]
+
+    def iter_newest(self, topics: Optional[Iterable[str]] = None, since: Optional[float] = None,
+                    before: Optional[Dict[str, float]] = None) -> Iterator[Tuple[float, Tuple]]:
+        """
+        跨主题从新到旧遍历(时间戳, 记录句柄)，只读取记录头
+
+        记录句柄传给read()才会解码为消息，参数含义同query()。
+        """
+        self.flush()
+        if topics is None:
+            topics = list(self._last_ts)
+        before = before or {}
+        streams = [self._iter_topic(topic, since, before.get(topic)) for topic in topics
+                   if topic in self._last_ts]
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)
+
+    def _iter_topic(self, topic: str, since: Optional[float],
+                    before: Optional[float]) -> Iterator[Tuple[float, Tuple]]:
+        """沿反向指针链从新到旧遍历一个主题，只读取记录头"""
+        for segment in reversed(self._segments):
+            index = segment.topics.get(topic)
+            if index is None:
+                continue
+            if since is not None and index.last_ts < since:
+                return
+            if before is not None and index.first_ts >= before:
+                continue
+            data = segment.view()
+            if data is None:
+                continue
+
+            offset = index.last_offset
+            if before is not None and index.last_ts >= before:
+                # 从第一个不早于上界的稀疏索引点开始，最多跳过index_interval条记录
+                position = bisect.bisect_left(index.sparse_ts, before)
+                if position < len(index.sparse_offsets):
+                    offset = index.sparse_offsets[position]
+
+            while offset != NO_PREVIOUS:
+                timestamp, previous = HEADER.unpack_from(data, offset)[:2]
+                if since is not None and timestamp < since:
+                    return
+                if before is None or timestamp < before:
+                    yield timestamp, (segment, offset)
+                offset = previous
+
+    def read(self, handle: Tuple) -> Dict:
+        """把iter_newest()返回的记录句柄解码为消息"""
+        segment, offset = handle
+        data = segment.view()
+        timestamp, _, topic_len, payload_len, flags = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        return {
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "topic": data[start:start + topic_len].decode("utf-8"),
+            "payload": data[start + topic_len:start + topic_len + payload_len].decode("utf-8", "replace"),
+            "qos": flags & 0x03,
+            "retain": bool(flags & 0x04)
+        }
+
+    def match_topics(self, topic_filter: str) -> List[str]:
+        """按MQTT过滤器（支持+和#）查找日志中有记录的主题"""
+        if not is_wildcard(topic_filter):
+            return [topic_filter] if topic_filter in self._last_ts else []
+        return self._topic_index.match(topic_filter)
+
+    def topics(self) -> List[str]:
+        """获取日志中有记录的所有主题"""
+        return list(self._last_ts)
+
+    def stats(self) -> Dict:
+        """获取段文件数量、大小和记录数"""
+        return {
+            "directory": self.directory,
+            "segments": len(self._segments),
+            "bytes": sum(segment.size for segment in self._segments),
+            "records": sum(segment.records for segment in self._segments),
+            "topics": len(self._last_ts),
+            "write_errors": self.write_errors,
+            "oldest": datetime.fromtimestamp(self._segments[0].created_at).isoformat()
+            if self._segments else None
+        }
+
+    def __contains__(self, topic: object) -> bool:
+        return topic in self._last_ts
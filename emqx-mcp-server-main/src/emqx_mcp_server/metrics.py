@@ -0,0 +1,556 @@
+"""
+延迟直方图和服务器指标模块
+
+Histogram使用固定的对数分布桶边界记录耗时（毫秒），同时维护：
+- 滚动窗口：由若干时间片组成，过期的时间片整体丢弃，反映最近一段时间的延迟分布
+- 累计计数：进程启动以来的全部观测，桶计数单调不减
+
+分位数根据桶计数线性插值估算，记录和查询的开销与观测数量无关。
+
+MetricsRegistry保存进程内的计数器、仪表和固定桶直方图（按标签分组），
+供MQTT接收路径、EMQX HTTP API客户端和MCP工具调用记录指标，
+通过get_server_metrics工具和可选的Prometheus文本端点导出。
+热路径上的记录操作不加锁，开销在1微秒以内。
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+# 默认桶上界（毫秒），最后还有一个+Inf桶
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+# 亚毫秒级回调耗时的桶上界（毫秒）
+FAST_CALLBACK_BUCKETS_MS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 50)
+
+
+def _interpolate_percentile(bounds: Sequence[float], counts: List[int], count: int, q: float,
+                            low: float, high: float) -> float:
+    """在目标分位数所在的桶内线性插值，并限制在观测到的最小/最大值之间"""
+    rank = q * count
+    seen = 0
+    for index, bucket_count in enumerate(counts):
+        if bucket_count and seen + bucket_count >= rank:
+            lower = bounds[index - 1] if index > 0 else 0.0
+            upper = bounds[index] if index < len(bounds) else high
+            lower, upper = max(lower, low), min(upper, high)
+            return lower + (upper - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return high
+
+
+class _Slice:
+    """滚动窗口中的一个时间片"""
+
+    __slots__ = ("start", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, start: float, buckets: int):
+        self.start = start
+        self.counts = [0] * buckets
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+
+class Histogram:
+    """
+    固定桶边界的滚动直方图
+
+    observe()和snapshot()可以在不同线程调用。
+    """
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS,
+                 window_seconds: float = 300.0, slices: int = 10):
+        """
+        初始化直方图
+
+        Args:
+            bounds: 递增的桶上界
+            window_seconds: 滚动窗口长度（秒）
+            slices: 窗口划分的时间片数量
+        """
+        self.bounds = tuple(bounds)
+        self.window_seconds = window_seconds
+        self.slice_seconds = window_seconds / slices
+        self._lock = threading.Lock()
+        self._slices: Deque[_Slice] = deque(maxlen=slices)
+        self.total_counts = [0] * (len(self.bounds) + 1)
+        self.total_count = 0
+        self.total_sum = 0.0
+
+    def _bucket(self, value: float) -> int:
+        # 桶数量很少，线性查找比bisect的函数调用更快
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                return index
+        return len(self.bounds)
+
+    def observe(self, value: float, now: Optional[float] = None) -> None:
+        """记录一次观测值"""
+        now = time.monotonic() if now is None else now
+        index = self._bucket(value)
+        with self._lock:
+            current = self._slices[-1] if self._slices else None
+            if current is None or now - current.start >= self.slice_seconds:
+                current = _Slice(now - (now % self.slice_seconds), len(self.total_counts))
+                self._slices.append(current)
+            current.counts[index] += 1
+            current.count += 1
+            current.sum += value
+            if value < current.min:
+                current.min = value
+            if value > current.max:
+                current.max = value
+            self.total_counts[index] += 1
+            self.total_count += 1
+            self.total_sum += value
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        获取滚动窗口内的统计
+
+        Returns:
+            Dict: count/avg/min/max/p50/p95/p99（窗口内没有观测时只有count=0）
+        """
+        now = time.monotonic() if now is None else now
+        counts = [0] * len(self.total_counts)
+        count, total, low, high = 0, 0.0, float("inf"), float("-inf")
+        with self._lock:
+            for piece in self._slices:
+                if now - piece.start >= self.window_seconds:
+                    continue
+                for index, value in enumerate(piece.counts):
+                    counts[index] += value
+                count += piece.count
+                total += piece.sum
+                low = min(low, piece.min)
+                high = max(high, piece.max)
+            lifetime = self.total_count
+        result: Dict[str, Any] = {"window_seconds": self.window_seconds, "count": count,
+                                  "lifetime_count": lifetime}
+        if count:
+            result.update({
+                "avg": round(total / count, 3),
+                "min": round(low, 3),
+                "max": round(high, 3),
+                "p50": round(self._percentile(counts, count, 0.50, low, high), 3),
+                "p95": round(self._percentile(counts, count, 0.95, low, high), 3),
+                "p99": round(self._percentile(counts, count, 0.99, low, high), 3)
+            })
+        return result
+
+    def _percentile(self, counts: List[int], count: int, q: float, low: float, high: float) -> float:
+        return _interpolate_percentile(self.bounds, counts, count, q, low, high)
+
+    def cumulative(self) -> Dict[str, Any]:
+        """获取进程启动以来的累计桶计数（每个桶包含所有不超过上界的观测）"""
+        with self._lock:
+            running = 0
+            buckets = []
+            for bound, value in zip(list(self.bounds) + [float("inf")], self.total_counts):
+                running += value
+                buckets.append((bound, running))
+            return {"buckets": buckets, "count": self.total_count, "sum": self.total_sum}
+
+
+class HistogramSet:
+    """
+    按键（如MQTT主题）分组的直方图
+
+    键的数量有上限，超出时丢弃最早创建的直方图。
+    """
+
+    def __init__(self, max_keys: int = 10000, **histogram_kwargs):
+        """
+        初始化直方图集合
+
+        Args:
+            max_keys: 最多跟踪的键数量
+            histogram_kwargs: 传给Histogram的参数
+        """
+        self.max_keys = max_keys
+        self.histogram_kwargs = histogram_kwargs
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+
+    def observe(self, key: str, value: float, now: Optional[float] = None) -> None:
+        """为键记录一次观测值"""
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    if len(self._histograms) >= self.max_keys:
+                        del self._histograms[next(iter(self._histograms))]
+                    histogram = self._histograms[key] = Histogram(**self.histogram_kwargs)
+        histogram.observe(value, now)
+
+    def get(self, key: str) -> Optional[Histogram]:
+        """获取键的直方图"""
+        return self._histograms.get(key)
+
+    def snapshot(self, limit: Optional[int] = None, sort_by: str = "p95") -> Dict[str, Dict[str, Any]]:
+        """
+        获取各键滚动窗口内的统计
+
+        Args:
+            limit: 最多返回的键数量（按sort_by从大到小），为空时返回全部
+            sort_by: 排序字段
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        snapshots = [(key, histogram.snapshot()) for key, histogram in items]
+        snapshots = [item for item in snapshots if item[1]["count"]]
+        snapshots.sort(key=lambda item: item[1].get(sort_by, 0), reverse=True)
+        if limit is not None:
+            snapshots = snapshots[:limit]
+        return dict(snapshots)
+
+    def __len__(self) -> int:
+        return len(self._histograms)
+
+
+# ----------------------------------------------------------------------
+# 服务器指标注册表
+# ----------------------------------------------------------------------
+
+class Counter:
+    """单调递增的计数器"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """可增可减的仪表，也可以在导出时调用函数取值"""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self.value: float = 0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float("nan")
+        return self.value
+
+
+class BucketHistogram:
+    """
+    固定桶边界的累计直方图
+
+    与Histogram相比没有滚动窗口和锁，observe()只做一次二分查找和几次加法。
+    每个直方图通常只在一个线程中更新；跨线程并发更新可能丢失极少数计数。
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """进程启动以来的count/avg/min/max/p50/p95/p99"""
+        counts, count = list(self.counts), self.count
+        result: Dict[str, Any] = {"count": count}
+        if count:
+            low, high = self.min, self.max
+            result.update({
+                "avg": round(self.sum / count, 4),
+                "min": round(low, 4),
+                "max": round(high, 4),
+                "p50": round(_interpolate_percentile(self.bounds, counts, count, 0.50, low, high), 4),
+                "p95": round(_interpolate_percentile(self.bounds, counts, count, 0.95, low, high), 4),
+                "p99": round(_interpolate_percentile(self.bounds, counts, count, 0.99, low, high), 4)
+            })
+        return result
+
+    def cumulative(self) -> Dict[str, Any]:
+        """累计桶计数，格式与Histogram.cumulative()相同"""
+        running = 0
+        buckets = []
+        for bound, value in zip(list(self.bounds) + [float("inf")], list(self.counts)):
+            running += value
+            buckets.append((bound, running))
+        return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+# 超出标签组合上限后的指标都记到这个标签值下
+OVERFLOW_LABEL = "_other"
+
+
+class MetricFamily:
+    """
+    同名指标按标签值分组
+
+    labels()在标签组合已存在时只有一次字典查找；标签组合数量有上限，
+    超出后的新组合合并到OVERFLOW_LABEL下，避免按主题打标签时无限增长。
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str],
+                 factory: Callable[[], Any], max_children: int = 10000):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.max_children = max_children
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        """获取标签值对应的指标（不存在时创建）"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    if len(self._children) >= self.max_children:
+                        values = (OVERFLOW_LABEL,) * len(self.label_names)
+                        child = self._children.get(values)
+                    if child is None:
+                        child = self._children[values] = self.factory()
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表
+
+    同名指标只注册一次，重复注册返回已有的指标族，因此多个客户端实例可以共享指标。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, MetricFamily] = {}
+        self.started_at = time.monotonic()
+        # 上一次快照时各计数器的值，用于计算每秒速率
+        self._last_values: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        self._last_snapshot_at: Optional[float] = None
+
+    def _family(self, name: str, help_text: str, kind: str, label_names: Sequence[str],
+                factory: Callable[[], Any]) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = MetricFamily(name, help_text, kind, label_names, factory)
+            elif family.kind != kind:
+                raise ValueError(f"Metric {name} already registered as a {family.kind}")
+            return family
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> MetricFamily:
+        """注册（或获取）计数器族"""
+        return self._family(name, help_text, "counter", labels, Counter)
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (),
+              function: Optional[Callable[[], float]] = None) -> MetricFamily:
+        """注册（或获取）仪表族；给出function时无标签仪表在导出时调用它取值"""
+        family = self._family(name, help_text, "gauge", labels, Gauge)
+        if function is not None:
+            family.labels().function = function
+        return family
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  bounds: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS) -> MetricFamily:
+        """注册（或获取）固定桶直方图族"""
+        return self._family(name, help_text, "histogram", labels, lambda: BucketHistogram(bounds))
+
+    def families(self) -> List[MetricFamily]:
+        with self._lock:
+            return list(self._families.values())
+
+    def snapshot(self, prefix: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        获取全部指标的当前值
+
+        计数器附带每秒速率（相对上一次快照，首次快照相对进程启动），
+        直方图给出count/avg/分位数；带标签的指标按速率或数量从大到小排列。
+
+        Args:
+            prefix: 只返回名称以该前缀开头的指标
+            limit: 每个指标族最多返回的标签组合数量
+        """
+        now = time.monotonic()
+        since = self._last_snapshot_at if self._last_snapshot_at is not None else self.started_at
+        elapsed = max(now - since, 1e-9)
+        result: Dict[str, Any] = {}
+        for family in self.families():
+            if prefix and not family.name.startswith(prefix):
+                continue
+            entries = []
+            for values, metric in family.children():
+                labels = dict(zip(family.label_names, values))
+                if family.kind == "counter":
+                    key = (family.name, values)
+                    previous = self._last_values.get(key, 0)
+                    self._last_values[key] = metric.value
+                    entry = {"value": metric.value,
+                             "per_second": round((metric.value - previous) / elapsed, 3)}
+                    sort_key = entry["per_second"]
+                elif family.kind == "gauge":
+                    entry = {"value": metric.get()}
+                    sort_key = entry["value"]
+                else:
+                    entry = metric.snapshot()
+                    sort_key = entry["count"]
+                if labels:
+                    entry = {"labels": labels, **entry}
+                entries.append((sort_key, entry))
+            entries.sort(key=lambda item: item[0] if item[0] == item[0] else 0, reverse=True)
+            if limit is not None:
+                entries = entries[:limit]
+            values_out = [entry for _, entry in entries]
+            result[family.name] = {
+                "type": family.kind,
+                "help": family.help,
+                "values": values_out if family.label_names else (values_out[0] if values_out else None)
+            }
+        self._last_snapshot_at = now
+        return result
+
+    def prometheus_text(self) -> str:
+        """以Prometheus文本格式导出全部指标"""
+        lines = []
+        for family in self.families():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for values, metric in family.children():
+                labels = _format_labels(family.label_names, values)
+                if family.kind == "counter":
+                    lines.append(f"{family.name}{labels} {_format_value(metric.value)}")
+                elif family.kind == "gauge":
+                    lines.append(f"{family.name}{labels} {_format_value(metric.get())}")
+                else:
+                    cumulative = metric.cumulative()
+                    for bound, count in cumulative["buckets"]:
+                        le = "+Inf" if bound == float("inf") else _format_value(bound)
+                        bucket_labels = _format_labels(family.label_names + ("le",), values + (le,))
+                        lines.append(f"{family.name}_bucket{bucket_labels} {count}")
+                    lines.append(f"{family.name}_sum{labels} {_format_value(cumulative['sum'])}")
+                    lines.append(f"{family.name}_count{labels} {cumulative['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _resident_memory_bytes() -> float:
+    """当前常驻内存（Linux读/proc，其他平台退回到峰值常驻内存）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+        except ImportError:
+            return float("nan")
+        # Linux以KB为单位，macOS以字节为单位
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def register_process_metrics(registry: MetricsRegistry) -> None:
+    """注册进程CPU时间和常驻内存仪表（按需计算，不占用热路径）"""
+    registry.gauge("process_cpu_seconds", "User and system CPU time of the process (s)",
+                   function=lambda: round(sum(os.times()[:2]), 3))
+    registry.gauge("process_resident_memory_bytes", "Resident memory of the process (bytes)",
+                   function=_resident_memory_bytes)
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    """获取进程内唯一的指标注册表（首次调用时创建）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Optional[MetricsRegistry] = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 不把每次抓取写进服务器日志（stdio模式下stderr由MCP客户端读取）
+        pass
+
+
+def start_metrics_server(registry: MetricsRegistry, host: str = "127.0.0.1",
+                         port: int = 9464) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动Prometheus文本端点（GET /metrics）
+
+    Returns:
+        ThreadingHTTPServer: 已启动的HTTP服务器，调用shutdown()停止
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -4,13 +4,28 @@ MQTT基础客户端模块
 提供共享的MQTT连接和消息处理功能，减少代码重复。
 """
 
+import asyncio
+import heapq
 import logging
+import time
 import ssl
 from datetime import datetime
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import paho.mqtt.client as mqtt
+from .message_history import MessageHistoryStore, _timestamp_key
+from .message_log import MessageLog
+from .ingest_queue import IngestQueue
+from .log_pipeline import TOPIC_ATTR
+from .topic_trie import TopicTrie
+from .metrics import FAST_CALLBACK_BUCKETS_MS, get_registry
 from .config import (EMQX_BROKER_HOST, EMQX_BROKER_PORT, EMQX_USERNAME, EMQX_PASSWORD, 
-                    EMQX_USE_SSL, MESSAGE_HISTORY_SIZE, MQTT_KEEPALIVE, SSL_VERIFY_CERTS)
+                    EMQX_USE_SSL, MESSAGE_HISTORY_SIZE, MQTT_KEEPALIVE, SSL_VERIFY_CERTS,
+                    MQTT_MAX_INFLIGHT,
+                    INGEST_QUEUE_SIZE, INGEST_OVERFLOW_POLICY, INGEST_BATCH_SIZE,
+                    INGEST_PRIORITY_TOPICS, MESSAGE_LOG_DIR, MESSAGE_LOG_SEGMENT_MB,
+                    MESSAGE_LOG_SEGMENT_SECONDS, MESSAGE_LOG_RETENTION_HOURS,
+                    MESSAGE_LOG_INDEX_INTERVAL)
 
 
 class BaseMQTTClient:
@@ -29,44 +44,164 @@ class BaseMQTTClient:
             client_id_prefix: 客户端ID前缀，用于区分不同的客户端实例
         """
         self.logger = logger
-        self.mqtt_client = None
-        self.message_history: Dict[str, List[Dict]] = {}
+        self.mqtt_client: Optional[mqtt.Client] = None
+        self.connected = False
         self.max_history_size = MESSAGE_HISTORY_SIZE
+        self.message_history = MessageHistoryStore(self.max_history_size)
         self.client_id_prefix = client_id_prefix
         self.subscribed_topics: Dict[str, Dict] = {}
         
+        # 可选的磁盘消息日志，保存内存环形缓冲区之外的长期历史
+        self.message_log: Optional[MessageLog] = None
+        if MESSAGE_LOG_DIR:
+            self.message_log = MessageLog(
+                MESSAGE_LOG_DIR, logger,
+                segment_bytes=int(MESSAGE_LOG_SEGMENT_MB * 1024 * 1024),
+                segment_seconds=MESSAGE_LOG_SEGMENT_SECONDS,
+                retention_seconds=MESSAGE_LOG_RETENTION_HOURS * 3600,
+                index_interval=MESSAGE_LOG_INDEX_INTERVAL
+            )
+        
+        # 按主题过滤器分发消息的消费者
+        self.topic_consumers = TopicTrie()
+        
+        # 网络线程只入队，由事件循环批量写入消息历史
+        self.priority_filters = TopicTrie()
+        for topic_filter in INGEST_PRIORITY_TOPICS:
+            self.priority_filters.insert(topic_filter, topic_filter)
+        self.ingest_queue = IngestQueue(self._apply_message, INGEST_QUEUE_SIZE,
+                                        INGEST_OVERFLOW_POLICY, INGEST_BATCH_SIZE, logger=self.logger)
+        
+        # 服务器指标：按主题的消息数和字节数、接收回调和分发耗时、历史大小
+        registry = get_registry()
+        self._received_messages = registry.counter(
+            "mqtt_messages_received_total", "MQTT messages received", ("topic",))
+        self._received_bytes = registry.counter(
+            "mqtt_bytes_received_total", "MQTT payload bytes received", ("topic",))
+        self._topic_counters: Dict[str, tuple] = {}
+        self._ingest_callback_ms = registry.histogram(
+            "mqtt_ingest_callback_ms", "on_message duration in the network thread (ms)",
+            bounds=FAST_CALLBACK_BUCKETS_MS).labels()
+        self._dispatch_ms = registry.histogram(
+            "mqtt_dispatch_ms", "History write and consumer dispatch per message on the event loop (ms)",
+            bounds=FAST_CALLBACK_BUCKETS_MS).labels()
+        registry.gauge("mqtt_history_messages", "Messages held in the in-memory history",
+                       function=self._history_size)
+        registry.gauge("mqtt_history_topics", "Topics with in-memory history",
+                       function=lambda: len(self.message_history))
+        registry.gauge("mqtt_ingest_backlog", "Messages waiting in the ingest queue",
+                       function=self.ingest_queue.backlog)
+        registry.gauge("mqtt_connected", "1 when the MQTT connection is up",
+                       function=lambda: int(self.connected))
+        
+    def _count_message(self, topic: str, size: int) -> None:
+        """网络线程：按主题累加消息数和字节数（缓存每个主题的计数器，避免重复查找标签）"""
+        counters = self._topic_counters.get(topic)
+        if counters is None:
+            counters = (self._received_messages.labels(topic), self._received_bytes.labels(topic))
+            if len(self._topic_counters) < 10000:
+                self._topic_counters[topic] = counters
+        counters[0].value += 1
+        counters[1].value += size
+    
+    def _history_size(self) -> int:
+        return sum(len(buffer) for _, buffer in self.message_history.items())
+    
     def _on_connect(self, client, userdata, flags, rc):
         """MQTT连接回调 - 子类可以重写"""
         if rc == 0:
+            self.connected = True
             self.logger.info(f"{self.client_id_prefix} connected to MQTT broker")
         else:
+            self.connected = False
             self.logger.error(f"{self.client_id_prefix} failed to connect: {rc}")
     
+    def _on_disconnect(self, client, userdata, rc):
+        """MQTT断开连接回调 - 子类可以重写"""
+        self.connected = False
+        if rc != 0:
+            self.logger.warning(f"{self.client_id_prefix} disconnected unexpectedly: {rc}")
+    
+    def _on_publish(self, client, userdata, mid):
+        """发布完成回调（QoS 1/2为收到broker确认）- 子类可以重写"""
+        pass
+    
     def _on_message(self, client, userdata, msg):
         """接收消息回调 - 子类可以重写"""
+        started = time.perf_counter()
         topic = msg.topic
+        self._count_message(topic, len(msg.payload))
         payload = msg.payload.decode('utf-8')
-        timestamp = datetime.now()
-        
-        # 保存消息到历史记录
-        if topic not in self.message_history:
-            self.message_history[topic] = []
+        received_at = time.time()
         
         message_data = {
-            "timestamp": timestamp.isoformat(),
+            "timestamp": datetime.fromtimestamp(received_at).isoformat(),
             "topic": topic,
             "payload": payload,
             "qos": msg.qos,
             "retain": msg.retain
         }
         
-        self.message_history[topic].append(message_data)
+        # 交给事件循环写入历史记录，空调状态等主题走优先通道
+        self.ingest_queue.put((topic, message_data, received_at),
+                              priority=self.priority_filters.has_match(topic))
         
-        # 限制历史记录大小
-        if len(self.message_history[topic]) > self.max_history_size:
-            self.message_history[topic] = self.message_history[topic][-self.max_history_size:]
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Received message from %s: %s", topic, payload, extra={TOPIC_ATTR: topic})
+        self._ingest_callback_ms.observe((time.perf_counter() - started) * 1000)
+    
+    def _apply_message(self, item):
+        """在事件循环中保存消息到历史记录（环形缓冲区自动淘汰最旧的消息）"""
+        started = time.perf_counter()
+        topic, message_data, received_at = item
+        self.message_history.append(topic, message_data, received_at)
+        if self.message_log is not None:
+            self._append_to_log(topic, message_data, received_at)
+        for callback in self.topic_consumers.match(topic):
+            callback(message_data)
+        self._dispatch_ms.observe((time.perf_counter() - started) * 1000)
+    
+    def _append_to_log(self, topic: str, message_data: Dict, received_at: float):
+        """写入磁盘消息日志；写入失败（磁盘已满等）只计数和记录日志，不影响内存历史和分发"""
+        if self.message_log is None:
+            return
+        try:
+            self.message_log.append(topic, message_data, received_at)
+        except OSError as e:
+            self.logger.error("Message log append failed for %s: %s", topic, e, extra={TOPIC_ATTR: topic})
+    
+    def add_topic_consumer(self, topic_filter: str, callback: Callable[[Dict], None]):
+        """
+        注册按主题过滤器分发的消息消费者
         
-        self.logger.info(f"Received message from {topic}: {payload}")
+        Args:
+            topic_filter: MQTT主题过滤器（支持+和#）
+            callback: 在事件循环中接收消息数据的回调
+        """
+        self.topic_consumers.insert(topic_filter, callback)
+    
+    def remove_topic_consumer(self, topic_filter: str, callback: Optional[Callable[[Dict], None]] = None) -> int:
+        """移除消息消费者，callback为空时移除该过滤器下的全部消费者"""
+        return self.topic_consumers.remove(topic_filter, callback)
+    
+    def sync_ingest(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> int:
+        """
+        在事件循环中处理积压的消息
+        
+        Args:
+            loop: 要绑定的事件循环，为空时使用当前运行的事件循环（如果有）
+        
+        Returns:
+            int: 处理的消息数量
+        """
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+        if loop is not None:
+            self.ingest_queue.bind_loop(loop)
+        return self.ingest_queue.drain()
     
     def _setup_ssl_context(self):
         """设置SSL上下文"""
@@ -89,17 +224,21 @@ class BaseMQTTClient:
         """设置MQTT客户端"""
         if self.mqtt_client is None:
             client_id = f"{self.client_id_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            self.mqtt_client = mqtt.Client(client_id=client_id)
-            self.mqtt_client.username_pw_set(EMQX_USERNAME, EMQX_PASSWORD)
-            self.mqtt_client.on_connect = self._on_connect
-            self.mqtt_client.on_message = self._on_message
-            
-            # 设置SSL
-            self._setup_ssl_context()
-            
             try:
-                self.mqtt_client.connect_async(EMQX_BROKER_HOST, EMQX_BROKER_PORT, MQTT_KEEPALIVE)
-                self.mqtt_client.loop_start()
+                client = self.mqtt_client = mqtt.Client(client_id=client_id)
+                if EMQX_USERNAME:
+                    client.username_pw_set(EMQX_USERNAME, EMQX_PASSWORD)
+                client.on_connect = self._on_connect
+                client.on_disconnect = self._on_disconnect
+                client.on_message = self._on_message
+                client.on_publish = self._on_publish
+                client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+                
+                # 设置SSL
+                self._setup_ssl_context()
+                
+                client.connect_async(EMQX_BROKER_HOST, EMQX_BROKER_PORT, MQTT_KEEPALIVE)
+                client.loop_start()
                 self.logger.info(f"{self.client_id_prefix} MQTT client setup initiated (async)")
                 return True
             except Exception as e:
@@ -108,26 +247,58 @@ class BaseMQTTClient:
                 return False
         return True
     
+    def match_history_topics(self, topic_filter: str) -> List[str]:
+        """按MQTT过滤器查找内存历史或磁盘日志中有记录的主题"""
+        topics = self.message_history.match_topics(topic_filter)
+        if self.message_log is None:
+            return topics
+        in_memory = set(topics)
+        return topics + [t for t in self.message_log.match_topics(topic_filter) if t not in in_memory]
+    
+    def query_history(self, topics: Optional[Iterable[str]] = None, since: Optional[float] = None,
+                      limit: Optional[int] = None) -> List[Dict]:
+        """
+        跨内存历史和磁盘日志查询消息，按时间从新到旧返回
+        
+        每个主题在内存中已有的时间段只从内存读取，更早的部分从磁盘日志读取，
+        两路按时间归并，取满limit条后停止，磁盘记录只有被返回时才会解码。
+        
+        Args:
+            topics: 要查询的主题，为空时查询全部主题
+            since: 只返回该时间(epoch秒)之后的消息
+            limit: 最多返回的消息数量，为空或0时不限制
+        """
+        if self.message_log is None:
+            return self.message_history.query(topics, since=since, limit=limit)
+        
+        if topics is not None:
+            topics = list(topics)
+        before = {}
+        for topic in (topics if topics is not None else self.message_history.topics()):
+            oldest = self.message_history.oldest_timestamp(topic)
+            if oldest is not None:
+                before[topic] = oldest
+        
+        memory = self.message_history.iter_newest(topics, since)
+        disk = self.message_log.iter_newest(topics, since, before)
+        # 内存中的条目是消息字典，磁盘日志中的条目是记录句柄
+        merged: Iterator[Tuple[float, Any]] = heapq.merge(memory, disk, key=_timestamp_key, reverse=True)
+        return [entry if isinstance(entry, dict) else self.message_log.read(entry)
+                for _, entry in islice(merged, limit or None)]
+    
     def get_latest_message(self, topic: str) -> Optional[Dict]:
         """获取指定主题的最新消息"""
-        if topic in self.message_history and self.message_history[topic]:
-            return self.message_history[topic][-1]
-        return None
+        self.sync_ingest()
+        return self.message_history.latest(topic)
     
-    def get_message_history(self, topic: str = None, limit: int = 10) -> List[Dict]:
+    def get_message_history(self, topic: Optional[str] = None, limit: int = 10) -> List[Dict]:
         """获取消息历史"""
+        self.sync_ingest()
         if topic:
-            messages = self.message_history.get(topic, [])
-            return messages[-limit:] if limit else messages
+            return self.message_history.history(topic, limit)
         else:
-            # 返回所有主题的消息
-            all_messages = []
-            for topic_messages in self.message_history.values():
-                all_messages.extend(topic_messages)
-            
-            # 按时间排序
-            all_messages.sort(key=lambda x: x["timestamp"], reverse=True)
-            return all_messages[:limit] if limit else all_messages
+            # 返回所有主题的消息（按时间从新到旧归并，包括磁盘日志）
+            return self.query_history(limit=limit)
     
     def cleanup(self):
         """清理MQTT客户端连接"""
@@ -140,3 +311,6 @@ class BaseMQTTClient:
                 self.logger.error(f"Error cleaning up {self.client_id_prefix} MQTT client: {str(e)}")
             finally:
                 self.mqtt_client = None
+                self.connected = False
+        if self.message_log is not None:
+            self.message_log.close()
@@ -0,0 +1,105 @@
+"""
+MQTT发布确认登记模块
+
+paho的publish()返回MQTT_ERR_SUCCESS只表示消息已进入本地发送队列。
+PublishTracker把QoS 1/2消息的报文ID映射到事件循环上的Future，
+on_publish回调（broker返回PUBACK/PUBCOMP）在网络线程中触发时完成对应的Future，
+调用方可以带超时等待broker确认并得到发布到确认的耗时。
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+
+class PublishTracker:
+    """
+    报文ID -> Future 的发布确认登记表
+
+    register()在事件循环中调用，on_publish()可以在任意线程调用。
+    确认可能在publish()返回、register()之前就到达，这类提前到达的确认
+    会暂存起来，只有确认时间不早于发布开始时间才会匹配，避免报文ID复用造成误判。
+    """
+
+    def __init__(self, max_early: int = 4096):
+        """
+        初始化登记表
+
+        Args:
+            max_early: 最多暂存的未登记确认数量
+        """
+        self.max_early = max_early
+        self._lock = threading.Lock()
+        # 报文ID -> (Future, 所属事件循环)
+        self._pending: Dict[int, Tuple[asyncio.Future, asyncio.AbstractEventLoop]] = {}
+        # 报文ID -> 确认时间(monotonic)，用于提前到达的确认
+        self._early: "OrderedDict[int, float]" = OrderedDict()
+        self.registered = 0
+        self.acked = 0
+        self.abandoned = 0
+
+    def register(self, mid: int, started_at: float) -> asyncio.Future:
+        """
+        登记一条已发布的消息，返回在broker确认时完成的Future
+
+        Args:
+            mid: publish()返回的报文ID
+            started_at: 调用publish()之前的time.monotonic()
+
+        Returns:
+            asyncio.Future: 结果为确认时间(monotonic)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self.registered += 1
+            acked_at = self._early.pop(mid, None)
+            if acked_at is not None and acked_at >= started_at:
+                self.acked += 1
+                future.set_result(acked_at)
+            else:
+                self._pending[mid] = (future, loop)
+        return future
+
+    def on_publish(self, mid: int) -> None:
+        """paho的on_publish回调（网络线程）：完成对应的Future"""
+        acked_at = time.monotonic()
+        with self._lock:
+            entry = self._pending.pop(mid, None)
+            if entry is None:
+                self._early[mid] = acked_at
+                self._early.move_to_end(mid)
+                while len(self._early) > self.max_early:
+                    self._early.popitem(last=False)
+                return
+            self.acked += 1
+        future, loop = entry
+        try:
+            loop.call_soon_threadsafe(_resolve, future, acked_at)
+        except RuntimeError:
+            # 事件循环已经关闭，等待方不存在了
+            pass
+
+    def discard(self, mid: int) -> None:
+        """放弃等待（超时或取消）"""
+        with self._lock:
+            if self._pending.pop(mid, None) is not None:
+                self.abandoned += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """获取登记表统计"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "registered": self.registered,
+                "acked": self.acked,
+                "abandoned": self.abandoned,
+                "early_acks": len(self._early)
+            }
+
+
+def _resolve(future: asyncio.Future, acked_at: float) -> None:
+    if not future.done():
+        future.set_result(acked_at)
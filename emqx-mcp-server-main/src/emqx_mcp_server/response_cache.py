@@ -0,0 +1,155 @@
+"""
+API响应缓存模块
+
+为只读的EMQX HTTP API调用提供带TTL和LRU容量上限的缓存，
+并合并相同的并发请求：同一个键同时只会发出一次HTTP调用，
+其余调用方等待并共享这次调用的结果。
+
+失效操作会提升键的代数：失效前已开始的请求返回后不再写入缓存，
+之后的调用方也不会再合并到这次请求上。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    TTL + LRU 异步缓存
+
+    ttl为0时不缓存结果，但仍然合并并发的相同请求。
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        """
+        初始化缓存
+
+        Args:
+            ttl: 缓存条目的有效期（秒）
+            maxsize: 最多保存的条目数，超出时淘汰最久未使用的条目
+            cacheable: 判断结果是否可以缓存的函数（例如不缓存错误响应）
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.cacheable = cacheable
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 有请求在进行的键 -> [代数, 进行中的请求数]，失效时代数加一
+        self._generations: Dict[Hashable, list] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        返回缓存的结果，未命中时调用loader加载
+
+        Args:
+            key: 缓存键
+            loader: 无参数的协程函数，返回要缓存的结果
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                return await self._load(key, loader)
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 发起请求的调用方被取消（而不是本调用方），重新加载
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        state = self._generations.setdefault(key, [0, 0])
+        generation = state[0]
+        state[1] += 1
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # 不把取消传给共享这次请求的其他调用方，由它们重新加载
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时取走异常，避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if state[0] == generation:
+                self._store(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            state[1] -= 1
+            if not state[1] and self._generations.get(key) is state:
+                del self._generations[key]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0 or (self.cacheable is not None and not self.cacheable(value)):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """删除指定键的缓存条目，并使进行中的请求结果不再写入缓存"""
+        state = self._generations.get(key)
+        if state is not None:
+            state[0] += 1
+            self._inflight.pop(key, None)
+        if self._entries.pop(key, None) is None and state is None:
+            return False
+        self.invalidations += 1
+        return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """失效所有满足条件的键（缓存条目和进行中的请求），返回失效的键数量"""
+        keys = [key for key in set(self._entries) | set(self._generations) if predicate(key)]
+        for key in keys:
+            self.invalidate(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存条目（不影响正在进行的请求）"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中率等统计信息"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "ttl_seconds": self.ttl,
+            "maxsize": self.maxsize,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,246 @@
+"""
+传感器时间桶聚合模块
+
+在消息接收路径上增量维护每个主题在多个时间粒度（1分钟、15分钟、1小时）上的
+min/max/sum/count/last。每个粒度只保留固定数量的时间桶，单个主题的内存占用与消息速率
+无关；查询只遍历窗口内的时间桶，开销为O(桶数)而不是O(消息数)。
+
+每个时间桶约占200字节，默认粒度在保留期写满时每个主题约2800个桶（约0.6MB）。
+主题总数由max_topics限制，超出时淘汰最久没有收到读数的主题，总内存约为
+max_topics × 每主题占用。
+"""
+
+import re
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 粒度名称 -> (桶宽度秒数, 保留的桶数量)
+DEFAULT_TIERS: Dict[str, Tuple[int, int]] = {
+    "1m": (60, 24 * 60),          # 1分钟粒度，保留24小时
+    "15m": (15 * 60, 7 * 24 * 4),  # 15分钟粒度，保留7天
+    "1h": (3600, 30 * 24),        # 1小时粒度，保留30天
+}
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_DURATION_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+
+
+def parse_duration(value: str) -> float:
+    """
+    解析时间长度，如 "90s"、"15m"、"1h"、"7d"，不带单位时按分钟计算
+
+    Raises:
+        ValueError: 格式不正确或不是正数
+    """
+    match = _DURATION_PATTERN.match(str(value).lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid duration: {value} (expected e.g. 30m, 1h, 7d)")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or "m"]
+
+
+def parse_tiers(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    解析粒度配置，如 "1m:24h,15m:7d,1h:30d"（桶宽度:保留时长）
+
+    Raises:
+        ValueError: 格式不正确、桶宽度不是整秒或保留时长小于桶宽度
+    """
+    tiers: Dict[str, Tuple[int, int]] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, retention = item.partition(":")
+        if not sep:
+            raise ValueError(f"Invalid rollup tier: {item.strip()} (expected e.g. 1m:24h)")
+        width = parse_duration(name)
+        if width != int(width):
+            raise ValueError(f"Rollup tier width must be whole seconds: {name.strip()}")
+        count = int(parse_duration(retention) // width)
+        if count < 1:
+            raise ValueError(f"Rollup tier retention is shorter than its width: {item.strip()}")
+        tiers[name.strip()] = (int(width), count)
+    if not tiers:
+        raise ValueError("No rollup tiers configured")
+    return tiers
+
+
+class _Bucket:
+    """单个时间桶的聚合值"""
+
+    __slots__ = ("start", "min", "max", "sum", "count", "last", "last_ts")
+
+    def __init__(self, start: float, value: float, timestamp: float):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.sum = value
+        self.count = 1
+        self.last = value
+        self.last_ts = timestamp
+
+    def add(self, value: float, timestamp: float) -> None:
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        if timestamp >= self.last_ts:
+            self.last = value
+            self.last_ts = timestamp
+
+
+class RollupSeries:
+    """单个主题在一个粒度上的定长时间桶序列"""
+
+    __slots__ = ("width", "buckets", "late")
+
+    def __init__(self, width: int, max_buckets: int):
+        self.width = width
+        self.buckets: Deque[_Bucket] = deque(maxlen=max_buckets)
+        self.late = 0
+
+    def add(self, value: float, timestamp: float) -> None:
+        start = timestamp - timestamp % self.width
+        buckets = self.buckets
+        if not buckets or buckets[-1].start < start:
+            buckets.append(_Bucket(start, value, timestamp))
+            return
+        # 乱序到达的消息：从最新的桶往回找对应的桶，超出保留范围则丢弃
+        for bucket in reversed(buckets):
+            if bucket.start == start:
+                bucket.add(value, timestamp)
+                return
+            if bucket.start < start:
+                break
+        self.late += 1
+
+    def window(self, since: float) -> List[_Bucket]:
+        """返回覆盖since之后时间的桶（从旧到新）"""
+        selected = []
+        for bucket in reversed(self.buckets):
+            if bucket.start + self.width <= since:
+                break
+            selected.append(bucket)
+        selected.reverse()
+        return selected
+
+
+class RollupEngine:
+    """
+    多粒度时间桶聚合引擎
+
+    add()在事件循环中调用，每条消息对每个粒度只做一次O(1)更新。
+    """
+
+    def __init__(self, tiers: Optional[Dict[str, Tuple[int, int]]] = None, max_topics: int = 0):
+        """
+        初始化聚合引擎
+
+        Args:
+            tiers: 粒度名称 -> (桶宽度秒数, 保留桶数量)，默认1m/15m/1h
+            max_topics: 最多保留聚合数据的主题数，超出时淘汰最久没有读数的主题，0表示不限制
+        """
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        self.max_topics = max_topics
+        self.evicted = 0
+        # 按最近一次读数排序，最久没有读数的主题在最前
+        self._series: "OrderedDict[str, Dict[str, RollupSeries]]" = OrderedDict()
+
+    def add(self, topic: str, value: float, timestamp: float) -> None:
+        """把一个数值读数计入该主题的所有粒度"""
+        series = self._series.get(topic)
+        if series is None:
+            series = self._series[topic] = {
+                name: RollupSeries(width, max_buckets) for name, (width, max_buckets) in self.tiers.items()
+            }
+            if self.max_topics and len(self._series) > self.max_topics:
+                self._series.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._series.move_to_end(topic)
+        for tier in series.values():
+            tier.add(value, timestamp)
+
+    def pick_resolution(self, window_seconds: float) -> str:
+        """选择保留范围能覆盖窗口、且返回桶数不超过120的最细粒度，都超过时选最粗的粒度"""
+        by_width = sorted(self.tiers.items(), key=lambda item: item[1][0])
+        for name, (width, max_buckets) in by_width:
+            if width * max_buckets >= window_seconds and window_seconds / width <= 120:
+                return name
+        return by_width[-1][0]
+
+    def query(self, topic: str, window_seconds: float, resolution: Optional[str] = None,
+              now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        查询时间窗口内的聚合值
+
+        Args:
+            topic: 传感器主题
+            window_seconds: 窗口长度（秒），从now往前计算
+            resolution: 粒度名称，为空时自动选择
+            now: 窗口结束时间(epoch秒)，默认使用最新读数的时间
+
+        Returns:
+            Dict: 窗口汇总和每个时间桶的聚合值，主题没有数据时返回None
+
+        Raises:
+            ValueError: 粒度名称未知
+        """
+        series = self._series.get(topic)
+        if series is None:
+            return None
+        if resolution is None:
+            resolution = self.pick_resolution(window_seconds)
+        if resolution not in series:
+            raise ValueError(f"Unknown resolution: {resolution} (available: {', '.join(self.tiers)})")
+
+        tier = series[resolution]
+        if now is None:
+            now = tier.buckets[-1].last_ts if tier.buckets else 0.0
+        buckets = tier.window(now - window_seconds)
+        width, max_buckets = self.tiers[resolution]
+
+        summary: Dict[str, Any] = {"count": 0}
+        if buckets:
+            total = sum(b.sum for b in buckets)
+            count = sum(b.count for b in buckets)
+            newest = max(buckets, key=lambda b: b.last_ts)
+            summary = {
+                "min": min(b.min for b in buckets),
+                "max": max(b.max for b in buckets),
+                "avg": round(total / count, 3),
+                "count": count,
+                "last": newest.last,
+                "last_timestamp": datetime.fromtimestamp(newest.last_ts).isoformat()
+            }
+        return {
+            "topic": topic,
+            "resolution": resolution,
+            "window_seconds": window_seconds,
+            "retention_seconds": width * max_buckets,
+            "summary": summary,
+            "buckets": [{
+                "start": datetime.fromtimestamp(b.start).isoformat(),
+                "min": b.min,
+                "max": b.max,
+                "avg": round(b.sum / b.count, 3),
+                "count": b.count,
+                "last": b.last
+            } for b in buckets]
+        }
+
+    def topics(self) -> List[str]:
+        """获取有聚合数据的主题"""
+        return list(self._series)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取时间桶数量、丢弃的迟到读数和被淘汰的主题数"""
+        return {
+            "topics": len(self._series),
+            "max_topics": self.max_topics,
+            "evicted_topics": self.evicted,
+            "buckets": sum(len(t.buckets) for s in self._series.values() for t in s.values()),
+            "late_dropped": sum(t.late for s in self._series.values() for t in s.values())
+        }
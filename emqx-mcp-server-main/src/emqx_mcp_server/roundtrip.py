@@ -0,0 +1,153 @@
+"""
+空调命令往返跟踪模块
+
+空调命令经 classroom/control/ac -> eKuiper规则 -> EdgeX core-command 下发，
+设备状态再经EdgeX和eKuiper规则回到 classroom/ac/.../status。
+RoundTripTracker记录每条发出的命令，把它与之后第一条反映新值的状态消息配对，
+统计命令到状态收敛的往返耗时；超时仍未收敛的命令单独计数。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import Histogram
+
+# 属性名称 -> 比较状态值和命令值的方式
+ATTRIBUTE_POWER = "power"
+ATTRIBUTE_TEMPERATURE = "temperature"
+
+_TRUE_STRINGS = {"on", "true", "1", "open", "running"}
+_FALSE_STRINGS = {"off", "false", "0", "closed", "stopped"}
+
+
+def _as_power(value: Any) -> Optional[bool]:
+    """把设备上报的电源状态统一为布尔值，无法识别时返回None"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+    return None
+
+
+def values_match(attribute: str, expected: Any, reported: Any, tolerance: float = 0.05) -> bool:
+    """状态值是否反映了命令设置的值"""
+    if attribute == ATTRIBUTE_POWER:
+        reported = _as_power(reported)
+        return reported is not None and reported == _as_power(expected)
+    try:
+        return abs(float(reported) - float(expected)) <= tolerance
+    except (TypeError, ValueError):
+        return False
+
+
+class _PendingCommand:
+    __slots__ = ("value", "issued_at")
+
+    def __init__(self, value: Any, issued_at: float):
+        self.value = value
+        self.issued_at = issued_at
+
+
+class RoundTripTracker:
+    """
+    命令到状态收敛的往返跟踪器
+
+    每个(教室, 属性)只跟踪最新的一条命令：新命令发出时，尚未收敛的旧命令计为被覆盖。
+    所有方法都在事件循环中调用，时间使用epoch秒（与消息的接收时间一致）。
+    """
+
+    def __init__(self, timeout: float = 120.0, window_seconds: float = 3600.0):
+        """
+        初始化往返跟踪器
+
+        Args:
+            timeout: 命令发出后多久仍未收到匹配状态即视为未收敛（秒）
+            window_seconds: 往返耗时直方图的滚动窗口（秒）
+        """
+        self.timeout = timeout
+        # (教室, 属性) -> 等待收敛的命令；字典按发出时间排序，过期检查只看开头
+        self._pending: Dict[Tuple[str, str], _PendingCommand] = {}
+        self.round_trip_ms = {
+            attribute: Histogram(window_seconds=window_seconds)
+            for attribute in (ATTRIBUTE_POWER, ATTRIBUTE_TEMPERATURE)
+        }
+        self.issued = 0
+        self.converged = 0
+        self.non_converged = 0
+        self.superseded = 0
+
+    def issue(self, room: str, attribute: str, value: Any, issued_at: float) -> None:
+        """记录一条发出的命令"""
+        self.expire(issued_at)
+        key = (room, attribute)
+        if self._pending.pop(key, None) is not None:
+            self.superseded += 1
+        self._pending[key] = _PendingCommand(value, issued_at)
+        self.issued += 1
+
+    def cancel(self, room: str, attribute: str) -> None:
+        """命令没有发出去（发布失败），不再跟踪"""
+        if self._pending.pop((room, attribute), None) is not None:
+            self.issued -= 1
+
+    def pending_value(self, room: str, attribute: str, now: float) -> Optional[Any]:
+        """获取尚未收敛且未超时的命令值，没有时返回None"""
+        command = self._pending.get((room, attribute))
+        if command is None or now - command.issued_at > self.timeout:
+            return None
+        return command.value
+
+    def observe(self, room: str, attribute: str, value: Any, observed_at: float) -> Optional[float]:
+        """
+        处理一条状态消息
+
+        Returns:
+            float: 与等待中的命令匹配时返回往返耗时（毫秒），否则返回None
+        """
+        key = (room, attribute)
+        command = self._pending.get(key)
+        if command is None or observed_at < command.issued_at:
+            return None
+        if observed_at - command.issued_at > self.timeout:
+            self.expire(observed_at)
+            return None
+        if not values_match(attribute, command.value, value):
+            return None
+        del self._pending[key]
+        elapsed_ms = (observed_at - command.issued_at) * 1000
+        self.round_trip_ms[attribute].observe(elapsed_ms)
+        self.converged += 1
+        return elapsed_ms
+
+    def expire(self, now: float) -> int:
+        """把超时的命令计为未收敛，返回本次过期的数量"""
+        expired = 0
+        while self._pending:
+            key = next(iter(self._pending))
+            if now - self._pending[key].issued_at <= self.timeout:
+                break
+            del self._pending[key]
+            expired += 1
+        self.non_converged += expired
+        return expired
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        """获取往返耗时分位数和收敛计数"""
+        self.expire(now)
+        finished = self.converged + self.non_converged
+        return {
+            "timeout_seconds": self.timeout,
+            "issued": self.issued,
+            "converged": self.converged,
+            "non_converged": self.non_converged,
+            "superseded": self.superseded,
+            "pending": len(self._pending),
+            "convergence_ratio": round(self.converged / finished, 4) if finished else None,
+            "round_trip_ms": {attribute: histogram.snapshot()
+                              for attribute, histogram in self.round_trip_ms.items()}
+        }
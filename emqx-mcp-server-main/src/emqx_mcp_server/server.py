@@ -4,14 +4,33 @@ EMQX MCP Server
 This module provides the EMQX MCP Server for any MCP Clients to connect to and interact with
 EMQX MQTT broker through its HTTP API. It sets up a FastMCP server that registers EMQX-specific
 tools for clients to use.
+
+Tool modules are grouped (see TOOL_GROUPS) and imported only when their group is enabled,
+so a server that only needs the HTTP API tools never loads paho or the MQTT ingest path.
 """
 
+import functools
+import importlib
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from mcp.server.fastmcp import FastMCP
-from .tools.emqx_message_tools import EMQXMessageTools
-from .tools.emqx_client_tools import EMQXClientTools
-from .tools.emqx_subscription_tools import EMQXSubscriptionTools
-from .tools.temperature_control_tools import TemperatureControlTools
+from .log_pipeline import setup_logging
+from .metrics import get_registry, register_process_metrics, start_metrics_server
+from .config import (LOG_LEVEL, LOG_TOPIC_RATE, LOG_TOPIC_INTERVAL, LOG_QUEUE_SIZE,
+                     MQTT_EAGER_CONNECT, EMQX_BROKER_HOST, TOOL_GROUPS, METRICS_PORT, METRICS_HOST)
+
+if TYPE_CHECKING:
+    from .tools.temperature_control_tools import TemperatureControlTools
+
+# 工具组 -> (工具模块, 工具类, 使用的共享资源：http=EMQX HTTP API客户端，mqtt=共享MQTT连接)
+TOOL_GROUP_REGISTRY = {
+    "messages": (".tools.emqx_message_tools", "EMQXMessageTools", "http"),
+    "clients": (".tools.emqx_client_tools", "EMQXClientTools", "http"),
+    "subscriptions": (".tools.emqx_subscription_tools", "EMQXSubscriptionTools", "mqtt"),
+    "classroom": (".tools.temperature_control_tools", "TemperatureControlTools", "mqtt"),
+}
 
 class EMQXMCPServer:
     """
@@ -19,50 +38,182 @@ class EMQXMCPServer:
 
     This class initializes the EMQX MCP Server and registers the necessary tools.
     """
-    def __init__(self):
+    def __init__(self, tool_groups: Optional[List[str]] = None):
         """
         Initialize the EMQX MCP Server.
         
         Sets up the FastMCP server, configures logging, and registers the necessary tools.
+        
+        Args:
+            tool_groups: 要注册的工具组，为空时使用TOOL_GROUPS配置
+        
+        Raises:
+            ValueError: 包含未知的工具组
         """
         self.name = "emqx_mcp_server"
-        self.mcp = FastMCP("emqx_mcp_server")
+        self.tool_groups = list(TOOL_GROUPS if tool_groups is None else tool_groups)
+        unknown = [group for group in self.tool_groups if group not in TOOL_GROUP_REGISTRY]
+        if unknown:
+            raise ValueError(f"Unknown tool groups: {', '.join(unknown)} "
+                             f"(available: {', '.join(TOOL_GROUP_REGISTRY)})")
+        self.mcp = FastMCP("emqx_mcp_server", lifespan=self._lifespan)
         
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        # Configure logging: records are queued and written by a listener thread,
+        # per-topic message logs are rate limited
+        self.log_pipeline = setup_logging(
+            level=getattr(logging, LOG_LEVEL, logging.INFO),
+            rate=LOG_TOPIC_RATE,
+            interval=LOG_TOPIC_INTERVAL,
+            queue_size=LOG_QUEUE_SIZE
         )
         self.logger = logging.getLogger(self.name)
-
+        
+        # 进程内共享的指标注册表：MQTT接收路径、EMQX HTTP API客户端和每个工具调用都记录到这里
+        self.metrics = get_registry()
+        register_process_metrics(self.metrics)
+        self._instrument_tools()
+        self.metrics_server = None
+        if METRICS_PORT:
+            try:
+                self.metrics_server = start_metrics_server(self.metrics, METRICS_HOST, METRICS_PORT)
+                self.logger.info(f"Prometheus metrics endpoint at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+            except OSError as e:
+                self.logger.error(f"Failed to start metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {str(e)}")
+        
+        resources = {TOOL_GROUP_REGISTRY[group][2] for group in self.tool_groups}
+        
+        # 进程内唯一的MQTT连接，由订阅工具和温度控制工具共享（只在启用MQTT工具组时创建）
+        self.mqtt_connection = None
+        if "mqtt" in resources:
+            from .connection_manager import get_connection_manager
+            self.mqtt_connection = get_connection_manager(self.logger)
+        
+        # 所有HTTP API工具共享一个带连接池的EMQX客户端（只在启用HTTP API工具组时创建）
+        self.emqx_client = None
+        if "http" in resources:
+            from .emqx_client import EMQXClient
+            self.emqx_client = EMQXClient(self.logger)
+        
         # Register tools for client usage
+        self.temperature_control_tools: Optional["TemperatureControlTools"] = None
         self._register_tools()
+        self._register_server_tools()
+        
+        # 预先连接：工具注册时已登记全部设备主题，连接建立后一次性订阅，
+        # broker下发的保留消息在事件循环启动前暂存在接收队列中
+        self.eager_connect = (MQTT_EAGER_CONNECT and bool(EMQX_BROKER_HOST)
+                              and self.temperature_control_tools is not None)
+        if self.eager_connect and self.mqtt_connection is not None:
+            self.mqtt_connection.setup_client()
+            self.logger.info("Eager MQTT connect started")
 
     def _register_tools(self):
         """
-        注册所有可用的MCP工具
+        注册启用的MCP工具组
+        
+        按配置顺序导入各组的工具模块并注册工具，未启用的工具组不会被导入。
+        """
+        for group in self.tool_groups:
+            module_name, class_name, resource = TOOL_GROUP_REGISTRY[group]
+            tool_class = getattr(importlib.import_module(module_name, __package__), class_name)
+            shared = self.emqx_client if resource == "http" else self.mqtt_connection
+            tools = tool_class(self.logger, shared)
+            tools.register_tools(self.mcp)
+            if group == "classroom":
+                self.temperature_control_tools = tools
+            self.logger.info(f"Tool group '{group}' registered ({class_name})")
+
+    def _instrument_tools(self):
+        """
+        包装FastMCP的tool装饰器，为每个工具记录调用耗时和结果
+        
+        返回值包含error字段或抛出异常的调用计为失败。
+        """
+        calls = self.metrics.counter("mcp_tool_calls_total", "MCP tool calls by outcome", ("tool", "outcome"))
+        latency = self.metrics.histogram("mcp_tool_call_ms", "MCP tool call latency (ms)", ("tool",))
+        register = self.mcp.tool
+        
+        def tool(name: Optional[str] = None, **kwargs):
+            decorator = register(name=name, **kwargs)
+            
+            def wrap(fn):
+                tool_name = name or fn.__name__
+                histogram = latency.labels(tool_name)
+                succeeded, failed = calls.labels(tool_name, "ok"), calls.labels(tool_name, "error")
+                
+                @functools.wraps(fn)
+                async def timed(*args, **kw):
+                    started = time.perf_counter()
+                    error = True
+                    try:
+                        result = await fn(*args, **kw)
+                        error = isinstance(result, dict) and "error" in result
+                        return result
+                    finally:
+                        histogram.observe((time.perf_counter() - started) * 1000)
+                        (failed if error else succeeded).inc()
+                
+                return decorator(timed)
+            return wrap
+        
+        self.mcp.tool = tool
+
+    def _tool_summary(self) -> Dict[str, Dict[str, Any]]:
+        """按工具汇总调用次数、错误率和耗时分位数"""
+        summary: Dict[str, Dict[str, Any]] = {}
+        for (tool_name,), histogram in self.metrics.histogram("mcp_tool_call_ms", "").children():
+            snapshot = histogram.snapshot()
+            summary[tool_name] = {"calls": snapshot["count"], "errors": 0,
+                                  **{key: snapshot[key] for key in ("avg", "p50", "p95", "p99") if key in snapshot}}
+        for (tool_name, outcome), counter in self.metrics.counter("mcp_tool_calls_total", "").children():
+            if outcome == "error" and tool_name in summary:
+                summary[tool_name]["errors"] = counter.value
+        for entry in summary.values():
+            entry["error_rate"] = round(entry["errors"] / entry["calls"], 4) if entry["calls"] else 0.0
+        return dict(sorted(summary.items(), key=lambda item: item[1]["calls"], reverse=True))
+
+    def _register_server_tools(self):
+        """注册服务器自身的工具（不属于任何工具组）"""
+        
+        @self.mcp.tool(name="get_server_metrics", 
+                       description="获取服务器指标：按主题的消息速率和字节速率、接收回调耗时、历史大小、EMQX HTTP API各端点延迟、各工具调用耗时和错误率")
+        async def get_server_metrics(prefix: Optional[str] = None, limit: int = 20):
+            """获取服务器指标
+            
+            Args:
+                prefix: 只返回名称以该前缀开头的指标，如 mqtt_、emqx_api_、mcp_tool_ (可选)
+                limit: 每个指标最多返回的标签组合数量，按速率或数量从大到小 (默认20)
+            
+            Returns:
+                MCPResponse: 计数器（含相对上次查询的每秒速率）、仪表、直方图分位数和按工具的汇总
+            """
+            return {
+                "success": True,
+                "uptime_seconds": round(time.monotonic() - self.metrics.started_at, 3),
+                "tools": self._tool_summary(),
+                "metrics": self.metrics.snapshot(prefix, limit),
+                "prometheus_endpoint": f"http://{METRICS_HOST}:{METRICS_PORT}/metrics" if self.metrics_server else None
+            }
+
+    @asynccontextmanager
+    async def _lifespan(self, server: FastMCP):
+        """
+        服务器生命周期
         
-        注册消息工具、客户端工具、订阅工具和智能教室工具。
+        启动时把预先连接收到的消息交给事件循环；退出时关闭EMQX HTTP API连接池，
+        断开MQTT连接（同时关闭磁盘消息日志），并同步关闭离线命令发件箱文件。
         """
-        # Register message tools
-        emqx_message_tools = EMQXMessageTools(self.logger)
-        emqx_message_tools.register_tools(self.mcp)
-        self.logger.info("EMQX message tools registered")
-        
-        # Register client tools
-        emqx_client_tools = EMQXClientTools(self.logger)
-        emqx_client_tools.register_tools(self.mcp)
-        self.logger.info("EMQX client tools registered")
-        
-        # Register subscription tools
-        emqx_subscription_tools = EMQXSubscriptionTools(self.logger)
-        emqx_subscription_tools.register_tools(self.mcp)
-        self.logger.info("EMQX subscription tools registered")
-        
-        # Register smart classroom tools
-        temperature_control_tools = TemperatureControlTools(self.logger)
-        temperature_control_tools.register_tools(self.mcp)
-        self.logger.info("Smart classroom tools registered")
+        if self.eager_connect and self.temperature_control_tools is not None:
+            self.temperature_control_tools.start()
+        try:
+            yield {}
+        finally:
+            if self.emqx_client is not None:
+                await self.emqx_client.aclose()
+            if self.mqtt_connection is not None:
+                self.mqtt_connection.cleanup()
+            if self.temperature_control_tools is not None and self.temperature_control_tools.outbox is not None:
+                self.temperature_control_tools.outbox.close()
 
     def run(self):
         """
@@ -71,4 +222,7 @@ class EMQXMCPServer:
         启动FastMCP服务器实例并开始监听客户端连接。
         """
         self.logger.info("Starting EMQX MCP Server")
-        self.mcp.run()
\ No newline at end of file
+        try:
+            self.mcp.run()
+        finally:
+            self.log_pipeline.stop()
@@ -0,0 +1,112 @@
+"""
+启动耗时分析模块
+
+emqx-mcp-server --profile-startup 在子进程中以 python -X importtime 导入并创建服务器
+（不连接MQTT broker），解析导入耗时输出，按顶层包汇总并列出最慢的模块，
+用于确认未启用的工具组和重依赖没有在启动时被加载。
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+# 子进程：分别计时导入和创建服务器，结果以JSON写到stdout
+_CHILD_CODE = """
+import asyncio, json, time
+started = time.perf_counter()
+from emqx_mcp_server.server import EMQXMCPServer
+imported = time.perf_counter()
+server = EMQXMCPServer()
+created = time.perf_counter()
+tools = asyncio.run(server.mcp.list_tools())
+server.log_pipeline.stop()
+print(json.dumps({"import_ms": (imported - started) * 1000, "init_ms": (created - imported) * 1000,
+                  "tools": len(tools), "tool_groups": server.tool_groups}))
+"""
+
+
+class ImportRecord(NamedTuple):
+    """-X importtime 输出中的一个模块"""
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(text: str) -> List[ImportRecord]:
+    """解析 -X importtime 的stderr输出，忽略表头和其他行"""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # 表头 "self [us] | cumulative | imported package"
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        records.append(ImportRecord(name.strip(), self_us, cumulative_us, depth))
+    return records
+
+
+def summarize(records: List[ImportRecord], top: int = 20) -> Dict:
+    """
+    汇总导入耗时
+
+    Returns:
+        Dict: total_ms（顶层导入的累计耗时之和）、packages（按顶层包汇总的自身耗时）
+        和slowest（累计耗时最长的模块）
+    """
+    total_us = sum(record.cumulative_us for record in records if record.depth == 0)
+    packages: Dict[str, int] = defaultdict(int)
+    for record in records:
+        packages[record.name.split(".")[0]] += record.self_us
+    slowest = sorted(records, key=lambda record: record.cumulative_us, reverse=True)[:top]
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(records),
+        "packages": [(name, round(us / 1000, 1)) for name, us in
+                     sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+        "slowest": [(record.name, round(record.cumulative_us / 1000, 1),
+                     round(record.self_us / 1000, 1)) for record in slowest]
+    }
+
+
+def profile_startup(top: int = 20) -> int:
+    """
+    在子进程中测量服务器启动并打印耗时分解
+
+    Returns:
+        int: 进程退出码
+    """
+    env = dict(os.environ)
+    # 只测量导入和初始化，不连接broker
+    env["MQTT_EAGER_CONNECT"] = "false"
+    env.setdefault("LOG_LEVEL", "WARNING")
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD_CODE],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        print(result.stderr[-4000:], file=sys.stderr)
+        return result.returncode
+
+    timing = json.loads(result.stdout.strip().splitlines()[-1])
+    summary = summarize(parse_importtime(result.stderr), top)
+    total = summary["total_ms"] or 1
+    print(f"导入 {timing['import_ms']:.1f} ms，创建服务器 {timing['init_ms']:.1f} ms，"
+          f"注册 {timing['tools']} 个工具（工具组: {', '.join(timing['tool_groups']) or '无'}）")
+    print(f"\n按顶层包汇总（自身耗时，共 {summary['modules']} 个模块，{summary['total_ms']} ms）:")
+    for name, ms in summary["packages"]:
+        print(f"  {name:<32} {ms:>8.1f} ms  {ms / total:>6.1%}")
+    print("\n累计耗时最长的模块:")
+    for name, cumulative, own in summary["slowest"]:
+        print(f"  {name:<48} {cumulative:>8.1f} ms  (自身 {own:.1f} ms)")
+    return 0
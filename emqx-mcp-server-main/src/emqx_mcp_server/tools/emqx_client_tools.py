@@ -7,7 +7,9 @@ to use through the MCP protocol.
 """
 
 import logging
-from typing import Any
+import time
+from collections import Counter
+from typing import Any, List, Optional
 from ..emqx_client import EMQXClient
 
 class EMQXClientTools:
@@ -17,15 +19,16 @@ class EMQXClientTools:
     提供MQTT客户端的查询、获取详细信息和踢出等管理功能。
     """
     
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, emqx_client: Optional[EMQXClient] = None):
         """
         初始化EMQX客户端工具
         
         Args:
             logger: 日志记录器实例
+            emqx_client: 共享的EMQX HTTP API客户端（连接池），为空时单独创建
         """
         self.logger = logger
-        self.emqx_client = EMQXClient(logger)
+        self.emqx_client = emqx_client or EMQXClient(logger)
 
     def register_tools(self, mcp: Any):
         """Register EMQX Client management tools."""
@@ -128,4 +131,175 @@ class EMQXClientTools:
             result = await self.emqx_client.kick_client(clientid)
             
             self.logger.info(f"Client '{clientid}' disconnect request processed")
-            return result 
\ No newline at end of file
+            return result
+
+        @mcp.tool(name="get_mqtt_clients_summary", 
+                  description="Aggregate all MQTT clients in your EMQX Cluster by connection state, protocol version, node and username")
+        async def get_clients_summary(node: Optional[str] = None, username: Optional[str] = None,
+                                      conn_state: Optional[str] = None, proto_ver: Optional[str] = None,
+                                      like_clientid: Optional[str] = None, like_username: Optional[str] = None,
+                                      top: int = 20):
+            """Handle clients summary request
+            
+            Pages through every matching client on the server side and returns only
+            counts, so fleet-wide questions don't need thousands of raw records.
+            
+            Args:
+                node: Node name
+                username: Username
+                conn_state: Connection state
+                proto_ver: Protocol version
+                like_clientid: Fuzzy search by client ID pattern
+                like_username: Fuzzy search by username pattern
+                top: Number of usernames to include, by client count (default: 20)
+            
+            Returns:
+                MCPResponse: Response object with client counts per dimension
+            """
+            self.logger.info("Handling clients summary request")
+            
+            filters = {
+                "node": node, "username": username, "conn_state": conn_state,
+                "proto_ver": proto_ver, "like_clientid": like_clientid,
+                "like_username": like_username
+            }
+            params = {name: value for name, value in filters.items() if value is not None}
+            
+            total = 0
+            by_conn_state: Counter[str] = Counter()
+            by_proto_ver: Counter[str] = Counter()
+            by_node: Counter[str] = Counter()
+            by_username: Counter[str] = Counter()
+            start = time.perf_counter()
+            try:
+                async for client in self.emqx_client.iter_clients(params):
+                    total += 1
+                    by_conn_state[client.get("conn_state", "unknown")] += 1
+                    by_proto_ver[f"{client.get('proto_name', 'MQTT')} {client.get('proto_ver', '?')}"] += 1
+                    by_node[client.get("node", "unknown")] += 1
+                    by_username[client.get("username") or "<anonymous>"] += 1
+            except RuntimeError as e:
+                self.logger.error(str(e))
+                return {"error": str(e)}
+            
+            self.logger.info(f"Summarized {total} clients")
+            return {
+                "success": True,
+                "total": total,
+                "by_conn_state": dict(by_conn_state),
+                "by_proto_ver": dict(by_proto_ver),
+                "by_node": dict(by_node),
+                "top_usernames": dict(by_username.most_common(max(0, top))),
+                "distinct_usernames": len(by_username),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+
+        @mcp.tool(name="get_mqtt_clients", 
+                  description="Get detailed information about many MQTT clients at once by client ID")
+        async def get_clients_info(clientids: List[str]):
+            """Handle batch get client info request
+            
+            Args:
+                clientids: Client IDs (required) - The clients to look up
+
+            Returns:
+                MCPResponse: Response object with per-client information and total wall time
+            """
+            self.logger.info("Handling batch get client info request")
+            
+            if not clientids:
+                self.logger.error("Client IDs are required but were not provided")
+                return {"error": "Client IDs are required"}
+            
+            start = time.perf_counter()
+            results = await self.emqx_client.get_clients_info(clientids)
+            failed = sum(1 for result in results.values() if "error" in result)
+            
+            self.logger.info(f"Client info for {len(results)} clients retrieved ({failed} failed)")
+            return {
+                "success": failed == 0,
+                "total": len(results),
+                "failed": failed,
+                "clients": results,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+
+        @mcp.tool(name="kick_mqtt_clients", 
+                  description="Disconnect many MQTT clients at once, by client ID list or by client ID / username pattern")
+        async def kick_clients(clientids: Optional[List[str]] = None, like_clientid: Optional[str] = None,
+                               like_username: Optional[str] = None, dry_run: bool = False,
+                               max_clients: int = 1000):
+            """Handle batch kick clients request
+            
+            Exactly one way of selecting clients must be given: an explicit ID list,
+            or a fuzzy client ID / username pattern resolved through the client list.
+            
+            Args:
+                clientids: Client IDs to disconnect
+                like_clientid: Fuzzy match on client ID
+                like_username: Fuzzy match on username
+                dry_run: Only report which clients would be disconnected (default: false)
+                max_clients: Refuse to act when more clients than this match (default: 1000)
+
+            Returns:
+                MCPResponse: Response object with per-client results and total wall time
+            """
+            self.logger.info("Handling batch kick clients request")
+            
+            selectors = [value for value in (clientids, like_clientid, like_username) if value]
+            if len(selectors) != 1:
+                self.logger.error("Exactly one of clientids, like_clientid or like_username is required")
+                return {"error": "Exactly one of clientids, like_clientid or like_username is required"}
+            
+            start = time.perf_counter()
+            if clientids:
+                targets = list(dict.fromkeys(clientids))
+            else:
+                params = {"like_clientid": like_clientid} if like_clientid else {"like_username": like_username}
+                try:
+                    # 缓存中的客户端列表可能已过时，断开前直接查询broker
+                    targets = [client["clientid"]
+                               async for client in self.emqx_client.iter_clients(params, use_cache=False)]
+                except RuntimeError as e:
+                    self.logger.error(str(e))
+                    return {"error": str(e)}
+            
+            if len(targets) > max_clients:
+                return {"error": f"{len(targets)} clients matched, more than max_clients={max_clients}; "
+                                 f"narrow the selection or raise max_clients"}
+            
+            if dry_run:
+                return {
+                    "success": True,
+                    "dry_run": True,
+                    "total": len(targets),
+                    "clientids": targets,
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+                }
+            
+            results = await self.emqx_client.kick_clients(targets)
+            failed = sum(1 for result in results.values() if "error" in result)
+            
+            self.logger.info(f"Batch kick processed for {len(results)} clients ({failed} failed)")
+            return {
+                "success": failed == 0,
+                "dry_run": False,
+                "total": len(results),
+                "kicked": len(results) - failed,
+                "failed": failed,
+                "results": results,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+
+        @mcp.tool(name="get_emqx_api_cache_stats", 
+                  description="Show hit/miss statistics of the EMQX API response cache used by client lookups")
+        async def get_cache_stats():
+            """Handle cache statistics request
+            
+            Returns:
+                MCPResponse: Response object with cache size, TTL, hits, misses and coalesced requests
+            """
+            return {
+                "success": True,
+                **self.emqx_client.cache.stats()
+            }
@@ -7,7 +7,7 @@ to use through the MCP protocol.
 """
 
 import logging
-from typing import Any
+from typing import Any, Dict, List, Optional
 from ..emqx_client import EMQXClient
 
 class EMQXMessageTools:
@@ -17,15 +17,16 @@ class EMQXMessageTools:
     提供通过EMQX HTTP API发布MQTT消息的功能。
     """
     
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, emqx_client: Optional[EMQXClient] = None):
         """
         初始化EMQX消息工具
         
         Args:
             logger: 日志记录器实例
+            emqx_client: 共享的EMQX HTTP API客户端（连接池），为空时单独创建
         """
         self.logger = logger
-        self.emqx_client = EMQXClient(logger)
+        self.emqx_client = emqx_client or EMQXClient(logger)
 
     def register_tools(self, mcp: Any):
         """Register EMQX Publish tools."""
@@ -64,4 +65,35 @@ class EMQXMessageTools:
             )
             
             self.logger.info(f"Message published successfully to topic: {topic}")
-            return result
\ No newline at end of file
+            return result
+
+        @mcp.tool(name="publish_mqtt_messages", 
+                  description="Publish many MQTT messages in a few round trips through the EMQX bulk publish API")
+        async def publish_batch(messages: List[Dict[str, Any]], chunk_size: Optional[int] = None):
+            """Handle bulk publish request
+            
+            Args:
+                messages: List of {"topic", "payload", "qos" (optional), "retain" (optional)}
+                chunk_size: Messages per bulk HTTP request (optional)
+            
+            Returns:
+                MCPResponse: Summary counts and per-message results in input order
+            """
+            self.logger.info("Handling bulk publish request")
+            
+            if not messages:
+                return {"error": "Missing required parameter: messages"}
+            
+            # Validate every entry before sending anything
+            for index, message in enumerate(messages):
+                if not isinstance(message, dict) or not message.get("topic"):
+                    return {"error": f"Message {index}: missing required field: topic"}
+                if message.get("payload") is None:
+                    return {"error": f"Message {index}: missing required field: payload"}
+                if message.get("qos", 0) not in (0, 1, 2):
+                    return {"error": f"Message {index}: qos must be 0, 1 or 2"}
+            
+            result = await self.emqx_client.publish_batch(messages, chunk_size=chunk_size)
+            
+            self.logger.info(f"Bulk publish finished: {result['published']}/{result['total']} published")
+            return result
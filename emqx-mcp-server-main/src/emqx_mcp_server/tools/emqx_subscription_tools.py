@@ -5,13 +5,13 @@ EMQX Subscription Tools Module
 """
 
 import logging
-import asyncio
-import json
-from typing import Any, Dict, List
-from datetime import datetime, timedelta
+import time
+from typing import Any, Optional
+from datetime import datetime
 import paho.mqtt.client as mqtt
-import ssl
-from ..config import EMQX_BROKER_HOST, EMQX_BROKER_PORT, EMQX_USERNAME, EMQX_PASSWORD, EMQX_USE_SSL, MESSAGE_HISTORY_SIZE, SSL_VERIFY_CERTS
+from ..connection_manager import MQTTConnectionManager, get_connection_manager
+from ..log_pipeline import get_log_pipeline
+from ..topic_trie import validate_filter
 
 class EMQXSubscriptionTools:
     """
@@ -20,87 +20,27 @@ class EMQXSubscriptionTools:
     提供MQTT主题订阅、取消订阅和消息历史查询功能。
     """
     
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, connection: Optional[MQTTConnectionManager] = None):
         """
         初始化EMQX订阅工具
         
         Args:
             logger: 日志记录器实例
+            connection: 共享的MQTT连接管理器，为空时使用进程内默认实例
         """
         self.logger = logger
-        self.mqtt_client = None
+        self.connection = connection or get_connection_manager(logger)
         self.subscribed_topics = {}
-        self.message_history = {}
-        self.max_history_size = MESSAGE_HISTORY_SIZE
-        
-    def _on_connect(self, client, userdata, flags, rc):
-        """MQTT连接回调"""
-        if rc == 0:
-            self.logger.info("Successfully connected to MQTT broker")
-        else:
-            self.logger.error(f"Failed to connect to MQTT broker: {rc}")
+        # 与其他工具共享同一份消息历史
+        self.message_history = self.connection.message_history
     
-    def _on_message(self, client, userdata, msg):
-        """接收到消息的回调"""
-        topic = msg.topic
-        payload = msg.payload.decode('utf-8')
-        timestamp = datetime.now()
-        
-        # 保存消息到历史记录
-        if topic not in self.message_history:
-            self.message_history[topic] = []
-        
-        message_data = {
-            "timestamp": timestamp.isoformat(),
-            "topic": topic,
-            "payload": payload,
-            "qos": msg.qos,
-            "retain": msg.retain
-        }
-        
-        self.message_history[topic].append(message_data)
-        
-        # 限制历史记录大小
-        if len(self.message_history[topic]) > self.max_history_size:
-            self.message_history[topic] = self.message_history[topic][-self.max_history_size:]
-        
-        self.logger.info(f"Received message from {topic}: {payload}")
+    def _sync_ingest(self):
+        """处理共享连接中积压的消息"""
+        self.connection.sync_ingest()
     
     def _setup_mqtt_client(self):
-        """设置MQTT客户端"""
-        if self.mqtt_client is None:
-            try:
-                self.mqtt_client = mqtt.Client()
-                self.mqtt_client.username_pw_set(EMQX_USERNAME, EMQX_PASSWORD)
-                self.mqtt_client.on_connect = self._on_connect
-                self.mqtt_client.on_message = self._on_message
-                
-                # 如果启用SSL，配置SSL/TLS
-                if EMQX_USE_SSL:
-                    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-                    # 根据配置决定是否验证证书
-                    if not SSL_VERIFY_CERTS:
-                        # 开发环境：允许自签名证书
-                        context.check_hostname = False
-                        context.verify_mode = ssl.CERT_NONE
-                        self.logger.warning("SSL certificate verification disabled - only use in development!")
-                    else:
-                        # 生产环境：验证证书
-                        self.logger.info("SSL certificate verification enabled")
-                    
-                    self.mqtt_client.tls_set_context(context)
-                    self.logger.info("SSL/TLS enabled for MQTT connection")
-                
-                # 使用非阻塞连接
-                self.mqtt_client.connect_async(EMQX_BROKER_HOST, EMQX_BROKER_PORT, 60)
-                self.mqtt_client.loop_start()
-                self.logger.info(f"MQTT client setup initiated (async, SSL: {EMQX_USE_SSL})")
-                return True
-            except Exception as e:
-                self.logger.error(f"Failed to setup MQTT client: {str(e)}")
-                self.mqtt_client = None
-                return False
-        return True
+        """启动共享MQTT连接"""
+        return self.connection.setup_client()
 
     def register_tools(self, mcp: Any):
         """Register EMQX Subscription tools."""
@@ -125,10 +65,15 @@ class EMQXSubscriptionTools:
             # 设置MQTT客户端
             if not self._setup_mqtt_client():
                 return {"error": "Failed to setup MQTT client"}
+            self._sync_ingest()
             
             try:
-                result, mid = self.mqtt_client.subscribe(topic, qos)
+                previous = self.subscribed_topics.get(topic)
+                result, mid = self.connection.subscribe(topic, qos)
                 if result == mqtt.MQTT_ERR_SUCCESS:
+                    if previous is not None:
+                        # 重复订阅只更新QoS，不增加引用计数
+                        self.connection.unsubscribe(topic)
                     self.subscribed_topics[topic] = {
                         "qos": qos,
                         "subscribed_at": datetime.now().isoformat()
@@ -160,14 +105,16 @@ class EMQXSubscriptionTools:
             if not topic:
                 return {"error": "Missing required parameter: topic"}
             
-            if self.mqtt_client is None:
+            if self.connection.mqtt_client is None:
                 return {"error": "MQTT client not initialized"}
             
+            if topic not in self.subscribed_topics:
+                return {"error": f"Not subscribed to topic: {topic}"}
+            
             try:
-                result, mid = self.mqtt_client.unsubscribe(topic)
+                result, mid = self.connection.unsubscribe(topic)
                 if result == mqtt.MQTT_ERR_SUCCESS:
-                    if topic in self.subscribed_topics:
-                        del self.subscribed_topics[topic]
+                    del self.subscribed_topics[topic]
                     return {
                         "success": True,
                         "message": f"Successfully unsubscribed from topic: {topic}",
@@ -185,7 +132,7 @@ class EMQXSubscriptionTools:
             """获取MQTT消息历史
             
             Args:
-                topic: 主题过滤器 (可选)
+                topic: 主题过滤器 (可选，MQTT过滤器语义，如 classroom/+/temperature 或 classroom/#)
                 limit: 返回消息数量限制 (默认10)
                 since_minutes: 获取多少分钟内的消息 (可选)
             
@@ -193,34 +140,26 @@ class EMQXSubscriptionTools:
                 MCPResponse: 消息历史数据
             """
             topic_filter = topic
+            self._sync_ingest()
+            
+            # 主题过滤（MQTT过滤器语义，支持+和#），包括只存在于磁盘日志中的主题
+            topics = None
+            if topic_filter:
+                try:
+                    topics = self.connection.match_history_topics(topic_filter)
+                except ValueError as e:
+                    return {"error": str(e)}
             
-            # 过滤消息
-            filtered_messages = []
-            
-            for topic, messages in self.message_history.items():
-                # 主题过滤
-                if topic_filter and topic_filter not in topic:
-                    continue
-                
-                for msg in messages:
-                    # 时间过滤
-                    if since_minutes:
-                        msg_time = datetime.fromisoformat(msg["timestamp"])
-                        if datetime.now() - msg_time > timedelta(minutes=since_minutes):
-                            continue
-                    
-                    filtered_messages.append(msg)
-            
-            # 按时间排序并限制数量
-            filtered_messages.sort(key=lambda x: x["timestamp"], reverse=True)
-            if limit:
-                filtered_messages = filtered_messages[:limit]
+            # 时间过滤（二分查找）并跨主题、跨内存和磁盘日志按时间归并，取满limit条即停止
+            since = time.time() - since_minutes * 60 if since_minutes else None
+            filtered_messages = self.connection.query_history(topics, since=since, limit=limit)
             
             return {
                 "success": True,
                 "messages": filtered_messages,
                 "count": len(filtered_messages),
-                "total_topics": len(self.message_history)
+                "total_topics": len(self.message_history),
+                "ingest": self.connection.ingest_queue.stats()
             }
         
         @mcp.tool(name="get_subscribed_topics", 
@@ -236,3 +175,43 @@ class EMQXSubscriptionTools:
                 "subscribed_topics": self.subscribed_topics,
                 "count": len(self.subscribed_topics)
             }
+        
+        @mcp.tool(name="get_mqtt_connection_status", 
+                  description="获取共享MQTT连接的状态、订阅、接收队列、各消费者的分发开销和日志抑制数量")
+        async def get_connection_status():
+            """获取共享MQTT连接状态
+            
+            Returns:
+                MCPResponse: 连接状态、订阅引用计数、接收队列统计、消费者分发开销和日志限流统计
+            """
+            self._sync_ingest()
+            status = {
+                "success": True,
+                **self.connection.status()
+            }
+            pipeline = get_log_pipeline()
+            if pipeline is not None:
+                status["logging"] = pipeline.stats()
+            return status
+
+        @mcp.tool(name="get_mqtt_publish_latency", 
+                  description="获取通过共享连接发布的QoS 1消息从发布到broker确认(PUBACK)的延迟分布，按主题统计")
+        async def get_publish_latency(topic: Optional[str] = None, limit: int = 20):
+            """获取发布确认延迟
+            
+            Args:
+                topic: 主题过滤器，支持+和# (可选)
+                limit: 最多返回的主题数量，按p95从高到低 (默认20)
+            
+            Returns:
+                MCPResponse: 每个主题最近5分钟的p50/p95/p99延迟（毫秒）和未确认次数
+            """
+            if topic:
+                try:
+                    validate_filter(topic)
+                except ValueError as e:
+                    return {"error": str(e)}
+            return {
+                "success": True,
+                **self.connection.publish_latency_stats(topic, limit)
+            }
@@ -7,18 +7,50 @@
 - 控制空调开关
 - 设置空调目标温度
 - 检查空调状态
+- 多教室模式下按教室查询和控制，批量控制多个教室的空调
+- MQTT断开期间空调命令进入离线队列，连接恢复后按顺序发送
+- 启动后尚无设备数据时，查询可以等待第一条数据（保留消息或设备上报）到达
 """
 
+import asyncio
 import logging
 import json
-import ssl
-from typing import Any, Dict, Optional
+import time
+from fnmatch import fnmatchcase
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
-import paho.mqtt.client as mqtt
-from ..emqx_client import EMQXClient
-from ..config import (EMQX_BROKER_HOST, EMQX_BROKER_PORT, EMQX_USERNAME, EMQX_PASSWORD, 
-                     EMQX_USE_SSL, MESSAGE_HISTORY_SIZE, AC_TEMP_MIN, AC_TEMP_MAX, 
-                     MQTT_KEEPALIVE, CLASSROOM_TOPIC_PREFIX)
+from ..connection_manager import MQTTConnectionManager, get_connection_manager
+from ..latest_values import (RoomStateIndex, RoomTopicLayout, FieldExtractor, ERROR_JSON,
+                             ERROR_DEVICE)
+from ..rollups import RollupEngine, parse_duration, parse_tiers
+from ..columnar_store import ColumnarStore, NUMPY_AVAILABLE
+from ..roundtrip import RoundTripTracker, ATTRIBUTE_POWER, ATTRIBUTE_TEMPERATURE, values_match
+from ..command_scheduler import CommandScheduler
+from ..command_outbox import CommandOutbox
+from ..metrics import Histogram
+from ..log_pipeline import TOPIC_ATTR
+from ..config import (AC_TEMP_MIN, AC_TEMP_MAX, AC_ROUNDTRIP_TIMEOUT, AC_COMMAND_COALESCE_SECONDS,
+                      AC_SUPPRESS_NOOP, AC_OUTBOX_SIZE, AC_OUTBOX_TTL, AC_OUTBOX_FILE, CLASSROOM_ID,
+                      CLASSROOM_TOPIC_PREFIX, CLASSROOM_MULTI_ROOM, COLUMNAR_STORE,
+                      COLUMNAR_MAX_POINTS, COLUMNAR_TOTAL_POINTS, SENSOR_FIRST_VALUE_WAIT,
+                      ROLLUP_TIERS, ROLLUP_MAX_TOPICS)
+
+if TYPE_CHECKING:
+    from ..emqx_client import EMQXClient
+
+# 数据类型 -> 主题后缀（单教室模式下拼在前缀后，多教室模式下拼在教室ID后）
+ROOM_TOPIC_SUFFIXES = {
+    "temperature": "temperature",
+    "humidity": "humidity",
+    "ac_control": "control/ac",
+    "ac_power_status": "ac/power/status",
+    "ac_temperature_status": "ac/temperature/status"
+}
+SENSOR_KINDS = ("temperature", "humidity")
+# 空调命令 -> 往返跟踪的属性，空调状态数据类型 -> 属性
+COMMAND_ATTRIBUTES = {"set_power": ATTRIBUTE_POWER, "set_temperature": ATTRIBUTE_TEMPERATURE}
+STATUS_ATTRIBUTES = {"ac_power_status": ATTRIBUTE_POWER, "ac_temperature_status": ATTRIBUTE_TEMPERATURE}
+ATTRIBUTE_STATUS = {attribute: kind for kind, attribute in STATUS_ATTRIBUTES.items()}
 
 class TemperatureControlTools:
     """
@@ -27,269 +59,616 @@ class TemperatureControlTools:
     提供环境温湿度数据获取和空调控制功能。
     """
     
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, connection: Optional[MQTTConnectionManager] = None,
+                 emqx_client: Optional["EMQXClient"] = None, multi_room: Optional[bool] = None):
         """
         初始化温度控制工具
         
         Args:
             logger: 日志记录器实例
+            connection: 共享的MQTT连接管理器，为空时使用进程内默认实例
+            emqx_client: 共享的EMQX HTTP API客户端（连接池），为空时在首次使用时创建
+            multi_room: 是否启用多教室模式，为空时使用CLASSROOM_MULTI_ROOM配置
         """
         self.logger = logger
-        self.emqx_client = EMQXClient(logger)
-        self.mqtt_client = None
-        self.message_history = {}
-        self.max_history_size = MESSAGE_HISTORY_SIZE
-        self.mqtt_connected = False
+        self._emqx_client = emqx_client
+        self.connection = connection or get_connection_manager(logger)
+        self.message_history = self.connection.message_history
         
-        # 核心设备主题 - 使用配置的前缀
-        self.topics = {
-            "temperature": f"{CLASSROOM_TOPIC_PREFIX}/temperature",
-            "humidity": f"{CLASSROOM_TOPIC_PREFIX}/humidity",
-            "ac_control": f"{CLASSROOM_TOPIC_PREFIX}/control/ac",
-            "ac_power_status": f"{CLASSROOM_TOPIC_PREFIX}/ac/power/status",
-            "ac_temperature_status": f"{CLASSROOM_TOPIC_PREFIX}/ac/temperature/status"
-        }
-
-    def _on_connect(self, client, userdata, flags, rc):
-        """MQTT连接回调"""
-        if rc == 0:
-            self.mqtt_connected = True
-            self.logger.info("Temperature Control MQTT client connected")
-            # 自动订阅传感器数据主题
-            client.subscribe(self.topics["temperature"])
-            client.subscribe(self.topics["humidity"])
-            # 订阅空调状态主题
-            client.subscribe(self.topics["ac_power_status"])
-            client.subscribe(self.topics["ac_temperature_status"])
-            self.logger.info("Subscribed to all temperature control sensor and AC status topics")
-        else:
-            self.mqtt_connected = False
-            self.logger.error(f"Temperature Control MQTT connection failed: {rc}")
+        # 主题布局 - 单教室模式使用 {前缀}/{后缀}，多教室模式使用 {前缀}/{教室}/{后缀}
+        self.layout = RoomTopicLayout(
+            CLASSROOM_TOPIC_PREFIX, ROOM_TOPIC_SUFFIXES, CLASSROOM_ID,
+            multi_room=CLASSROOM_MULTI_ROOM if multi_room is None else multi_room)
+        # 默认教室的设备主题
+        self.topics = {kind: self.layout.topic(kind) for kind in ROOM_TOPIC_SUFFIXES}
+        
+        # 按教室索引的最新值表 - 每种数据类型预先编译提取器，消息到达时只解析一次
+        self.room_state = RoomStateIndex(self.layout)
+        self.room_state.register("temperature", FieldExtractor(
+            ("temperature",), default_unit="°C",
+            device_field="sensor_id", default_device="classroom-temp-sensor"))
+        self.room_state.register("humidity", FieldExtractor(
+            ("humidity",), default_unit="%",
+            device_field="sensor_id", default_device="classroom-humidity-sensor",
+            report_device_error=True))
+        self.room_state.register("ac_power_status", FieldExtractor(
+            ("power", "status", "ac_status"), default_device="classroom-ac"))
+        self.room_state.register("ac_temperature_status", FieldExtractor(
+            ("target_temperature", "temperature"), default_unit="°C",
+            default_device="classroom-ac", report_device_error=True))
+        
+        # 温湿度读数的多粒度时间桶聚合，在接收路径上增量更新（按具体主题，即每个教室各一份）
+        self.rollups = RollupEngine(parse_tiers(ROLLUP_TIERS), ROLLUP_MAX_TOPICS)
+        
+        # 可选的NumPy列式存储，保存完整的数值序列用于区间和趋势分析
+        self.series_store: Optional[ColumnarStore] = None
+        if COLUMNAR_STORE != "off" and NUMPY_AVAILABLE:
+            self.series_store = ColumnarStore(COLUMNAR_MAX_POINTS, total_points=COLUMNAR_TOTAL_POINTS)
+        
+        # 空调命令到状态收敛的往返跟踪（命令经eKuiper/EdgeX下发，状态再经同一链路返回）
+        self.roundtrip = RoundTripTracker(AC_ROUNDTRIP_TIMEOUT)
+        
+        # 按设备合并短时间内的连续命令（最后一次写入生效），并跳过与当前状态相同的命令
+        self.scheduler = CommandScheduler(self._send_ac_command, AC_COMMAND_COALESCE_SECONDS,
+                                          is_noop=self._is_noop_command if AC_SUPPRESS_NOOP else None)
+        
+        # MQTT断开期间的离线命令队列：同一设备同一属性只保留最新命令，连接恢复后按顺序发送
+        self.outbox: Optional[CommandOutbox] = None
+        if AC_OUTBOX_SIZE > 0:
+            self.outbox = CommandOutbox(logger, AC_OUTBOX_FILE or None, AC_OUTBOX_SIZE, AC_OUTBOX_TTL)
+        # 命令从入队到被broker确认的耗时（毫秒）
+        self.outbox_flush_ms = Histogram(window_seconds=3600)
+        self.last_drain: Optional[Dict[str, Any]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self.connection.add_connect_listener(self._on_connection_change)
+        
+        # 等待某个教室第一条数据的查询：(教室, 数据类型) -> Future列表
+        self._value_waiters: Dict[Tuple[str, str], List[asyncio.Future]] = {}
+        
+        # 向共享连接注册传感器和空调状态主题的消费者（多教室模式下每种数据只有一个通配符订阅）：
+        # 网络线程中解析一次，事件循环中写入教室索引；空调状态走优先通道，不会被传感器洪峰挤掉
+        for name in ("temperature", "humidity", "ac_power_status", "ac_temperature_status"):
+            self.connection.register_consumer(
+                f"temperature_control.{name}", self.layout.filter(name),
+                handler=self._apply_latest_value, parser=self._parse_latest_value,
+                priority=name.startswith("ac_"))
+    
+    @property
+    def emqx_client(self) -> "EMQXClient":
+        """EMQX HTTP API客户端（只有设备数据走HTTP API时才需要，首次使用时创建）"""
+        if self._emqx_client is None:
+            from ..emqx_client import EMQXClient
+            self._emqx_client = EMQXClient(self.logger)
+        return self._emqx_client
     
-    def _on_message(self, client, userdata, msg):
-        """接收消息回调"""
-        topic = msg.topic
-        payload = msg.payload.decode('utf-8')
-        timestamp = datetime.now()
+    @property
+    def mqtt_connected(self) -> bool:
+        """共享MQTT连接是否已建立"""
+        return self.connection.connected
+    
+    def _parse_latest_value(self, message_data, received_at):
+        """网络线程：解析一次消息内容"""
+        parsed = self.room_state.parse(message_data["topic"], message_data["payload"],
+                                       received_at, message_data["timestamp"])
+        if parsed is not None and not parsed[2].ok:
+            record = parsed[2]
+            # 按主题限流的日志管道识别TOPIC_ATTR；原始内容最多记录200个字符
+            self.logger.warning("Unparseable data on %s (%s): %.200s", record.topic, record.error, record.raw,
+                                extra={TOPIC_ATTR: record.topic})
+        return parsed
+    
+    def _apply_latest_value(self, message_data, parsed):
+        """事件循环：更新教室索引和温湿度聚合"""
+        if parsed is not None:
+            room, kind, record = parsed
+            self.room_state.update(room, kind, record)
+            waiters = self._value_waiters.pop((room, kind), None)
+            if waiters:
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(None)
+            if record.ok and kind in STATUS_ATTRIBUTES:
+                self.roundtrip.observe(room, STATUS_ATTRIBUTES[kind], record.value, record.received_at)
+            if record.ok and kind in SENSOR_KINDS:
+                try:
+                    value = float(record.value)
+                except (TypeError, ValueError):
+                    return
+                self.rollups.add(record.topic, value, record.received_at)
+                if self.series_store is not None:
+                    self.series_store.add(record.topic, value, record.received_at)
+    
+    async def _await_first_value(self, room: str, kinds: Sequence[str],
+                                 wait_seconds: Optional[float]) -> Optional[float]:
+        """
+        教室还没有任何一种数据时，等待第一条数据到达或超时
         
-        # 保存消息到历史记录
-        if topic not in self.message_history:
-            self.message_history[topic] = []
+        Returns:
+            float: 实际等待的毫秒数；已有数据或不等待时返回None
+        """
+        wait_seconds = SENSOR_FIRST_VALUE_WAIT if wait_seconds is None else wait_seconds
+        if wait_seconds <= 0 or any(self.room_state.get(room, kind) is not None for kind in kinds):
+            return None
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        for kind in kinds:
+            self._value_waiters.setdefault((room, kind), []).append(future)
+        try:
+            await asyncio.wait_for(future, wait_seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for kind in kinds:
+                waiters = self._value_waiters.get((room, kind))
+                if waiters and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self._value_waiters[(room, kind)]
+        return round((time.perf_counter() - started) * 1000, 3)
+    
+    def _resolve_sensor_window(self, topic: str, window: str, room: Optional[str] = None):
+        """把传感器名称、教室和时间窗口解析为(主题, 窗口秒数)，不合法时抛出ValueError"""
+        if topic in SENSOR_KINDS:
+            sensor_topic = self.layout.topic(topic, self.layout.validate_room(room))
+        else:
+            parsed = self.layout.parse(topic)
+            if parsed is None or parsed[1] not in SENSOR_KINDS:
+                raise ValueError(f"Unsupported sensor topic: {topic} (use temperature or humidity)")
+            sensor_topic = topic
+        return sensor_topic, parse_duration(window)
+    
+    def _select_rooms(self, rooms: Optional[List[str]], selector: Optional[str]) -> List[str]:
+        """
+        解析批量操作的目标教室：显式列表和/或按通配符匹配已知教室，保持顺序并去重
         
-        message_data = {
-            "timestamp": timestamp.isoformat(),
-            "payload": payload
+        Raises:
+            ValueError: 两者都为空或教室ID不合法
+        """
+        if not rooms and not selector:
+            raise ValueError("Specify rooms or a room selector (e.g. 'b1-*')")
+        selected = [self.layout.validate_room(room) for room in rooms or []]
+        if selector:
+            selected.extend(room for room in self.room_state.rooms() if fnmatchcase(room, selector))
+        return list(dict.fromkeys(selected))
+    
+    def _ac_command(self, command: str, value: Any, room: str, unit: Optional[str] = None) -> Dict[str, Any]:
+        """构造空调控制命令"""
+        payload = {
+            "command": command,
+            "value": value,
+            "timestamp": datetime.now().isoformat(),
+            "device": "classroom-ac-controller",
+            "room": room
         }
+        if unit is not None:
+            payload["unit"] = unit
+        return payload
+    
+    def _is_noop_command(self, room: str, attribute: str, value: Any) -> bool:
+        """缓存的空调状态已经等于目标值，且没有尚未生效的其他命令时，命令是空操作"""
+        status = self.room_state.get(room, ATTRIBUTE_STATUS[attribute])
+        if status is None or not status.ok:
+            return False
+        in_flight = self.roundtrip.pending_value(room, attribute, time.time())
+        if in_flight is not None and not values_match(attribute, value, in_flight):
+            return False
+        return values_match(attribute, value, status.value)
+    
+    async def _send_ac_command(self, room: str, command: Dict[str, Any],
+                               queue_ttl: Optional[float] = None) -> Dict[str, Any]:
+        """发送一条空调命令并等待broker确认，同时登记到往返跟踪器（未确认的命令不跟踪）"""
+        attribute = COMMAND_ATTRIBUTES[command["command"]]
+        if not self.mqtt_connected and self.outbox is not None:
+            # 合并窗口结束前连接已断开：转入离线队列，而不是等待发布超时
+            return self._queue_response(room, command, queue_ttl)
+        if self.outbox is not None:
+            # 离线期间排队的旧命令已经过时
+            self.outbox.discard(room, attribute)
+        self.roundtrip.issue(room, attribute, command["value"], time.time())
+        outcome = await self.connection.publish_and_wait(
+            self.layout.topic("ac_control", room), json.dumps(command), qos=1)
+        if not outcome["success"]:
+            self.roundtrip.cancel(room, attribute)
+        return outcome
+    
+    async def _publish_ac_bulk(self, command: str, value: Any, rooms: Optional[List[str]],
+                               selector: Optional[str], window: Optional[int],
+                               dry_run: bool, unit: Optional[str] = None) -> Dict[str, Any]:
+        """向多个教室流水线发布同一条空调命令（QoS 1），汇总每个教室的broker确认结果"""
+        try:
+            targets = self._select_rooms(rooms, selector)
+        except ValueError as e:
+            return {"error": str(e)}
+        if not targets:
+            return {"success": False, "total": 0, "message": f"没有匹配 {selector} 的教室"}
+        if dry_run:
+            return {"success": True, "dry_run": True, "total": len(targets), "rooms": targets,
+                    "message": f"将向{len(targets)}个教室发送 {command} 命令"}
         
-        self.message_history[topic].append(message_data)
+        self._setup_mqtt_client()
+        self._sync_ingest()
+        attribute = COMMAND_ATTRIBUTES[command]
+        if not self.mqtt_connected:
+            if self.outbox is None:
+                return {
+                    "success": False,
+                    "mqtt_status": "连接中",
+                    "message": "MQTT连接中，请稍后重试空调控制"
+                }
+            queued = set()
+            for room in targets:
+                self.scheduler.supersede(room, attribute, value)
+                if self._enqueue_ac_command(room, self._ac_command(command, value, room, unit)) is not None:
+                    queued.add(room)
+            return {
+                "success": len(queued) == len(targets),
+                "command": command,
+                "value": value,
+                "total": len(targets),
+                "acknowledged": 0,
+                "queued": len(queued),
+                "rejected": [room for room in targets if room not in queued],
+                "queue_depth": len(self.outbox),
+                "mqtt_status": "连接中",
+                "message": f"MQTT未连接，{len(queued)}/{len(targets)}个教室的 {command} 命令已加入离线队列，连接恢复后自动发送"
+            }
         
-        # 限制历史记录大小
-        if len(self.message_history[topic]) > self.max_history_size:
-            self.message_history[topic] = self.message_history[topic][-self.max_history_size:]
+        started = time.perf_counter()
+        issued_at = time.time()
+        messages = []
+        for room in targets:
+            # 批量命令是更晚的写入，等待合并窗口的单条命令和离线队列中的命令不再发送
+            self.scheduler.supersede(room, attribute, value)
+            if self.outbox is not None:
+                self.outbox.discard(room, attribute)
+            self.roundtrip.issue(room, attribute, value, issued_at)
+            messages.append((self.layout.topic("ac_control", room),
+                             json.dumps(self._ac_command(command, value, room, unit))))
+        outcomes = await self.connection.publish_many(messages, qos=1, window=window)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
         
-        self.logger.info(f"Received data from {topic}: {payload}")
+        results = {}
+        for room, outcome in zip(targets, outcomes):
+            if outcome["success"]:
+                results[room] = {"acked": True, "latency_ms": outcome["latency_ms"]}
+            else:
+                results[room] = {"acked": False, "error": outcome["error"]}
+                self.roundtrip.cancel(room, attribute)
+        acked = sum(1 for result in results.values() if result["acked"])
+        return {
+            "success": acked == len(targets),
+            "command": command,
+            "value": value,
+            "total": len(targets),
+            "acknowledged": acked,
+            "failed": len(targets) - acked,
+            "elapsed_ms": elapsed_ms,
+            "results": results,
+            "message": f"{acked}/{len(targets)}个教室的 {command} 命令已被broker确认，耗时{elapsed_ms}ms"
+        }
+    
+    def _enqueue_ac_command(self, room: str, command: Dict[str, Any],
+                            ttl: Optional[float] = None):
+        """把命令加入离线队列，未启用离线队列或队列已满时返回None"""
+        if self.outbox is None:
+            return None
+        attribute = COMMAND_ATTRIBUTES[command["command"]]
+        entry = self.outbox.put(room, attribute, self.layout.topic("ac_control", room),
+                                json.dumps(command), ttl)
+        if entry is None:
+            self.logger.warning(f"AC command outbox full ({self.outbox.max_size}), dropping {command['command']} for {room}")
+        return entry
+    
+    def _queue_response(self, room: str, command: Dict[str, Any], ttl: Optional[float]) -> Dict[str, Any]:
+        """MQTT未连接时把单条命令加入离线队列，并转换为工具返回值"""
+        if self.outbox is None:
+            return {
+                "success": False,
+                "mqtt_status": "连接中",
+                "message": "MQTT连接中，请稍后重试空调控制"
+            }
+        if ttl is not None and ttl <= 0:
+            return {"error": "queue_ttl必须大于0"}
+        # 离线命令按设备覆盖，合并窗口中等待的旧命令不再发送
+        self.scheduler.supersede(room, COMMAND_ATTRIBUTES[command["command"]], command["value"])
+        entry = self._enqueue_ac_command(room, command, ttl)
+        if entry is None:
+            return {
+                "success": False,
+                "acknowledged": False,
+                "mqtt_status": "连接中",
+                "error": f"MQTT未连接且离线命令队列已满({self.outbox.max_size})，请稍后重试",
+                "command": command
+            }
+        valid_for = entry.expires_at - entry.queued_at
+        return {
+            "success": True,
+            "acknowledged": False,
+            "queued": True,
+            "queue_depth": len(self.outbox),
+            "expires_in_seconds": round(valid_for, 3),
+            "mqtt_status": "连接中",
+            "message": f"MQTT未连接，{self._place(room)}空调命令已加入离线队列，连接恢复后自动发送（{valid_for:g}秒内有效）",
+            "command": command
+        }
+    
+    def _on_connection_change(self, connected: bool) -> None:
+        """网络线程：连接建立后把离线队列的发送交给事件循环"""
+        loop = self._loop
+        if not connected or loop is None or not self.outbox:
+            return
+        try:
+            loop.call_soon_threadsafe(self._schedule_drain)
+        except RuntimeError:
+            # 事件循环已经关闭
+            pass
+    
+    def _schedule_drain(self) -> None:
+        """事件循环：启动离线队列发送任务（同一时间只有一个）"""
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.get_running_loop().create_task(self._drain_outbox())
+    
+    async def _drain_outbox(self) -> Optional[Dict[str, Any]]:
+        """按入队顺序流水线发布离线队列中的命令（QoS 1），broker确认后才从队列移除"""
+        if not self.mqtt_connected or self.outbox is None:
+            return None
+        entries = self.outbox.take()
+        if not entries:
+            return None
+        started = time.perf_counter()
+        issued_at = time.time()
+        for entry in entries:
+            self.roundtrip.issue(entry.room, entry.attribute, json.loads(entry.payload)["value"], issued_at)
+        outcomes = await self.connection.publish_many([(entry.topic, entry.payload) for entry in entries], qos=1)
+        flushed_at = time.time()
+        flushed = 0
+        for entry, outcome in zip(entries, outcomes):
+            if outcome["success"]:
+                flushed += 1
+                # 发送期间被新命令覆盖的，新命令仍留在队列中
+                if self.outbox.complete(entry):
+                    self.outbox_flush_ms.observe((flushed_at - entry.queued_at) * 1000)
+            else:
+                # 留在队列中，下次连接建立时重试
+                self.roundtrip.cancel(entry.room, entry.attribute)
+        self.last_drain = {
+            "at": datetime.now().isoformat(),
+            "commands": len(entries),
+            "flushed": flushed,
+            "failed": len(entries) - flushed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+        self.logger.info(f"Flushed {flushed}/{len(entries)} queued AC commands after reconnect")
+        return self.last_drain
+    
+    def _command_response(self, outcome: Dict[str, Any], command: Dict[str, Any],
+                          message: str) -> Dict[str, Any]:
+        """把调度结果转换为工具返回值"""
+        if "mqtt_status" in outcome or "success" not in outcome:
+            # 发送时MQTT已断开，_queue_response已经生成了工具返回值
+            return outcome
+        if outcome.get("coalesced"):
+            return {
+                "success": True,
+                "acknowledged": False,
+                "coalesced": True,
+                "superseded_by": outcome["superseded_by"],
+                "message": f"命令已被随后的设置({outcome['superseded_by']})合并，未单独发送",
+                "command": command
+            }
+        if outcome.get("no_op"):
+            return {
+                "success": True,
+                "acknowledged": False,
+                "no_op": True,
+                "message": f"{message}（当前状态已是目标值，未发送命令）",
+                "command": command
+            }
+        if outcome["success"]:
+            return {
+                "success": True,
+                "acknowledged": True,
+                "latency_ms": outcome["latency_ms"],
+                "message": message,
+                "command": command
+            }
+        self.logger.warning(f"AC command not acknowledged: {outcome['error']}")
+        return {
+            "success": False,
+            "acknowledged": False,
+            "error": f"发送命令失败: {outcome['error']}",
+            "command": command
+        }
+    
+    def _place(self, room: str) -> str:
+        """消息中使用的教室称呼"""
+        return f"教室{room}" if self.layout.multi_room else "教室"
+    
+    def _room_summary(self, room: str) -> Dict[str, Any]:
+        """教室最新状态的简要汇总（只包含解析成功的值）"""
+        state = self.room_state.room(room)
+        summary: Dict[str, Any] = {"room": room}
+        for kind, field in (("temperature", "temperature"), ("humidity", "humidity"),
+                            ("ac_power_status", "ac_power"),
+                            ("ac_temperature_status", "ac_target_temperature")):
+            record = state.get(kind)
+            if record is not None and record.ok:
+                summary[field] = record.value
+        if state:
+            summary["last_update"] = max(state.values(), key=lambda r: r.received_at).timestamp
+        return summary
+    
+    def _sync_ingest(self):
+        """处理共享连接中积压的消息"""
+        self.connection.sync_ingest()
 
     def _setup_mqtt_client(self):
-        """设置MQTT客户端（完全非阻塞）"""
-        if self.mqtt_client is None:
+        """启动共享MQTT连接（完全非阻塞），并记录发送离线队列所用的事件循环"""
+        if self._loop is None:
             try:
-                # 创建客户端时加上时间戳避免冲突
-                client_id = f"temperature_control_{datetime.now().strftime('%H%M%S')}"
-                self.mqtt_client = mqtt.Client(client_id=client_id)
-                
-                # 设置认证
-                if EMQX_USERNAME and EMQX_PASSWORD:
-                    self.mqtt_client.username_pw_set(EMQX_USERNAME, EMQX_PASSWORD)
-                
-                # 设置回调
-                self.mqtt_client.on_connect = self._on_connect
-                self.mqtt_client.on_message = self._on_message
-                
-                # SSL配置（如果需要）
-                if EMQX_USE_SSL:
-                    import ssl
-                    context = ssl.create_default_context()
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                    self.mqtt_client.tls_set_context(context)
-                
-                # 使用完全异步连接，不等待连接结果
-                self.mqtt_client.connect_async(EMQX_BROKER_HOST, EMQX_BROKER_PORT, MQTT_KEEPALIVE)
-                self.mqtt_client.loop_start()
-                self.logger.info("Temperature Control MQTT client setup initiated (fully async)")
-                return True
-            except Exception as e:
-                self.logger.error(f"Failed to setup MQTT client: {str(e)}")
-                self.mqtt_client = None
-                return False
-        return True
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        result = self.connection.setup_client()
+        # 启动时从文件恢复的命令：连接可能在记录事件循环之前就已建立
+        if self.outbox and self._loop is not None and self.mqtt_connected:
+            self._schedule_drain()
+        return result
+
+    def start(self):
+        """
+        事件循环启动后调用（预先连接模式）：记录事件循环，处理连接建立后积压的保留消息，
+        并发送从文件恢复的离线命令
+        """
+        self._setup_mqtt_client()
+        self._sync_ingest()
 
     def register_tools(self, mcp: Any):
         """注册简化的温度控制工具"""
         
         @mcp.tool(name="get_temperature", 
-                  description="获取教室当前温度")
-        async def get_temperature():
-            """获取最新温度数据"""
-            self.logger.info("Getting current temperature")
+                  description="获取教室当前温度（多教室模式下可指定教室ID）")
+        async def get_temperature(room: Optional[str] = None, wait_seconds: Optional[float] = None):
+            """获取最新温度数据
+            
+            Args:
+                room: 教室ID (可选，默认CLASSROOM_ID)
+                wait_seconds: 尚无数据时等待第一条数据的秒数 (可选，默认SENSOR_FIRST_VALUE_WAIT，0表示不等待)
+            """
+            self.logger.info(f"Getting current temperature for room {room or self.layout.default_room}")
+            try:
+                room = self.layout.validate_room(room)
+            except ValueError as e:
+                return {"error": str(e)}
             
             # 延迟设置MQTT客户端（非阻塞）
             self._setup_mqtt_client()
+            self._sync_ingest()
             
-            # 检查是否有历史数据（即使MQTT还未连接）
-            temp_topic = self.topics["temperature"]
-            if temp_topic in self.message_history and self.message_history[temp_topic]:
-                latest_msg = self.message_history[temp_topic][-1]
-                try:
-                    # 解析JSON数据，支持数组和对象格式
-                    payload_data = json.loads(latest_msg["payload"])
-                    
-                    # 如果是数组，取第一个元素
-                    if isinstance(payload_data, list) and len(payload_data) > 0:
-                        payload_data = payload_data[0]
-                    
-                    # 提取温度值
-                    temperature = payload_data.get("temperature")
-                    if temperature is not None:
-                        return {
-                            "success": True,
-                            "temperature": temperature,
-                            "unit": payload_data.get("unit", "°C"),
-                            "timestamp": latest_msg["timestamp"],
-                            "sensor_id": payload_data.get("sensor_id", "classroom-temp-sensor"),
-                            "message": f"当前教室温度: {temperature}°C"
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "raw_data": latest_msg["payload"],
-                            "timestamp": latest_msg["timestamp"],
-                            "message": "温度数据格式异常"
-                        }
-                except json.JSONDecodeError:
+            # 检查是否有最新值（即使MQTT还未连接），启动后尚无数据时等待第一条数据
+            waited_ms = await self._await_first_value(room, ("temperature",), wait_seconds)
+            latest = self.room_state.get(room, "temperature")
+            if latest is not None:
+                if latest.ok:
+                    self.connection.record_first_answer()
                     return {
-                        "success": False,
-                        "raw_data": latest_msg["payload"],
-                        "timestamp": latest_msg["timestamp"],
-                        "message": "JSON解析失败"
+                        "success": True,
+                        "room": room,
+                        "temperature": latest.value,
+                        "unit": latest.unit,
+                        "timestamp": latest.timestamp,
+                        "sensor_id": latest.device_id,
+                        "waited_ms": waited_ms,
+                        "message": f"当前{self._place(room)}温度: {latest.value}°C"
                     }
+                return {
+                    "success": False,
+                    "raw_data": latest.raw,
+                    "timestamp": latest.timestamp,
+                    "message": "JSON解析失败" if latest.error == ERROR_JSON else "温度数据格式异常"
+                }
             else:
                 # 提供连接状态信息
                 mqtt_status = "已连接" if self.mqtt_connected else "连接中"
                 return {
                     "success": False,
                     "mqtt_status": mqtt_status,
-                    "message": f"暂无温度数据，MQTT状态: {mqtt_status}。请等待传感器发送数据"
+                    "room": room,
+                    "message": f"{self._place(room)}暂无温度数据，MQTT状态: {mqtt_status}。请等待传感器发送数据"
                 }
 
         @mcp.tool(name="get_humidity", 
-                  description="获取教室当前湿度")
-        async def get_humidity():
-            """获取最新湿度数据"""
-            self.logger.info("Getting current humidity")
+                  description="获取教室当前湿度（多教室模式下可指定教室ID）")
+        async def get_humidity(room: Optional[str] = None, wait_seconds: Optional[float] = None):
+            """获取最新湿度数据
+            
+            Args:
+                room: 教室ID (可选，默认CLASSROOM_ID)
+                wait_seconds: 尚无数据时等待第一条数据的秒数 (可选，默认SENSOR_FIRST_VALUE_WAIT，0表示不等待)
+            """
+            self.logger.info(f"Getting current humidity for room {room or self.layout.default_room}")
+            try:
+                room = self.layout.validate_room(room)
+            except ValueError as e:
+                return {"error": str(e)}
             
             # 尝试设置MQTT客户端（非阻塞）
             self._setup_mqtt_client()
+            self._sync_ingest()
             
-            # 检查是否有历史数据（即使MQTT还未连接）
-            humidity_topic = self.topics["humidity"]
-            if humidity_topic in self.message_history and self.message_history[humidity_topic]:
-                latest_msg = self.message_history[humidity_topic][-1]
-                try:
-                    # 解析JSON数据，支持数组和对象格式
-                    payload_data = json.loads(latest_msg["payload"])
-                    
-                    # 如果是数组，取第一个元素
-                    if isinstance(payload_data, list) and len(payload_data) > 0:
-                        payload_data = payload_data[0]
-                    
-                    # 提取湿度值
-                    humidity = payload_data.get("humidity")
-                    if humidity is not None:
-                        return {
-                            "success": True,
-                            "humidity": humidity,
-                            "unit": payload_data.get("unit", "%"),
-                            "timestamp": latest_msg["timestamp"],
-                            "sensor_id": payload_data.get("sensor_id", "classroom-humidity-sensor"),
-                            "message": f"当前教室湿度: {humidity}%"
-                        }
-                    else:
-                        # 检查是否有错误信息
-                        if "error" in payload_data:
-                            return {
-                                "success": False,
-                                "error": payload_data["error"],
-                                "timestamp": latest_msg["timestamp"],
-                                "message": "湿度传感器数据错误"
-                            }
-                        return {
-                            "success": False,
-                            "raw_data": latest_msg["payload"],
-                            "timestamp": latest_msg["timestamp"],
-                            "message": "湿度数据格式异常"
-                        }
-                except json.JSONDecodeError:
+            # 检查是否有最新值（即使MQTT还未连接），启动后尚无数据时等待第一条数据
+            waited_ms = await self._await_first_value(room, ("humidity",), wait_seconds)
+            latest = self.room_state.get(room, "humidity")
+            if latest is not None:
+                if latest.ok:
+                    self.connection.record_first_answer()
+                    return {
+                        "success": True,
+                        "room": room,
+                        "humidity": latest.value,
+                        "unit": latest.unit,
+                        "timestamp": latest.timestamp,
+                        "sensor_id": latest.device_id,
+                        "waited_ms": waited_ms,
+                        "message": f"当前{self._place(room)}湿度: {latest.value}%"
+                    }
+                if latest.error == ERROR_DEVICE:
                     return {
                         "success": False,
-                        "raw_data": latest_msg["payload"],
-                        "timestamp": latest_msg["timestamp"],
-                        "message": "JSON解析失败"
+                        "error": latest.detail,
+                        "timestamp": latest.timestamp,
+                        "message": "湿度传感器数据错误"
                     }
+                return {
+                    "success": False,
+                    "raw_data": latest.raw,
+                    "timestamp": latest.timestamp,
+                    "message": "JSON解析失败" if latest.error == ERROR_JSON else "湿度数据格式异常"
+                }
             else:
                 # 提供连接状态信息
                 mqtt_status = "已连接" if self.mqtt_connected else "连接中"
                 return {
                     "success": False,
                     "mqtt_status": mqtt_status,
-                    "message": f"暂无湿度数据，MQTT状态: {mqtt_status}。请等待传感器发送数据"
+                    "room": room,
+                    "message": f"{self._place(room)}暂无湿度数据，MQTT状态: {mqtt_status}。请等待传感器发送数据"
                 }
 
         @mcp.tool(name="set_ac_power", 
                   description="控制空调开关")
-        async def set_ac_power(power: bool):
+        async def set_ac_power(power: bool, room: Optional[str] = None,
+                               queue_ttl: Optional[float] = None):
             """控制空调开关
             
             Args:
                 power: True=开启, False=关闭
+                room: 教室ID (可选，默认CLASSROOM_ID)
+                queue_ttl: MQTT未连接时命令在离线队列中的有效期（秒，可选，默认AC_OUTBOX_TTL）
             """
             self.logger.info(f"Setting AC power to: {power}")
+            try:
+                room = self.layout.validate_room(room)
+            except ValueError as e:
+                return {"error": str(e)}
             
             # 尝试设置MQTT客户端（非阻塞）
             self._setup_mqtt_client()
-            
-            # 检查MQTT连接状态
-            if not self.mqtt_connected:
-                return {
-                    "success": False,
-                    "mqtt_status": "连接中",
-                    "message": "MQTT连接中，请稍后重试空调控制"
-                }
+            self._sync_ingest()
             
             # 构造控制命令
-            command = {
-                "command": "set_power",
-                "value": power,
-                "timestamp": datetime.now().isoformat(),
-                "device": "classroom-ac-controller"
-            }
+            command = self._ac_command("set_power", power, room)
+            
+            # MQTT未连接时加入离线队列
+            if not self.mqtt_connected:
+                return self._queue_response(room, command, queue_ttl)
             
             try:
-                # 发送控制命令
-                result = self.mqtt_client.publish(
-                    self.topics["ac_control"], 
-                    json.dumps(command), 
-                    qos=1
-                )
-                
-                if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                    return {
-                        "success": True,
-                        "message": f"空调已{'开启' if power else '关闭'}",
-                        "command": command
-                    }
-                else:
-                    return {"error": f"发送命令失败: {result.rc}"}
+                # 经调度器合并后发送，并等待broker确认(PUBACK)，只进入本地发送队列不算成功
+                outcome = await self.scheduler.submit(room, ATTRIBUTE_POWER, power, command,
+                                                      queue_ttl=queue_ttl)
+                return self._command_response(outcome, command, f"{self._place(room)}空调已{'开启' if power else '关闭'}")
                     
             except Exception as e:
                 self.logger.error(f"Error controlling AC power: {str(e)}")
@@ -297,13 +676,20 @@ class TemperatureControlTools:
 
         @mcp.tool(name="set_ac_temperature", 
                   description="设置空调目标温度")
-        async def set_ac_temperature(temperature: float):
+        async def set_ac_temperature(temperature: float, room: Optional[str] = None,
+                                     queue_ttl: Optional[float] = None):
             """设置空调目标温度
             
             Args:
                 temperature: 目标温度 (18-28°C)
+                room: 教室ID (可选，默认CLASSROOM_ID)
+                queue_ttl: MQTT未连接时命令在离线队列中的有效期（秒，可选，默认AC_OUTBOX_TTL）
             """
             self.logger.info(f"Setting AC target temperature to: {temperature}°C")
+            try:
+                room = self.layout.validate_room(room)
+            except ValueError as e:
+                return {"error": str(e)}
             
             # 温度范围检查 - 使用配置的范围
             if not (AC_TEMP_MIN <= temperature <= AC_TEMP_MAX):
@@ -311,142 +697,94 @@ class TemperatureControlTools:
             
             # 尝试设置MQTT客户端（非阻塞）
             self._setup_mqtt_client()
-            
-            # 检查MQTT连接状态
-            if not self.mqtt_connected:
-                return {
-                    "success": False,
-                    "mqtt_status": "连接中",
-                    "message": "MQTT连接中，请稍后重试空调控制"
-                }
+            self._sync_ingest()
             
             # 构造控制命令
-            command = {
-                "command": "set_temperature",
-                "value": temperature,
-                "unit": "°C",
-                "timestamp": datetime.now().isoformat(),
-                "device": "classroom-ac-controller"
-            }
+            command = self._ac_command("set_temperature", temperature, room, unit="°C")
+            
+            # MQTT未连接时加入离线队列
+            if not self.mqtt_connected:
+                return self._queue_response(room, command, queue_ttl)
             
             try:
-                # 发送控制命令
-                result = self.mqtt_client.publish(
-                    self.topics["ac_control"], 
-                    json.dumps(command), 
-                    qos=1
-                )
-                
-                if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                    return {
-                        "success": True,
-                        "message": f"空调目标温度已设置为 {temperature}°C",
-                        "command": command
-                    }
-                else:
-                    return {"error": f"发送命令失败: {result.rc}"}
+                # 经调度器合并后发送，并等待broker确认(PUBACK)，只进入本地发送队列不算成功
+                outcome = await self.scheduler.submit(room, ATTRIBUTE_TEMPERATURE, temperature, command,
+                                                      queue_ttl=queue_ttl)
+                return self._command_response(outcome, command, f"{self._place(room)}空调目标温度已设置为 {temperature}°C")
                     
             except Exception as e:
                 self.logger.error(f"Error setting AC temperature: {str(e)}")
                 return {"error": str(e)}
 
         @mcp.tool(name="get_ac_status", 
-                  description="检查空调当前状态")
-        async def get_ac_status():
-            """获取空调当前状态"""
-            self.logger.info("Getting AC status")
+                  description="检查空调当前状态（多教室模式下可指定教室ID）")
+        async def get_ac_status(room: Optional[str] = None, wait_seconds: Optional[float] = None):
+            """获取空调当前状态
+            
+            Args:
+                room: 教室ID (可选，默认CLASSROOM_ID)
+                wait_seconds: 尚无状态数据时等待第一条数据的秒数 (可选，默认SENSOR_FIRST_VALUE_WAIT，0表示不等待)
+            """
+            self.logger.info(f"Getting AC status for room {room or self.layout.default_room}")
+            try:
+                room = self.layout.validate_room(room)
+            except ValueError as e:
+                return {"error": str(e)}
             
             # 尝试设置MQTT客户端（非阻塞）
             self._setup_mqtt_client()
+            self._sync_ingest()
             
-            # 从消息历史中获取最新的空调状态数据
-            power_topic = self.topics["ac_power_status"]
-            temp_topic = self.topics["ac_temperature_status"]
-            
+            # 从最新值表中读取空调状态数据，启动后尚无数据时等待第一条状态消息
+            await self._await_first_value(room, ("ac_power_status", "ac_temperature_status"), wait_seconds)
             status_data = {}
             
-            # 获取空调电源状态 - 使用与传感器相同的逻辑
-            if power_topic in self.message_history and self.message_history[power_topic]:
-                latest_power_msg = self.message_history[power_topic][-1]
-                try:
-                    # 解析JSON数据，支持数组和对象格式
-                    payload_data = json.loads(latest_power_msg["payload"])
-                    
-                    # 如果是数组，取第一个元素
-                    if isinstance(payload_data, list) and len(payload_data) > 0:
-                        payload_data = payload_data[0]
-                    
-                    # 提取电源状态值 - 支持多种字段名
-                    power_status = payload_data.get("power", payload_data.get("status", payload_data.get("ac_status")))
-                    if power_status is not None:
-                        status_data["power"] = {
-                            "status": power_status,
-                            "timestamp": latest_power_msg["timestamp"],
-                            "device_id": payload_data.get("device_id", "classroom-ac")
-                        }
-                    else:
-                        status_data["power"] = {
-                            "success": False,
-                            "raw_data": latest_power_msg["payload"],
-                            "timestamp": latest_power_msg["timestamp"],
-                            "message": "电源状态数据格式异常"
-                        }
-                except json.JSONDecodeError:
+            # 获取空调电源状态
+            power = self.room_state.get(room, "ac_power_status")
+            if power is not None:
+                if power.ok:
+                    status_data["power"] = {
+                        "status": power.value,
+                        "timestamp": power.timestamp,
+                        "device_id": power.device_id
+                    }
+                else:
                     status_data["power"] = {
                         "success": False,
-                        "raw_data": latest_power_msg["payload"],
-                        "timestamp": latest_power_msg["timestamp"],
-                        "message": "电源状态JSON解析失败"
+                        "raw_data": power.raw,
+                        "timestamp": power.timestamp,
+                        "message": "电源状态JSON解析失败" if power.error == ERROR_JSON else "电源状态数据格式异常"
                     }
             
-            # 获取空调温度状态 - 使用与传感器相同的逻辑
-            if temp_topic in self.message_history and self.message_history[temp_topic]:
-                latest_temp_msg = self.message_history[temp_topic][-1]
-                try:
-                    # 解析JSON数据，支持数组和对象格式
-                    payload_data = json.loads(latest_temp_msg["payload"])
-                    
-                    # 如果是数组，取第一个元素
-                    if isinstance(payload_data, list) and len(payload_data) > 0:
-                        payload_data = payload_data[0]
-                    
-                    # 提取温度状态值
-                    target_temp = payload_data.get("target_temperature", payload_data.get("temperature"))
-                    if target_temp is not None:
-                        status_data["temperature"] = {
-                            "target_temperature": target_temp,
-                            "unit": payload_data.get("unit", "°C"),
-                            "timestamp": latest_temp_msg["timestamp"],
-                            "device_id": payload_data.get("device_id", "classroom-ac")
-                        }
-                    else:
-                        # 检查是否有错误信息
-                        if "error" in payload_data:
-                            status_data["temperature"] = {
-                                "success": False,
-                                "error": payload_data["error"],
-                                "timestamp": latest_temp_msg["timestamp"],
-                                "message": "空调温度状态数据错误"
-                            }
-                        else:
-                            status_data["temperature"] = {
-                                "success": False,
-                                "raw_data": latest_temp_msg["payload"],
-                                "timestamp": latest_temp_msg["timestamp"],
-                                "message": "温度状态数据格式异常"
-                            }
-                except json.JSONDecodeError:
+            # 获取空调温度状态
+            target = self.room_state.get(room, "ac_temperature_status")
+            if target is not None:
+                if target.ok:
+                    status_data["temperature"] = {
+                        "target_temperature": target.value,
+                        "unit": target.unit,
+                        "timestamp": target.timestamp,
+                        "device_id": target.device_id
+                    }
+                elif target.error == ERROR_DEVICE:
                     status_data["temperature"] = {
                         "success": False,
-                        "raw_data": latest_temp_msg["payload"],
-                        "timestamp": latest_temp_msg["timestamp"],
-                        "message": "温度状态JSON解析失败"
+                        "error": target.detail,
+                        "timestamp": target.timestamp,
+                        "message": "空调温度状态数据错误"
+                    }
+                else:
+                    status_data["temperature"] = {
+                        "success": False,
+                        "raw_data": target.raw,
+                        "timestamp": target.timestamp,
+                        "message": "温度状态JSON解析失败" if target.error == ERROR_JSON else "温度状态数据格式异常"
                     }
             
             # 构造返回结果 - 使用与传感器相同的结构
             if status_data:
                 # 构造状态消息
-                status_message = "空调状态: "
+                status_message = f"{self._place(room)}空调状态: " if self.layout.multi_room else "空调状态: "
                 
                 # 检查电源状态
                 if "power" in status_data:
@@ -464,8 +802,10 @@ class TemperatureControlTools:
                     elif "message" in status_data["temperature"]:
                         status_message += f", 温度状态异常 ({status_data['temperature']['message']})"
                 
+                self.connection.record_first_answer()
                 return {
                     "success": True,
+                    "room": room,
                     "status": status_data,
                     "message": status_message,
                     "device": "classroom-ac-controller"
@@ -476,5 +816,247 @@ class TemperatureControlTools:
                 return {
                     "success": False,
                     "mqtt_status": mqtt_status,
-                    "message": f"暂无空调状态数据，MQTT状态: {mqtt_status}。请等待系统发送状态信息或控制空调后重试"
+                    "room": room,
+                    "message": f"{self._place(room)}暂无空调状态数据，MQTT状态: {mqtt_status}。请等待系统发送状态信息或控制空调后重试"
                 }
+
+        @mcp.tool(name="get_sensor_stats", 
+                  description="获取教室温度或湿度在一段时间内的最小值、最大值、平均值和分时段统计")
+        async def get_sensor_stats(topic: str = "temperature", window: str = "1h",
+                                   resolution: Optional[str] = None, room: Optional[str] = None):
+            """获取传感器时间窗口统计
+            
+            Args:
+                topic: "temperature"、"humidity" 或完整的传感器主题
+                window: 时间窗口，如 30m、1h、24h、7d (默认1h)
+                resolution: 时间桶粒度 1m、15m 或 1h (可选，默认按窗口自动选择)
+                room: 教室ID (可选，默认CLASSROOM_ID，topic为完整主题时忽略)
+            
+            Returns:
+                MCPResponse: 窗口汇总和每个时间桶的min/max/avg/count/last
+            """
+            self._setup_mqtt_client()
+            self._sync_ingest()
+            
+            now = time.time()
+            try:
+                sensor_topic, window_seconds = self._resolve_sensor_window(topic, window, room)
+                stats = self.rollups.query(sensor_topic, window_seconds, resolution, now=now)
+            except ValueError as e:
+                return {"error": str(e)}
+            
+            if stats is None or not stats["buckets"]:
+                return {
+                    "success": False,
+                    "topic": sensor_topic,
+                    "message": f"最近{window}内暂无{topic}数据"
+                }
+            result = {
+                "success": True,
+                **stats
+            }
+            # 列式存储可用时补充窗口内精确的分布统计（标准差和分位数）
+            if self.series_store is not None:
+                result["distribution"] = self.series_store.stats(sensor_topic, since=now - window_seconds)
+            return result
+
+        @mcp.tool(name="get_sensor_range", 
+                  description="获取教室温度或湿度在一段时间内的读数序列（点数过多时降采样）")
+        async def get_sensor_range(topic: str = "temperature", window: str = "1h", max_points: int = 200,
+                                   room: Optional[str] = None):
+            """获取传感器读数序列
+            
+            Args:
+                topic: "temperature"、"humidity" 或完整的传感器主题
+                window: 时间窗口，如 30m、1h、24h (默认1h)
+                max_points: 最多返回的点数，超过时按等宽时间段降采样 (默认200)
+                room: 教室ID (可选，默认CLASSROOM_ID，topic为完整主题时忽略)
+            
+            Returns:
+                MCPResponse: [时间戳, 均值, 最小值, 最大值] 点序列
+            """
+            if self.series_store is None:
+                return {"error": "Columnar store unavailable: install numpy (pip install emqx-mcp-server[columnar])"}
+            self._setup_mqtt_client()
+            self._sync_ingest()
+            
+            try:
+                sensor_topic, window_seconds = self._resolve_sensor_window(topic, window, room)
+            except ValueError as e:
+                return {"error": str(e)}
+            
+            series = self.series_store.range(sensor_topic, since=time.time() - window_seconds,
+                                             max_points=max(1, max_points))
+            if series is None:
+                return {"success": False, "topic": sensor_topic, "message": f"最近{window}内暂无{topic}数据"}
+            return {
+                "success": True,
+                "topic": sensor_topic,
+                "window_seconds": window_seconds,
+                "columns": ["timestamp", "avg", "min", "max"],
+                **series
+            }
+
+        @mcp.tool(name="get_sensor_trend", 
+                  description="分析教室温度或湿度在一段时间内的变化趋势（每小时变化量）")
+        async def get_sensor_trend(topic: str = "temperature", window: str = "1h",
+                                   room: Optional[str] = None):
+            """获取传感器线性趋势
+            
+            Args:
+                topic: "temperature"、"humidity" 或完整的传感器主题
+                window: 时间窗口，如 30m、1h、24h (默认1h)
+                room: 教室ID (可选，默认CLASSROOM_ID，topic为完整主题时忽略)
+            
+            Returns:
+                MCPResponse: 每小时变化量、拟合优度和起止拟合值
+            """
+            if self.series_store is None:
+                return {"error": "Columnar store unavailable: install numpy (pip install emqx-mcp-server[columnar])"}
+            self._setup_mqtt_client()
+            self._sync_ingest()
+            
+            try:
+                sensor_topic, window_seconds = self._resolve_sensor_window(topic, window, room)
+            except ValueError as e:
+                return {"error": str(e)}
+            
+            trend = self.series_store.trend(sensor_topic, since=time.time() - window_seconds)
+            if trend is None:
+                return {"success": False, "topic": sensor_topic, "message": f"最近{window}内{topic}数据不足以计算趋势"}
+            
+            slope = trend["slope_per_hour"]
+            direction = "上升" if slope > 0.05 else "下降" if slope < -0.05 else "基本稳定"
+            return {
+                "success": True,
+                "topic": sensor_topic,
+                "window_seconds": window_seconds,
+                **trend,
+                "message": f"最近{window}{topic}{direction}，每小时变化 {slope:+.2f}"
+            }
+
+        @mcp.tool(name="list_rooms", 
+                  description="列出已上报数据的教室及其最新温度、湿度和空调状态，以及各类数据的解析失败次数")
+        async def list_rooms(like: Optional[str] = None, limit: int = 100, offset: int = 0):
+            """列出教室
+            
+            Args:
+                like: 教室ID包含的子串 (可选)
+                limit: 最多返回的教室数量 (默认100)
+                offset: 跳过的教室数量，用于分页 (默认0)
+            
+            Returns:
+                MCPResponse: 教室总数和每个教室的最新状态汇总
+            """
+            self._setup_mqtt_client()
+            self._sync_ingest()
+            
+            rooms = self.room_state.rooms()
+            if like:
+                rooms = [room for room in rooms if like in room]
+            page = rooms[max(0, offset):max(0, offset) + max(0, limit)]
+            index_stats = self.room_state.stats()
+            return {
+                "success": True,
+                "multi_room": self.layout.multi_room,
+                "default_room": self.layout.default_room,
+                "total": len(rooms),
+                "offset": offset,
+                "rooms": [self._room_summary(room) for room in page],
+                # 接收时解析失败的消息数（按数据类型），在这里集中暴露
+                "parse_failures": index_stats["parse_failures"],
+                "total_parse_failures": index_stats["total_parse_failures"],
+                "message": f"共有{len(rooms)}个教室上报了数据"
+            }
+
+        @mcp.tool(name="set_ac_power_bulk", 
+                  description="批量开关多个教室的空调（教室列表或通配符选择器，如 b1-*），返回每个教室的确认结果")
+        async def set_ac_power_bulk(power: bool, rooms: Optional[List[str]] = None,
+                                    selector: Optional[str] = None, window: Optional[int] = None,
+                                    dry_run: bool = False):
+            """批量控制空调开关
+            
+            Args:
+                power: True=开启, False=关闭
+                rooms: 教室ID列表 (可选)
+                selector: 匹配已知教室ID的通配符，如 "b1-*" 或 "*" (可选)
+                window: 同时等待确认的最大命令数 (可选，默认MQTT_MAX_INFLIGHT)
+                dry_run: 只返回匹配的教室，不发送命令 (默认False)
+            
+            Returns:
+                MCPResponse: 总耗时和每个教室的broker确认结果
+            """
+            self.logger.info(f"Setting AC power to {power} for rooms={rooms} selector={selector}")
+            return await self._publish_ac_bulk("set_power", power, rooms, selector, window, dry_run)
+
+        @mcp.tool(name="set_ac_temperature_bulk", 
+                  description="批量设置多个教室的空调目标温度（教室列表或通配符选择器），返回每个教室的确认结果")
+        async def set_ac_temperature_bulk(temperature: float, rooms: Optional[List[str]] = None,
+                                          selector: Optional[str] = None, window: Optional[int] = None,
+                                          dry_run: bool = False):
+            """批量设置空调目标温度
+            
+            Args:
+                temperature: 目标温度 (18-28°C)
+                rooms: 教室ID列表 (可选)
+                selector: 匹配已知教室ID的通配符，如 "b1-*" 或 "*" (可选)
+                window: 同时等待确认的最大命令数 (可选，默认MQTT_MAX_INFLIGHT)
+                dry_run: 只返回匹配的教室，不发送命令 (默认False)
+            
+            Returns:
+                MCPResponse: 总耗时和每个教室的broker确认结果
+            """
+            self.logger.info(f"Setting AC target temperature to {temperature}°C for rooms={rooms} selector={selector}")
+            if not (AC_TEMP_MIN <= temperature <= AC_TEMP_MAX):
+                return {"error": f"温度必须在{AC_TEMP_MIN}-{AC_TEMP_MAX}°C范围内"}
+            return await self._publish_ac_bulk("set_temperature", temperature, rooms, selector,
+                                               window, dry_run, unit="°C")
+
+        @mcp.tool(name="get_ac_roundtrip_stats", 
+                  description="统计空调命令从发出到状态主题反映新值的往返耗时(p50/p95/p99)和未收敛命令数，用于调整eKuiper规则bufferLength和EdgeX AutoEvent间隔")
+        async def get_ac_roundtrip_stats():
+            """获取空调命令往返统计
+            
+            Returns:
+                MCPResponse: 电源和温度命令的往返耗时分位数（毫秒）、收敛/未收敛/被覆盖的命令数
+            """
+            self._sync_ingest()
+            stats = self.roundtrip.stats(time.time())
+            
+            message = f"已发出{stats['issued']}条命令，{stats['converged']}条已收敛，{stats['non_converged']}条超过{stats['timeout_seconds']:g}秒未收敛"
+            power = stats["round_trip_ms"][ATTRIBUTE_POWER]
+            if power["count"]:
+                message += f"；电源命令往返p95 {power['p95']}ms"
+            return {
+                "success": True,
+                **stats,
+                "message": message
+            }
+
+        @mcp.tool(name="get_ac_command_stats", 
+                  description="获取空调命令合并统计（提交、实际发送、被合并和空操作抑制的命令数）和离线队列状态（队列深度、入队到确认的耗时）")
+        async def get_ac_command_stats():
+            """获取空调命令调度和离线队列统计
+            
+            Returns:
+                MCPResponse: 合并窗口、各类命令计数和节省的下游写入(MQTT发布/eKuiper动作/EdgeX命令)，
+                离线队列深度、过期/覆盖计数和入队到broker确认的耗时分位数（毫秒）
+            """
+            stats = self.scheduler.stats()
+            message = f"提交{stats['submitted']}条命令，实际发送{stats['sent']}条，节省{stats['saved_writes']}次下游写入"
+            outbox = None
+            if self.outbox is not None:
+                self.outbox.expire(time.time())
+                outbox = {
+                    **self.outbox.stats(),
+                    "flush_latency_ms": self.outbox_flush_ms.snapshot(),
+                    "last_drain": self.last_drain
+                }
+                message += f"；离线队列中有{outbox['depth']}条命令"
+            return {
+                "success": True,
+                "scheduler": stats,
+                "outbox": outbox,
+                "mqtt_status": "已连接" if self.mqtt_connected else "连接中",
+                "message": message
+            }
@@ -0,0 +1,274 @@
+"""
+MQTT主题字典树模块
+
+按主题层级建立字典树，完整支持MQTT通配符语义：
+- "+" 匹配恰好一个层级（可以为空层级）
+- "#" 匹配任意多个层级（包括父层级本身），只能出现在最后
+- 以"$"开头的主题不会被首层的通配符匹配
+
+TopicTrie 保存过滤器（可含通配符），用于把具体主题分发给匹配的消费者；
+TopicIndex 保存具体主题，用于按过滤器查询已存储的主题。
+两者的开销都只与匹配到的分支有关，而不是与主题总数成正比。
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+SINGLE_LEVEL = "+"
+MULTI_LEVEL = "#"
+
+
+def is_wildcard(topic_filter: str) -> bool:
+    """判断过滤器是否包含通配符"""
+    return SINGLE_LEVEL in topic_filter or MULTI_LEVEL in topic_filter
+
+
+def validate_filter(topic_filter: str) -> None:
+    """校验主题过滤器格式，不合法时抛出ValueError"""
+    if not topic_filter:
+        raise ValueError("Topic filter must not be empty")
+    levels = topic_filter.split("/")
+    for index, level in enumerate(levels):
+        if MULTI_LEVEL in level and (level != MULTI_LEVEL or index != len(levels) - 1):
+            raise ValueError(f"'#' must occupy a whole level at the end of the filter: {topic_filter}")
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(f"'+' must occupy a whole level: {topic_filter}")
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """判断具体主题是否匹配过滤器（逐个比较，用于单次判断）"""
+    if topic.startswith("$") and topic_filter[:1] in (SINGLE_LEVEL, MULTI_LEVEL):
+        return False
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(filter_levels):
+        if level == MULTI_LEVEL:
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != SINGLE_LEVEL and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class _Node:
+    """字典树节点"""
+
+    __slots__ = ("children", "values", "terminal")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.values: List[Any] = []
+        self.terminal = False
+
+
+class TopicTrie:
+    """
+    过滤器字典树
+
+    保存(过滤器, 值)映射，match()返回所有匹配某个具体主题的过滤器对应的值。
+    """
+
+    def __init__(self) -> None:
+        """初始化过滤器字典树"""
+        self._root = _Node()
+        self._count = 0
+
+    def insert(self, topic_filter: str, value: Any) -> None:
+        """添加一个过滤器及其对应的值"""
+        validate_filter(topic_filter)
+        node = self._root
+        for level in topic_filter.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+        node.values.append(value)
+        self._count += 1
+
+    def remove(self, topic_filter: str, value: Any = None) -> int:
+        """
+        移除过滤器对应的值
+
+        Args:
+            topic_filter: 主题过滤器
+            value: 要移除的值，为空时移除该过滤器的全部值
+
+        Returns:
+            int: 移除的值数量
+        """
+        path = [self._root]
+        for level in topic_filter.split("/"):
+            node = path[-1].children.get(level)
+            if node is None:
+                return 0
+            path.append(node)
+
+        node = path[-1]
+        if value is None:
+            removed = len(node.values)
+            node.values.clear()
+        else:
+            before = len(node.values)
+            node.values[:] = [v for v in node.values if v != value]
+            removed = before - len(node.values)
+        self._count -= removed
+
+        # 清理空分支
+        levels = topic_filter.split("/")
+        for depth in range(len(levels), 0, -1):
+            child = path[depth]
+            if child.values or child.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+        return removed
+
+    def match(self, topic: str) -> List[Any]:
+        """返回所有匹配具体主题的过滤器对应的值"""
+        results: List[Any] = []
+        levels = topic.split("/")
+        self._match(self._root, levels, 0, results, topic.startswith("$"))
+        return results
+
+    def has_match(self, topic: str) -> bool:
+        """判断是否有任何过滤器匹配具体主题"""
+        return bool(self.match(topic))
+
+    def filters(self) -> List[str]:
+        """列出所有已注册的过滤器"""
+        return [topic_filter for topic_filter, _ in _walk(self._root, [], lambda n: bool(n.values))]
+
+    def _match(self, node: _Node, levels: List[str], depth: int, results: List[Any],
+               system_topic: bool) -> None:
+        wildcards_allowed = not (depth == 0 and system_topic)
+        if wildcards_allowed:
+            multi = node.children.get(MULTI_LEVEL)
+            if multi is not None:
+                results.extend(multi.values)
+        if depth == len(levels):
+            results.extend(node.values)
+            return
+        child = node.children.get(levels[depth])
+        if child is not None:
+            self._match(child, levels, depth + 1, results, system_topic)
+        if wildcards_allowed:
+            single = node.children.get(SINGLE_LEVEL)
+            if single is not None:
+                self._match(single, levels, depth + 1, results, system_topic)
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class TopicIndex:
+    """
+    具体主题索引
+
+    保存具体主题，match()按MQTT过滤器返回匹配的主题。
+    """
+
+    def __init__(self) -> None:
+        """初始化主题索引"""
+        self._root = _Node()
+        self._count = 0
+
+    def add(self, topic: str) -> bool:
+        """添加一个具体主题，已存在时返回False"""
+        node = self._root
+        for level in topic.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+        if node.terminal:
+            return False
+        node.terminal = True
+        self._count += 1
+        return True
+
+    def discard(self, topic: str) -> bool:
+        """移除一个具体主题，不存在时返回False"""
+        levels = topic.split("/")
+        path = [self._root]
+        for level in levels:
+            node = path[-1].children.get(level)
+            if node is None:
+                return False
+            path.append(node)
+        if not path[-1].terminal:
+            return False
+        path[-1].terminal = False
+        self._count -= 1
+        for depth in range(len(levels), 0, -1):
+            child = path[depth]
+            if child.terminal or child.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+        return True
+
+    def match(self, topic_filter: str, limit: Optional[int] = None) -> List[str]:
+        """
+        返回匹配过滤器的所有具体主题
+
+        Args:
+            topic_filter: MQTT主题过滤器（支持+和#）
+            limit: 最多返回的主题数量
+        """
+        validate_filter(topic_filter)
+        results: List[str] = []
+        self._match(self._root, topic_filter.split("/"), 0, [], results, limit)
+        return results
+
+    def _match(self, node: _Node, levels: List[str], depth: int, prefix: List[str],
+               results: List[str], limit: Optional[int]) -> None:
+        if limit is not None and len(results) >= limit:
+            return
+        if depth == len(levels):
+            if node.terminal:
+                results.append("/".join(prefix))
+            return
+        level = levels[depth]
+        if level == MULTI_LEVEL:
+            # "#" 同时匹配父层级本身
+            if depth > 0 and node.terminal:
+                results.append("/".join(prefix))
+            for topic, _ in _walk(node, prefix, lambda n: n.terminal,
+                                  skip_system=depth == 0):
+                if limit is not None and len(results) >= limit:
+                    return
+                results.append(topic)
+            return
+        if level == SINGLE_LEVEL:
+            for name, child in node.children.items():
+                if depth == 0 and name.startswith("$"):
+                    continue
+                self._match(child, levels, depth + 1, prefix + [name], results, limit)
+            return
+        exact = node.children.get(level)
+        if exact is not None:
+            self._match(exact, levels, depth + 1, prefix + [level], results, limit)
+
+    def __contains__(self, topic: object) -> bool:
+        if not isinstance(topic, str):
+            return False
+        node = self._root
+        for level in topic.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                return False
+            node = child
+        return node.terminal
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def _walk(node: _Node, prefix: List[str], accept, skip_system: bool = False) -> Iterator:
+    """深度优先遍历子树，返回(主题, 节点)"""
+    stack = [(child, prefix + [name]) for name, child in node.children.items()
+             if not (skip_system and name.startswith("$"))]
+    while stack:
+        current, path = stack.pop()
+        if accept(current):
+            yield "/".join(path), current
+        for name, child in current.children.items():
+            stack.append((child, path + [name]))
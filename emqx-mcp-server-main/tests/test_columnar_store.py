@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证NumPy列式存储的批量写入、窗口切片和向量化统计
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import statistics
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from emqx_mcp_server.columnar_store import ColumnarStore, NumericSeries
+
+
+def test_stats_and_range_match_plain_python():
+    """窗口统计与逐条计算一致，超过max_points时降采样为每段的均值/最小/最大"""
+    store = ColumnarStore(batch_size=64)
+    readings = [(1000.0 + i, 20 + (i % 11) * 0.5) for i in range(5000)]
+    for ts, value in readings:
+        store.add("classroom/temperature", value, ts)
+
+    window = [v for ts, v in readings if ts >= 4000.0]
+    stats = store.stats("classroom/temperature", since=4000.0)
+    assert stats["count"] == len(window)
+    assert stats["min"] == min(window)
+    assert stats["max"] == max(window)
+    assert stats["mean"] == round(statistics.fmean(window), 3)
+    assert stats["std"] == round(statistics.pstdev(window), 3)
+    assert stats["last"] == readings[-1][1]
+    assert store.stats("classroom/temperature", since=10_000.0) is None
+    assert store.stats("classroom/humidity") is None
+
+    series = store.range("classroom/temperature", since=4000.0, max_points=100)
+    assert series["count"] == len(window)
+    assert len(series["points"]) == 100
+    assert min(p[2] for p in series["points"]) == min(window)
+    assert max(p[3] for p in series["points"]) == max(window)
+    assert len(store.range("classroom/temperature", since=5990.0)["points"]) == 10
+
+
+def test_trend_slope_per_hour():
+    """线性上升的读数得到正确的每小时变化量"""
+    store = ColumnarStore()
+    for i in range(121):
+        store.add("classroom/temperature", 20 + i * 0.01, i * 30.0)  # 每30秒上升0.01度
+    trend = store.trend("classroom/temperature")
+    assert trend["slope_per_hour"] == pytest.approx(1.2)
+    assert trend["r_squared"] == pytest.approx(1.0)
+    assert trend["end_value"] == pytest.approx(21.2)
+    assert store.trend("classroom/temperature", since=3600.0) is None  # 只有一个点
+
+
+def test_series_bounded_and_monotonic():
+    """超过max_points时丢弃最旧数据，乱序时间戳被抬升以保持有序"""
+    series = NumericSeries(max_points=1000, batch_size=7, initial_capacity=16)
+    for i in range(10_000):
+        series.append(float(i), float(i))
+    series.append(5.0, -1.0)  # 迟到读数
+
+    ts, values = series.window()
+    assert len(series) == len(ts) == 1000
+    assert ts[0] == 9001.0 and ts[-1] == 9999.0
+    assert values[-1] == -1.0
+    assert np.all(np.diff(ts) >= 0)
+    assert len(series._ts) <= 2000
+
+    series.extend(np.arange(10_000.0, 10_500.0), np.zeros(500))
+    ts, _ = series.window(since=9999.0, until=10_010.0)
+    assert len(ts) == 13  # 包含被抬升到9999的迟到读数
+
+
+def test_total_budget_shared_across_topics():
+    """有总点数预算时，新主题加入后每个主题的上限降为平均份额，旧数据被裁剪"""
+    store = ColumnarStore(max_points=1000, batch_size=10, total_points=1200)
+    for i in range(1000):
+        store.add("a", float(i), float(i))
+    assert len(store.series("a")) == 1000
+    store.add("b", 1.0, 1.0)
+    store.add("c", 1.0, 1.0)
+    assert store.points_per_topic() == 400
+    ts, _ = store.series("a").window()
+    assert len(ts) == 400 and ts[0] == 600.0
+    assert len(store.series("a")._ts) <= 800
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证离线命令发件箱的覆盖、容量、过期和文件恢复
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+import logging
+
+from emqx_mcp_server.command_outbox import CommandOutbox
+
+LOGGER = logging.getLogger("test_command_outbox")
+
+
+def _put(outbox, room, attribute, value, **kwargs):
+    return outbox.put(room, attribute, f"classroom/{room}/control/ac", f'{{"value": {value}}}', **kwargs)
+
+
+def test_later_command_overwrites_and_moves_to_end():
+    """同一设备同一属性的新命令覆盖旧命令，并按最新入队顺序发送"""
+    outbox = CommandOutbox(LOGGER)
+    _put(outbox, "r1", "temperature", 22, now=100.0)
+    _put(outbox, "r2", "power", "true", now=101.0)
+    _put(outbox, "r1", "temperature", 25, now=102.0)
+    entries = outbox.take(now=103.0)
+    assert [(entry.room, entry.payload) for entry in entries] == [
+        ("r2", '{"value": true}'), ("r1", '{"value": 25}')]
+    assert outbox.stats()["replaced"] == 1
+
+
+def test_capacity_and_per_command_ttl():
+    """容量已满时拒绝新设备的命令；每条命令按自己的有效期过期"""
+    outbox = CommandOutbox(LOGGER, max_size=2, ttl=60)
+    _put(outbox, "r1", "power", "true", ttl=5, now=0.0)
+    _put(outbox, "r2", "power", "true", now=0.0)
+    assert _put(outbox, "r3", "power", "true", now=1.0) is None
+    # 已在队列中的设备可以覆盖
+    assert _put(outbox, "r2", "power", "false", now=1.0) is not None
+    assert [entry.room for entry in outbox.take(now=10.0)] == ["r2"]
+    assert outbox.stats()["expired"] == 1
+    assert outbox.stats()["rejected"] == 1
+
+
+def test_complete_keeps_newer_command():
+    """发送期间被新命令覆盖时，complete不移除新命令"""
+    outbox = CommandOutbox(LOGGER)
+    first = _put(outbox, "r1", "power", "true", now=0.0)
+    _put(outbox, "r1", "power", "false", now=1.0)
+    assert outbox.complete(first) is False
+    assert len(outbox) == 1
+    assert outbox.complete(outbox.take(now=2.0)[0]) is True
+    assert len(outbox) == 0
+
+
+def test_file_replay_restores_pending_commands(tmp_path):
+    """重启后从追加文件恢复尚未发送的命令，已确认和被覆盖的命令不再恢复"""
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = CommandOutbox(LOGGER, path)
+    sent = _put(outbox, "r1", "power", "true")
+    _put(outbox, "r2", "temperature", 22)
+    _put(outbox, "r2", "temperature", 24)
+    _put(outbox, "r3", "power", "false")
+    outbox.complete(sent)
+    outbox.close()
+    # 模拟写入中断留下的半行
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "seq": 9')
+
+    restored = CommandOutbox(LOGGER, path)
+    assert [(entry.room, entry.payload) for entry in restored.take()] == [
+        ("r2", '{"value": 24}'), ("r3", '{"value": false}')]
+    # 恢复时文件被重写为只包含存活的命令，新命令的序号继续递增
+    assert restored.stats()["file_records"] == 2
+    assert _put(restored, "r4", "power", "true").seq == 5
+    restored.close()
+
+
+def test_replay_skips_malformed_records(tmp_path):
+    """字段缺失或类型错误的记录在恢复时被跳过，不影响其他命令"""
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = CommandOutbox(LOGGER, path)
+    _put(outbox, "r1", "power", "true")
+    outbox.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "seq": 7, "room": "r2"}\n')
+        f.write('{"op": "put", "seq": "x", "room": "r3"}\n')
+        f.write('[1, 2]\n')
+        f.write('{"op": "put", "seq": 8, "room": "r4", "attribute": "power", "topic": "t", '
+                '"payload": "p", "queued_at": "bad", "expires_at": 1}\n')
+
+    restored = CommandOutbox(LOGGER, path)
+    assert [entry.room for entry in restored.take()] == ["r1"]
+    restored.close()
+
+
+def test_records_in_one_loop_tick_share_one_fsync(tmp_path, monkeypatch):
+    """事件循环中同一轮写入的多条记录只做一次fsync"""
+    outbox = CommandOutbox(LOGGER, str(tmp_path / "outbox.jsonl"))
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd) or real_fsync(fd))
+
+    async def run():
+        for i in range(50):
+            _put(outbox, f"r{i}", "power", "true")
+        assert calls == []
+        await asyncio.sleep(0)
+        assert len(calls) == 1
+
+    asyncio.run(run())
+    outbox.close()
+
+
+def test_expiry_skips_replaced_commands():
+    """被覆盖的旧命令不会按旧的过期时间被移除"""
+    outbox = CommandOutbox(LOGGER, ttl=60)
+    _put(outbox, "r1", "power", "true", ttl=5, now=0.0)
+    _put(outbox, "r1", "power", "false", now=1.0)
+    assert outbox.expire(now=10.0) == 0
+    assert [entry.payload for entry in outbox.take(now=10.0)] == ['{"value": false}']
+    assert outbox.expire(now=61.0) == 1
+    assert outbox.stats()["depth"] == 0
+
+
+def test_command_routed_to_outbox_when_disconnected_at_flush():
+    """合并窗口结束时MQTT已断开，命令转入离线队列并使用调用方的有效期"""
+    from emqx_mcp_server.connection_manager import MQTTConnectionManager
+    from emqx_mcp_server.tools.temperature_control_tools import TemperatureControlTools
+
+    async def run():
+        tools = TemperatureControlTools(LOGGER, MQTTConnectionManager(LOGGER))
+        tools.outbox = CommandOutbox(LOGGER)
+        command = tools._ac_command("set_power", True, tools.layout.default_room)
+        outcome = await tools._send_ac_command(tools.layout.default_room, command, queue_ttl=30)
+        return tools, tools._command_response(outcome, command, "ok")
+
+    tools, response = asyncio.run(run())
+    assert response["queued"] is True and response["acknowledged"] is False
+    assert response["expires_in_seconds"] == 30
+    assert len(tools.outbox) == 1
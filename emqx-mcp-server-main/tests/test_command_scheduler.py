@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证空调命令合并和空操作抑制
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+
+from emqx_mcp_server.command_scheduler import CommandScheduler
+
+
+def _scheduler(window, status=None):
+    sent = []
+
+    async def send(room, command):
+        sent.append((room, command["value"]))
+        return {"success": True, "acked": True, "latency_ms": 1.0}
+
+    def is_noop(room, attribute, value):
+        return status is not None and status.get((room, attribute)) == value
+
+    return CommandScheduler(send, window, is_noop), sent
+
+
+def test_last_write_wins_within_window():
+    """第一条命令立即发送；窗口内后续的连续设置只发送最后一个值，先到的调用得到被合并的结果"""
+    async def run():
+        scheduler, sent = _scheduler(window=0.05)
+        results = await asyncio.gather(
+            scheduler.submit("r1", "temperature", 22, {"value": 22}),
+            scheduler.submit("r1", "temperature", 23, {"value": 23}),
+            scheduler.submit("r2", "temperature", 26, {"value": 26}),
+            scheduler.submit("r1", "temperature", 24, {"value": 24}))
+
+        assert sent == [("r1", 22), ("r2", 26), ("r1", 24)]
+        assert results[0]["acked"] is True
+        assert results[1] == {"success": True, "coalesced": True, "superseded_by": 24}
+        assert results[3]["acked"] is True
+        stats = scheduler.stats()
+        assert stats["submitted"] == 4 and stats["sent"] == 3
+        assert stats["saved_writes"] == 1 and stats["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_noop_suppressed_and_supersede():
+    """状态已是目标值时不发送；被批量命令覆盖的等待命令不再发送"""
+    async def run():
+        scheduler, sent = _scheduler(window=0, status={("r1", "power"): True})
+        assert await scheduler.submit("r1", "power", True, {"value": True}) == {"success": True, "no_op": True}
+        await scheduler.submit("r1", "power", False, {"value": False})
+        assert sent == [("r1", False)]
+
+        scheduler, sent = _scheduler(window=0.05)
+        await scheduler.submit("r1", "power", False, {"value": False})
+        pending = asyncio.ensure_future(scheduler.submit("r1", "power", True, {"value": True}))
+        await asyncio.sleep(0)
+        assert scheduler.supersede("r1", "power", False)
+        assert (await pending)["superseded_by"] is False
+        await asyncio.sleep(0.1)
+        assert sent == [("r1", False)]
+        assert scheduler.stats()["saved_writes"] == 1
+
+    asyncio.run(run())
+
+
+def test_isolated_command_is_sent_without_waiting():
+    """窗口外的单条命令立即发送，不等待合并窗口；发送参数传给send"""
+    async def run():
+        options = []
+
+        async def send(room, command, **kwargs):
+            options.append(kwargs)
+            return {"success": True}
+
+        scheduler = CommandScheduler(send, window=10)
+        started = asyncio.get_running_loop().time()
+        assert await scheduler.submit("r1", "power", True, {"value": True}, queue_ttl=30) == {"success": True}
+        assert asyncio.get_running_loop().time() - started < 1
+        assert options == [{"queue_ttl": 30}]
+        assert scheduler.stats()["pending"] == 0
+        # 关闭窗口，避免事件循环结束时仍有未完成的任务
+        assert scheduler.supersede("r1", "power", True) is False
+
+    asyncio.run(run())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证EMQX HTTP API客户端的连接池复用
+"""
+
+import sys
+import os
+import asyncio
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import httpx
+
+from emqx_mcp_server.emqx_client import EMQXClient
+
+
+def _install_mock_transport(client, handler):
+    """用MockTransport替换连接池，保留客户端的默认请求头"""
+    client._http_client = httpx.AsyncClient(headers=client._get_auth_header(),
+                                            transport=httpx.MockTransport(handler))
+    client._http_client_loop = asyncio.get_running_loop()
+
+
+def test_requests_share_one_pooled_client():
+    """多次调用复用同一个AsyncClient，并带上预先计算好的认证头"""
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json={"data": [], "meta": {"count": 0}})
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        _install_mock_transport(client, handler)
+        pooled = client._get_http_client()
+        for page in range(1, 4):
+            assert await client.list_clients({"page": page}) == {"data": [], "meta": {"count": 0}}
+        assert client._get_http_client() is pooled
+        await client.aclose()
+        assert pooled.is_closed
+        assert client._http_client is None
+
+    asyncio.run(scenario())
+    assert len(seen) == 3
+    assert all(r.headers["Authorization"].startswith("Basic ") for r in seen)
+
+
+def test_client_recreated_on_new_event_loop():
+    """在新的事件循环中使用时重新创建连接池"""
+    client = EMQXClient(logging.getLogger("test"))
+
+    async def get_pool():
+        return client._get_http_client()
+
+    first = asyncio.run(get_pool())
+    second = asyncio.run(get_pool())
+    assert first is not second
+    asyncio.run(client.aclose())
+
+
+def test_publish_batch_reports_per_message_results():
+    """批量发布按块发送，按输入顺序返回每条消息的结果"""
+    import json
+    chunks = []
+
+    def handler(request):
+        chunk = json.loads(request.content)
+        chunks.append(chunk)
+        if chunk[0]["topic"] == "room/4":
+            return httpx.Response(503, text="service unavailable")
+        return httpx.Response(200, json=[
+            {"reason_code": 16, "message": "no_matching_subscribers"} if m["topic"] == "room/1"
+            else {"id": f"id-{m['topic']}"} for m in chunk
+        ])
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        _install_mock_transport(client, handler)
+        messages = [{"topic": f"room/{i}", "payload": "on"} for i in range(5)]
+        return await client.publish_batch(messages, chunk_size=2, concurrency=2)
+
+    result = asyncio.run(scenario())
+    assert sorted(len(c) for c in chunks) == [1, 2, 2]
+    assert result["requests"] == 3
+    assert (result["published"], result["failed"]) == (3, 2)
+    assert [r["index"] for r in result["results"]] == [0, 1, 2, 3, 4]
+    assert result["results"][0] == {"index": 0, "topic": "room/0", "success": True, "id": "id-room/0"}
+    assert result["results"][1]["reason_code"] == 16
+    assert "503" in result["results"][4]["error"]
+
+
+def test_iter_clients_fetches_remaining_pages_concurrently():
+    """首页给出总数后并发拉取其余页面，每个客户端只返回一次"""
+    requested = []
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        limit = int(request.url.params["limit"])
+        requested.append(page)
+        ids = range((page - 1) * limit, min(page * limit, 25))
+        return httpx.Response(200, json={
+            "data": [{"clientid": f"c{i}"} for i in ids],
+            "meta": {"count": 25, "page": page, "limit": limit}
+        })
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        _install_mock_transport(client, handler)
+        return [c["clientid"] async for c in client.iter_clients({"page": 7}, page_size=10)]
+
+    clients = asyncio.run(scenario())
+    assert sorted(requested) == [1, 2, 3]
+    assert sorted(clients) == sorted(f"c{i}" for i in range(25))
+
+
+def test_cached_lookups_are_invalidated_by_kick():
+    """客户端详情在TTL内命中缓存，踢出客户端后重新查询"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if request.method == "DELETE":
+            return httpx.Response(204)
+        return httpx.Response(200, json={"clientid": "dev-1", "connected": len(calls) == 1})
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        client.cache.ttl = 60
+        _install_mock_transport(client, handler)
+        first, second = await asyncio.gather(client.get_client_info("dev-1"),
+                                             client.get_client_info("dev-1"))
+        assert first is second
+        assert (await client.kick_client("dev-1"))["success"]
+        return await client.get_client_info("dev-1"), client.cache.stats()
+
+    after_kick, stats = asyncio.run(scenario())
+    assert calls == ["GET", "DELETE", "GET"]
+    assert after_kick["connected"] is False
+    assert stats["misses"] == 2
+
+
+def test_iter_clients_can_bypass_cache():
+    """use_cache=False时每次都查询broker，不读也不写缓存"""
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.params["page"])
+        return httpx.Response(200, json={"data": [{"clientid": f"c{len(requested)}"}],
+                                         "meta": {"count": 1, "page": 1, "limit": 10}})
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        client.cache.ttl = 60
+        _install_mock_transport(client, handler)
+        cached = [c["clientid"] async for c in client.iter_clients()]
+        fresh = [c["clientid"] async for c in client.iter_clients(use_cache=False)]
+        again = [c["clientid"] async for c in client.iter_clients()]
+        return cached, fresh, again
+
+    cached, fresh, again = asyncio.run(scenario())
+    assert (cached, fresh, again) == (["c1"], ["c2"], ["c1"])
+    assert len(requested) == 2
+
+
+def test_kick_clients_fans_out_with_bounded_concurrency():
+    """批量踢出时同时进行的请求数不超过并发上限，重复ID只处理一次"""
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.005)
+        state["active"] -= 1
+        if request.url.path.endswith("/missing"):
+            return httpx.Response(404, json={"code": "CLIENTID_NOT_FOUND"})
+        return httpx.Response(204)
+
+    async def scenario():
+        client = EMQXClient(logging.getLogger("test"))
+        client.api_url = "http://emqx.test/api/v5"
+        _install_mock_transport(client, handler)
+        ids = [f"dev-{i}" for i in range(20)] + ["dev-0", "missing"]
+        return await client.kick_clients(ids, concurrency=4)
+
+    results = asyncio.run(scenario())
+    assert len(results) == 21
+    assert state["peak"] == 4
+    assert results["dev-3"]["success"] is True
+    assert "error" in results["missing"]
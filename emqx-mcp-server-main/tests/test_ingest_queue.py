@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证网络线程到事件循环的消息交接队列
+"""
+
+import sys
+import os
+import asyncio
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.ingest_queue import IngestQueue, OVERFLOW_DROP_NEWEST
+
+
+def test_priority_lane_survives_sensor_flood():
+    """普通通道溢出时优先通道的消息不会被丢弃，并且先被处理"""
+    applied = []
+    queue = IngestQueue(applied.append, maxsize=3)
+    queue.put("ac-status", priority=True)
+    for i in range(10):
+        queue.put(f"sensor-{i}")
+
+    assert queue.drain() == 4
+    assert applied == ["ac-status", "sensor-7", "sensor-8", "sensor-9"]
+    assert queue.stats()["dropped"] == 7
+    assert queue.stats()["priority_dropped"] == 0
+
+
+def test_drop_newest_policy_rejects_new_messages():
+    """drop_newest策略下队列已满时拒绝新消息"""
+    applied = []
+    queue = IngestQueue(applied.append, maxsize=2, overflow_policy=OVERFLOW_DROP_NEWEST)
+    assert queue.put(1) and queue.put(2)
+    assert not queue.put(3)
+
+    queue.drain()
+    assert applied == [1, 2]
+
+
+def test_event_loop_drains_messages_from_network_thread():
+    """网络线程放入的消息由事件循环分批处理"""
+    applied = []
+
+    async def run():
+        queue = IngestQueue(applied.append, batch_size=100)
+        queue.bind_loop(asyncio.get_running_loop())
+        producer = threading.Thread(target=lambda: [queue.put(i) for i in range(1000)])
+        producer.start()
+        producer.join()
+        for _ in range(100):
+            if queue.backlog() == 0 and len(applied) == 1000:
+                break
+            await asyncio.sleep(0.01)
+        return queue
+
+    queue = asyncio.run(run())
+    assert applied == list(range(1000))
+    assert queue.stats()["drained"] == 1000
+
+
+def test_failing_handler_does_not_stall_the_queue():
+    """单条消息处理失败时计数并继续处理同一批的其他消息，之后的消息仍会被调度"""
+    applied = []
+
+    def handler(item):
+        if item == 1:
+            raise RuntimeError("bad message")
+        applied.append(item)
+
+    async def run():
+        queue = IngestQueue(handler, batch_size=100)
+        queue.bind_loop(asyncio.get_running_loop())
+        for i in range(4):
+            queue.put(i)
+        await asyncio.sleep(0.01)
+        for i in range(4, 8):
+            queue.put(i)
+        await asyncio.sleep(0.01)
+        return queue
+
+    queue = asyncio.run(run())
+    assert applied == [0, 2, 3, 4, 5, 6, 7]
+    stats = queue.stats()
+    assert (stats["errors"], stats["drained"], stats["backlog"]) == (1, 8, 0)
+    assert not queue._drain_scheduled
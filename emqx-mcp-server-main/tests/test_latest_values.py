@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证最新值的一次性解析和按教室索引
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+import json
+import logging
+import time
+
+import pytest
+from mcp.server.fastmcp import FastMCP
+
+from emqx_mcp_server.latest_values import (FieldExtractor, RoomStateIndex, RoomTopicLayout,
+                                           ERROR_JSON, ERROR_FORMAT, ERROR_DEVICE)
+from emqx_mcp_server.connection_manager import MQTTConnectionManager
+from emqx_mcp_server.tools.temperature_control_tools import TemperatureControlTools
+
+
+def _room_index(multi_room):
+    layout = RoomTopicLayout("classroom", {"temperature": "temperature", "humidity": "humidity",
+                                           "ac_power_status": "ac/power/status"},
+                             "classroom_01", multi_room=multi_room)
+    index = RoomStateIndex(layout)
+    index.register("temperature", FieldExtractor(("temperature",), default_unit="°C"))
+    index.register("humidity", FieldExtractor(("humidity",), default_unit="%", device_field="sensor_id",
+                                              report_device_error=True))
+    index.register("ac_power_status", FieldExtractor(("power", "status", "ac_status"),
+                                                     default_device="classroom-ac"))
+    return index
+
+
+def _ingest(index, topic, payload, received_at=1.0):
+    room, kind, record = index.parse(topic, payload, received_at, "t")
+    index.update(room, kind, record)
+    return record
+
+
+def test_extracts_fallback_fields_from_array_payload():
+    """数组取第一个元素，并按顺序尝试候选字段名"""
+    index = _room_index(multi_room=False)
+    record = _ingest(index, "classroom/ac/power/status", '[{"ac_status": false}]')
+
+    assert record.ok
+    assert record.value is False
+    assert record.device_id == "classroom-ac"
+    assert index.get("classroom_01", "ac_power_status") is record
+
+
+def test_failures_counted_once_at_ingest():
+    """解析失败在接收时按数据类型计数，读取不会重复解析"""
+    index = _room_index(multi_room=False)
+    assert _ingest(index, "classroom/humidity", "not json").error == ERROR_JSON
+    assert _ingest(index, "classroom/humidity", '{"error": "sensor offline"}', 2.0).error == ERROR_DEVICE
+    assert _ingest(index, "classroom/ac/power/status", '{"error": "x"}', 3.0).error == ERROR_FORMAT
+    for _ in range(3):
+        index.get("classroom_01", "humidity")
+
+    assert index.get("classroom_01", "humidity").detail == "sensor offline"
+    stats = index.stats()
+    assert stats["total_parse_failures"] == 3
+    assert stats["parse_failures"] == {"humidity": 2, "ac_power_status": 1}
+
+
+def test_multi_room_layout_indexes_by_room():
+    """多教室模式用一个通配符订阅，消息按教室写入索引"""
+    index = _room_index(multi_room=True)
+    layout = index.layout
+    assert layout.filter("ac_power_status") == "classroom/+/ac/power/status"
+    assert layout.topic("temperature", "r101") == "classroom/r101/temperature"
+
+    for room in range(5000):
+        room_id = f"r{room:04d}"
+        room_id, kind, record = index.parse(f"classroom/{room_id}/temperature",
+                                            f'{{"temperature": {room % 30}}}', 1.0, "t")
+        index.update(room_id, kind, record)
+    assert len(index) == 5000
+    assert index.get("r0042", "temperature").value == 12
+    assert index.get("r0042", "ac_power_status") is None
+    assert index.rooms()[:2] == ["r0000", "r0001"]
+
+    assert index.parse("classroom/r1/unknown", "{}", 1.0, "t") is None
+    assert index.parse("classroom//temperature", "{}", 1.0, "t") is None
+    assert index.parse("classroomx/r1/temperature", "{}", 1.0, "t") is None
+    assert layout.validate_room(None) == "classroom_01"
+    with pytest.raises(ValueError):
+        layout.validate_room("r1/+")
+
+
+def test_single_room_layout_uses_default_room():
+    """单教室模式保持原来的主题，所有消息属于默认教室"""
+    index = _room_index(multi_room=False)
+    assert index.layout.filter("temperature") == "classroom/temperature"
+    assert index.parse("classroom/ac/power/status", '{"power": true}', 1.0, "t")[:2] == \
+        ("classroom_01", "ac_power_status")
+    assert index.parse("classroom/r1/temperature", "{}", 1.0, "t") is None
+    with pytest.raises(ValueError):
+        index.layout.validate_room("r101")
+
+
+def test_list_rooms_reports_parse_failures():
+    """list_rooms返回接收时统计的解析失败次数"""
+    async def run():
+        logger = logging.getLogger("test_latest_values")
+        tools = TemperatureControlTools(logger, MQTTConnectionManager(logger))
+        mcp = FastMCP("test")
+        tools.register_tools(mcp)
+        message = {"topic": tools.topics["humidity"], "payload": "not json", "timestamp": "t"}
+        tools._apply_latest_value(message, tools._parse_latest_value(message, time.time()))
+        result = await mcp.call_tool("list_rooms", {})
+        return json.loads((result[0] if isinstance(result, tuple) else result)[0].text)
+
+    data = asyncio.run(run())
+    assert data["parse_failures"] == {"humidity": 1}
+    assert data["total_parse_failures"] == 1
+
+
+def test_unparseable_warning_is_truncated_and_tagged(caplog):
+    """解析失败的告警只记录原始内容的前200个字符，并带上主题供日志管道按主题限流"""
+    logger = logging.getLogger("test_latest_values")
+    tools = TemperatureControlTools(logger, MQTTConnectionManager(logger))
+    message = {"topic": tools.topics["humidity"], "payload": "x" * 1000, "timestamp": "t"}
+    with caplog.at_level(logging.WARNING, logger="test_latest_values"):
+        tools._parse_latest_value(message, time.time())
+    record = caplog.records[-1]
+    assert record.mqtt_topic == tools.topics["humidity"]
+    assert record.getMessage().endswith("x" * 200)
+    assert len(record.getMessage()) < 300
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证基于队列、按主题限流的日志管道
+"""
+
+import sys
+import os
+import io
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.log_pipeline import LogPipeline, TOPIC_ATTR
+from emqx_mcp_server.server import EMQXMCPServer
+
+
+class _CountingStr:
+    """记录被格式化次数的参数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "payload"
+
+
+def test_rate_limit_per_topic_and_lazy_formatting():
+    """每个主题在窗口内只输出rate条，被抑制的记录不会被格式化"""
+    stream = io.StringIO()
+    pipeline = LogPipeline(rate=2, interval=60, stream=stream)
+    # 不经过根日志记录器，避免pytest的日志捕获处理器格式化记录
+    logger = logging.getLogger("test.log_pipeline.isolated")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.queue_handler)
+    pipeline.listener.start()
+    payload = _CountingStr()
+    try:
+        for _ in range(10):
+            logger.info("Received message from %s: %s", "room/1", payload, extra={TOPIC_ATTR: "room/1"})
+        logger.info("Received message from %s: %s", "room/2", "x", extra={TOPIC_ATTR: "room/2"})
+        logger.info("tool call without topic")
+    finally:
+        logger.removeHandler(pipeline.queue_handler)
+        pipeline.listener.stop()
+
+    lines = stream.getvalue().splitlines()
+    assert sum("room/1" in line for line in lines) == 2
+    assert sum("room/2" in line for line in lines) == 1
+    assert any("tool call without topic" in line for line in lines)
+    assert payload.calls == 2
+    assert pipeline.stats()["suppressed"] == 8
+
+
+def test_suppressed_count_reported_in_next_window():
+    """新窗口的第一条日志报告上个窗口被抑制的数量"""
+    stream = io.StringIO()
+    pipeline = LogPipeline(rate=1, interval=0, stream=stream).start()
+    pipeline.rate_filter.interval = 60
+    logger = logging.getLogger("test.log_pipeline")
+    try:
+        for i in range(4):
+            logger.info("reading %d", i, extra={TOPIC_ATTR: "room/1"})
+        pipeline.rate_filter.interval = 0
+        logger.info("reading %d", 4, extra={TOPIC_ATTR: "room/1"})
+    finally:
+        pipeline.stop()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[-1].endswith("reading 4 [3 similar lines suppressed]")
+
+
+def test_server_logs_only_through_queue():
+    """创建服务器后根日志记录器上只有队列处理器（FastMCP的同步处理器被移除），停止后恢复"""
+    root = logging.getLogger()
+    before = list(root.handlers)
+    server = EMQXMCPServer(tool_groups=["clients"])
+    try:
+        assert root.handlers == [server.log_pipeline.queue_handler]
+    finally:
+        server.log_pipeline.stop()
+    assert server.log_pipeline.queue_handler not in root.handlers
+    assert all(handler in root.handlers for handler in before)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证消息历史环形缓冲区
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.message_history import MessageHistoryStore, TopicRingBuffer
+
+
+def test_ring_buffer_evicts_oldest():
+    """写满后覆盖最旧的消息，顺序保持从旧到新"""
+    buffer = TopicRingBuffer(3)
+    for i in range(5):
+        buffer.append({"n": i})
+
+    assert len(buffer) == 3
+    assert [m["n"] for m in buffer] == [2, 3, 4]
+    assert buffer.latest() == {"n": 4}
+    assert buffer[0] == {"n": 2}
+    assert buffer[-1] == {"n": 4}
+    assert [m["n"] for m in buffer.tail(2)] == [3, 4]
+
+
+def test_store_keeps_history_semantics():
+    """latest/history与原先列表切片的行为一致"""
+    store = MessageHistoryStore(4)
+    reference = []
+    for i in range(10):
+        message = {"timestamp": str(i), "payload": str(i)}
+        store.append("classroom/temperature", message)
+        reference.append(message)
+        reference = reference[-4:]
+        assert store.history("classroom/temperature") == reference
+        assert store.history("classroom/temperature", 2) == reference[-2:]
+        assert store.latest("classroom/temperature") == reference[-1]
+
+    assert "classroom/temperature" in store
+    assert store.latest("classroom/humidity") is None
+    assert store.history("classroom/humidity") == []
+    assert len(store) == 1
+
+
+def test_query_merges_topics_by_time():
+    """跨主题查询按时间从新到旧归并，since按时间截断，limit截断数量"""
+    store = MessageHistoryStore(10)
+    for i in range(6):
+        topic = "classroom/temperature" if i % 2 == 0 else "classroom/humidity"
+        store.append(topic, {"n": i}, timestamp=100.0 + i)
+
+    assert [m["n"] for m in store.query()] == [5, 4, 3, 2, 1, 0]
+    assert [m["n"] for m in store.query(limit=3)] == [5, 4, 3]
+    assert [m["n"] for m in store.query(since=103.0)] == [5, 4, 3]
+    assert [m["n"] for m in store.query(["classroom/humidity"], since=102.0)] == [5, 3]
+    assert store.query(since=200.0) == []
+
+
+def test_out_of_order_timestamps_stay_monotonic():
+    """时钟回拨时时间戳被抬升，二分查找仍然成立"""
+    buffer = TopicRingBuffer(4)
+    buffer.append({"n": 0}, 10.0)
+    buffer.append({"n": 1}, 5.0)
+    buffer.append({"n": 2}, 12.0)
+
+    assert buffer.index_since(10.0) == 0
+    assert [m["n"] for _, m in buffer.iter_newest(11.0)] == [2]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证磁盘消息日志的分段写入、反向指针查询、启动恢复和内存/磁盘归并查询
+"""
+
+import sys
+import os
+import logging
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.message_log import MessageLog
+from emqx_mcp_server.mqtt_base import BaseMQTTClient
+
+
+def _message(topic, payload, qos=0):
+    return {"topic": topic, "payload": payload, "qos": qos, "retain": False}
+
+
+def test_segments_rotate_and_queries_walk_newest_first(tmp_path):
+    """段文件按大小轮转，查询跨段按时间从新到旧返回并支持since/before"""
+    log = MessageLog(str(tmp_path), segment_bytes=2048, index_interval=4)
+    for i in range(300):
+        topic = f"classroom/room_{i % 3}/temperature"
+        log.append(topic, _message(topic, f'{{"temperature": {i}}}', qos=i % 2), timestamp=1000.0 + i)
+
+    assert log.stats()["segments"] > 3
+    newest = log.query(["classroom/room_0/temperature"], limit=3)
+    assert [m["payload"] for m in newest] == ['{"temperature": 297}', '{"temperature": 294}',
+                                              '{"temperature": 291}']
+    assert newest[0]["qos"] == 1
+
+    window = log.query(log.match_topics("classroom/+/temperature"), since=1290.0)
+    assert len(window) == 10
+    assert window[0]["payload"] == '{"temperature": 299}'
+
+    older = log.query(["classroom/room_1/temperature"], limit=2,
+                      before={"classroom/room_1/temperature": 1100.0})
+    assert [m["payload"] for m in older] == ['{"temperature": 97}', '{"temperature": 94}']
+    log.close()
+
+
+def test_reopen_recovers_unsealed_segment_and_torn_tail(tmp_path):
+    """重启后读取已封存的段，未封存的段顺序扫描重建索引并截断残缺的尾部"""
+    log = MessageLog(str(tmp_path), segment_bytes=1024)
+    for i in range(50):
+        log.append("sensor/t", _message("sensor/t", str(i)), timestamp=2000.0 + i)
+    log.flush()
+    active_path = log._active.path
+    # 模拟进程在写入中途退出：不封存当前段，并写入半条记录
+    with open(active_path, "ab") as f:
+        f.write(b"\x00" * 7)
+
+    reopened = MessageLog(str(tmp_path), segment_bytes=1024)
+    assert reopened.stats()["records"] == 50
+    assert [m["payload"] for m in reopened.query(["sensor/t"], limit=2)] == ["49", "48"]
+    reopened.append("sensor/t", _message("sensor/t", "late"), timestamp=1.0)
+    assert reopened.query(["sensor/t"], limit=1)[0]["payload"] == "late"
+    reopened.close()
+
+
+def test_query_history_merges_memory_tail_with_disk(tmp_path):
+    """内存环形缓冲区之外的历史从磁盘日志读取，且不会重复返回"""
+    client = BaseMQTTClient(logging.getLogger("test"))
+    client.message_log = MessageLog(str(tmp_path))
+    for i in range(100):
+        topic = f"room/{i % 2}"
+        client._apply_message((topic, _message(topic, str(i)), 3000.0 + i))
+
+    messages = client.query_history(["room/0", "room/1"], limit=60)
+    payloads = [int(m["payload"]) for m in messages]
+    assert payloads == list(range(99, 39, -1))
+    assert len(client.message_history.history("room/0")) == client.max_history_size
+    assert sorted(client.match_history_topics("room/#")) == ["room/0", "room/1"]
+    client.message_log.close()
+
+
+def test_append_failure_is_counted_and_dispatch_continues(tmp_path):
+    """写入失败时计入统计、历史和消费者照常处理，之后的消息写入新段且偏移量有效"""
+    client = BaseMQTTClient(logging.getLogger("test"))
+    client.message_log = MessageLog(str(tmp_path))
+    received = []
+    client.add_topic_consumer("room/#", received.append)
+    client._apply_message(("room/0", _message("room/0", "0"), 4000.0))
+
+    class _FullDisk:
+        def write(self, data):
+            raise OSError(28, "No space left on device")
+
+        def close(self):
+            raise OSError(28, "No space left on device")
+
+    client.message_log._writer.close()
+    client.message_log._writer = _FullDisk()
+    client._apply_message(("room/0", _message("room/0", "1"), 4001.0))
+    client._apply_message(("room/0", _message("room/0", "2"), 4002.0))
+
+    assert [m["payload"] for m in received] == ["0", "1", "2"]
+    assert len(client.message_history.history("room/0")) == 3
+    stats = client.message_log.stats()
+    assert stats["write_errors"] == 1 and stats["segments"] == 2
+    assert [m["payload"] for m in client.message_log.query(["room/0"], limit=5)] == ["2", "0"]
+    client.message_log.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证滚动延迟直方图和服务器指标注册表
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+import json
+
+import pytest
+
+from emqx_mcp_server.metrics import (Counter, Histogram, HistogramSet, MetricFamily, MetricsRegistry,
+                                     OVERFLOW_LABEL, register_process_metrics)
+from emqx_mcp_server.server import EMQXMCPServer
+
+
+def test_percentiles_within_bucket_resolution():
+    """分位数按桶插值估算，误差不超过所在桶的宽度"""
+    histogram = Histogram(window_seconds=60, slices=6)
+    values = [i / 10 for i in range(1, 1001)]  # 0.1 .. 100 ms 均匀分布
+    for value in values:
+        histogram.observe(value, now=1000.0)
+
+    stats = histogram.snapshot(now=1001.0)
+    assert stats["count"] == 1000
+    assert stats["min"] == 0.1 and stats["max"] == 100.0
+    assert stats["avg"] == pytest.approx(50.05)
+    assert 20 <= stats["p50"] <= 50
+    assert 50 <= stats["p95"] <= 100
+    assert stats["p99"] <= 100.0
+    cumulative = histogram.cumulative()
+    assert cumulative["buckets"][-1] == (float("inf"), 1000)
+    assert dict(cumulative["buckets"])[10] == 100
+
+
+def test_window_rolls_over():
+    """超过滚动窗口的时间片不再计入统计，累计计数保留"""
+    histogram = Histogram(window_seconds=60, slices=6)
+    histogram.observe(5000.0, now=0.0)
+    histogram.observe(1.0, now=65.0)
+
+    stats = histogram.snapshot(now=70.0)
+    assert stats["count"] == 1
+    assert stats["p99"] == 1.0
+    assert stats["lifetime_count"] == 2
+    assert histogram.snapshot(now=500.0)["count"] == 0
+
+
+def test_histogram_set_sorted_and_bounded():
+    """按键分组的直方图按p95排序，键数量有上限"""
+    histograms = HistogramSet(max_keys=3)
+    for index, latency in enumerate((5.0, 80.0, 20.0, 1.0)):
+        histograms.observe(f"classroom/r{index}/control/ac", latency)
+
+    assert len(histograms) == 3
+    assert histograms.get("classroom/r0/control/ac") is None
+    assert list(histograms.snapshot(limit=2)) == ["classroom/r1/control/ac", "classroom/r2/control/ac"]
+
+
+def test_registry_counters_rates_and_prometheus_text():
+    """计数器快照带每秒速率，直方图导出为累计桶；重复注册返回同一指标族"""
+    registry = MetricsRegistry()
+    messages = registry.counter("mqtt_messages_received_total", "Messages", ("topic",))
+    assert registry.counter("mqtt_messages_received_total", "Messages", ("topic",)) is messages
+    with pytest.raises(ValueError):
+        registry.gauge("mqtt_messages_received_total", "Messages")
+    for _ in range(3):
+        messages.labels("a/b").inc()
+    messages.labels("c").inc()
+    registry.histogram("api_ms", "Latency", ("endpoint",), bounds=(1, 10)).labels("/x").observe(5)
+    registry.gauge("depth", "Depth", function=lambda: 7)
+
+    snapshot = registry.snapshot(prefix="mqtt_")
+    values = snapshot["mqtt_messages_received_total"]["values"]
+    assert list(snapshot) == ["mqtt_messages_received_total"]
+    assert values[0]["labels"] == {"topic": "a/b"} and values[0]["value"] == 3
+    assert values[0]["per_second"] > 0
+    # 两次快照之间没有新消息，速率归零
+    assert registry.snapshot(prefix="mqtt_")["mqtt_messages_received_total"]["values"][0]["per_second"] == 0
+
+    text = registry.prometheus_text()
+    assert 'mqtt_messages_received_total{topic="a/b"} 3' in text
+    assert 'api_ms_bucket{endpoint="/x",le="10"} 1' in text
+    assert 'api_ms_bucket{endpoint="/x",le="+Inf"} 1' in text
+    assert "depth 7" in text
+
+
+def test_label_sets_are_capped():
+    """标签组合超过上限后合并到溢出标签下"""
+    family = MetricFamily("t", "t", "counter", ("topic",), Counter, max_children=2)
+    family.labels("a").inc()
+    family.labels("b").inc()
+    family.labels("c").inc()
+    family.labels("d").inc()
+    assert dict(family.children()).keys() == {("a",), ("b",), (OVERFLOW_LABEL,)}
+    assert family.labels(OVERFLOW_LABEL).value == 2
+
+
+def test_process_metrics():
+    """进程CPU时间和常驻内存在导出时读取"""
+    registry = MetricsRegistry()
+    register_process_metrics(registry)
+    snapshot = registry.snapshot()
+    assert snapshot["process_cpu_seconds"]["values"]["value"] > 0
+    assert snapshot["process_resident_memory_bytes"]["values"]["value"] > 1024 * 1024
+
+
+def test_tool_calls_are_timed_and_errors_counted():
+    """每个工具调用记录耗时；返回error字段的调用计为失败，get_server_metrics返回汇总"""
+    server = EMQXMCPServer(tool_groups=[])
+    try:
+        @server.mcp.tool(name="metrics_test_tool")
+        async def metrics_test_tool(fail: bool = False):
+            return {"error": "boom"} if fail else {"success": True}
+
+        async def run():
+            await server.mcp.call_tool("metrics_test_tool", {"fail": False})
+            await server.mcp.call_tool("metrics_test_tool", {"fail": True})
+            return await server.mcp.call_tool("get_server_metrics", {"prefix": "mcp_tool_"})
+
+        result = asyncio.run(run())
+        data = json.loads((result[0] if isinstance(result, tuple) else result)[0].text)
+        summary = data["tools"]["metrics_test_tool"]
+        assert summary["calls"] == 2 and summary["errors"] == 1 and summary["error_rate"] == 0.5
+        assert set(data["metrics"]) == {"mcp_tool_calls_total", "mcp_tool_call_ms"}
+    finally:
+        server.log_pipeline.stop()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证QoS 1发布确认登记和流水线批量发布
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+from emqx_mcp_server.connection_manager import MQTTConnectionManager
+from emqx_mcp_server.publish_tracker import PublishTracker
+
+
+class _AckingClient:
+    """模拟paho客户端：在网络线程中延迟回调on_publish，可以选择不确认某些主题"""
+
+    def __init__(self, manager, delay=0.005, drop_topics=()):
+        self.manager = manager
+        self.delay = delay
+        self.drop_topics = set(drop_topics)
+        self.mid = 0
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self._lock:
+            self.mid += 1
+            mid = self.mid
+            self.outstanding += 1
+            self.max_outstanding = max(self.max_outstanding, self.outstanding)
+        if topic not in self.drop_topics:
+            threading.Timer(self.delay, self._ack, (mid,)).start()
+        return SimpleNamespace(rc=0, mid=mid)
+
+    def _ack(self, mid):
+        with self._lock:
+            self.outstanding -= 1
+        self.manager._on_publish(self, None, mid)
+
+
+def test_tracker_matches_early_and_late_acks():
+    """确认可能早于登记到达；早于发布开始的旧确认不会被误匹配"""
+    async def run():
+        tracker = PublishTracker()
+        tracker.on_publish(7)  # 属于更早的发布
+        started = time.monotonic()
+        stale = tracker.register(7, started)
+        assert not stale.done()
+
+        tracker.on_publish(8)
+        early = tracker.register(8, started)
+        assert early.done()
+
+        threading.Timer(0.01, tracker.on_publish, (7,)).start()
+        assert await asyncio.wait_for(stale, 1) >= started
+        assert tracker.stats()["pending"] == 0
+        assert tracker.stats()["acked"] == 2
+
+    asyncio.run(run())
+
+
+def test_publish_many_respects_window_and_reports_timeouts():
+    """批量发布受在途窗口限制，未确认的消息超时后单独报告"""
+    async def run():
+        manager = MQTTConnectionManager(logging.getLogger("test_publish_tracker"))
+        client = _AckingClient(manager, drop_topics={"classroom/r3/control/ac"})
+        manager.mqtt_client = client
+        messages = [(f"classroom/r{i}/control/ac", "{}") for i in range(40)]
+
+        outcomes = await manager.publish_many(messages, window=8, timeout=0.3)
+
+        assert client.max_outstanding <= 8
+        assert [o["success"] for o in outcomes].count(False) == 1
+        assert outcomes[3]["acked"] is False and "acknowledgement" in outcomes[3]["error"]
+        assert all(o["latency_ms"] >= 0 for i, o in enumerate(outcomes) if i != 3)
+        assert manager.publish_tracker.stats()["abandoned"] == 1
+
+    asyncio.run(run())
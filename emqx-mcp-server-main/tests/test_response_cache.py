@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证只读API响应缓存的TTL、LRU淘汰和并发请求合并
+"""
+
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.response_cache import TTLCache
+
+
+def test_concurrent_identical_requests_share_one_load():
+    """相同键的并发请求只调用一次loader"""
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"data": [1, 2, 3]}
+
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        results = await asyncio.gather(*(cache.get_or_load("clients", loader) for _ in range(5)))
+        cached = await cache.get_or_load("clients", loader)
+        return cache, results, cached
+
+    cache, results, cached = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results + [cached])
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+
+def test_expiry_eviction_and_uncacheable_results():
+    """过期条目重新加载，超出容量淘汰最久未使用的条目，错误响应不缓存"""
+    loads = []
+
+    def loader_for(key, value):
+        async def loader():
+            loads.append(key)
+            return value
+        return loader
+
+    async def scenario():
+        cache = TTLCache(ttl=60, maxsize=2, cacheable=lambda r: "error" not in r)
+        await cache.get_or_load("a", loader_for("a", {"v": 1}))
+        await cache.get_or_load("b", loader_for("b", {"v": 2}))
+        await cache.get_or_load("a", loader_for("a", {"v": 1}))
+        await cache.get_or_load("c", loader_for("c", {"v": 3}))
+        assert "b" not in cache._entries
+        await cache.get_or_load("err", loader_for("err", {"error": "boom"}))
+        await cache.get_or_load("err", loader_for("err", {"error": "boom"}))
+        cache.ttl = 0.001
+        await cache.get_or_load("d", loader_for("d", {"v": 4}))
+        await asyncio.sleep(0.01)
+        await cache.get_or_load("d", loader_for("d", {"v": 4}))
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert loads == ["a", "b", "c", "err", "err", "d", "d"]
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_invalidate_discards_inflight_load():
+    """失效前已开始的请求返回后不写入缓存，之后的调用方重新加载"""
+    loads = []
+
+    async def loader():
+        connected = not loads
+        loads.append(1)
+        await asyncio.sleep(0.02)
+        return {"connected": connected}
+
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        stale = asyncio.ensure_future(cache.get_or_load("client", loader))
+        await asyncio.sleep(0.005)
+        assert cache.invalidate("client")
+        fresh = await cache.get_or_load("client", loader)
+        assert (await stale) == {"connected": True}
+        assert fresh == {"connected": False}
+        assert await cache.get_or_load("client", loader) == {"connected": False}
+        assert not cache._generations and not cache._inflight
+
+    asyncio.run(scenario())
+    assert len(loads) == 2
+
+
+def test_cancelled_loader_does_not_fail_waiters():
+    """发起请求的调用方被取消时，等待同一请求的调用方重新加载而不是收到取消"""
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.02)
+        return {"data": len(loads)}
+
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        first = asyncio.ensure_future(cache.get_or_load("clients", loader))
+        await asyncio.sleep(0.005)
+        waiter = asyncio.ensure_future(cache.get_or_load("clients", loader))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        assert await waiter == {"data": 2}
+        assert first.cancelled()
+
+    asyncio.run(scenario())
+    assert len(loads) == 2
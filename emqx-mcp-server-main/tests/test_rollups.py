@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证温湿度的多粒度时间桶聚合
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pytest
+
+from emqx_mcp_server.rollups import RollupEngine, parse_duration, parse_tiers
+
+
+def test_window_stats_from_buckets():
+    """窗口统计由时间桶合并得到，与逐条计算的结果一致"""
+    engine = RollupEngine()
+    base = 1_700_000_000 - 1_700_000_000 % 3600
+    readings = [(base + i * 10, 20 + (i % 7)) for i in range(720)]  # 2小时，每10秒一条
+    for ts, value in readings:
+        engine.add("classroom/temperature", value, ts)
+
+    now = base + 7200
+    stats = engine.query("classroom/temperature", 3600, now=now)
+    assert stats["resolution"] == "1m"
+    assert len(stats["buckets"]) == 60
+    window = [v for ts, v in readings if ts >= now - 3600]
+    assert stats["summary"]["count"] == len(window)
+    assert stats["summary"]["min"] == min(window)
+    assert stats["summary"]["max"] == max(window)
+    assert stats["summary"]["avg"] == round(sum(window) / len(window), 3)
+    assert stats["summary"]["last"] == readings[-1][1]
+
+    hourly = engine.query("classroom/temperature", 7200, resolution="1h", now=now)
+    assert [b["count"] for b in hourly["buckets"]] == [360, 360]
+    assert engine.pick_resolution(7 * 86400) == "1h"
+
+
+def test_memory_bounded_and_late_readings():
+    """每个粒度只保留固定数量的时间桶，超出保留范围的迟到读数被丢弃"""
+    engine = RollupEngine({"1m": (60, 5)})
+    for minute in range(100):
+        engine.add("t", 1.0, minute * 60.0)
+    engine.add("t", 99.0, 2 * 60.0)
+    engine.add("t", 5.0, 97 * 60.0 + 1)
+
+    assert engine.stats() == {"topics": 1, "max_topics": 0, "evicted_topics": 0, "buckets": 5, "late_dropped": 1}
+    stats = engine.query("t", 600, now=100 * 60.0)
+    assert stats["summary"]["max"] == 5.0
+
+
+def test_parse_duration():
+    assert parse_duration("90s") == 90
+    assert parse_duration("15m") == 900
+    assert parse_duration("2") == 120
+    assert parse_duration("7d") == 7 * 86400
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+
+
+def test_topic_cap_evicts_least_recently_updated():
+    """主题数超过上限时淘汰最久没有读数的主题"""
+    engine = RollupEngine({"1m": (60, 5)}, max_topics=2)
+    engine.add("a", 1.0, 0.0)
+    engine.add("b", 2.0, 0.0)
+    engine.add("a", 3.0, 60.0)
+    engine.add("c", 4.0, 60.0)
+    assert sorted(engine.topics()) == ["a", "c"]
+    assert engine.query("b", 600) is None
+    assert engine.stats()["evicted_topics"] == 1
+
+
+def test_parse_tiers():
+    assert parse_tiers("1m:24h, 1h:30d") == {"1m": (60, 1440), "1h": (3600, 720)}
+    for spec in ("1m", "1h:30m", "90.5s:1h", ""):
+        with pytest.raises(ValueError):
+            parse_tiers(spec)
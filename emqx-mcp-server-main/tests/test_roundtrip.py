@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证空调命令到状态收敛的往返跟踪
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.roundtrip import RoundTripTracker, values_match
+
+
+def test_matches_first_status_reflecting_new_value():
+    """只有反映新值的状态消息才算收敛，之前的旧状态不计入"""
+    tracker = RoundTripTracker(timeout=60)
+    tracker.issue("r101", "power", True, issued_at=1000.0)
+
+    assert tracker.observe("r101", "power", "off", 1000.5) is None  # 旧状态
+    assert tracker.observe("r102", "power", "on", 1000.6) is None   # 其他教室
+    assert tracker.observe("r101", "power", "on", 1002.0) == 2000.0
+    assert tracker.observe("r101", "power", "on", 1003.0) is None   # 已经收敛
+
+    tracker.issue("r101", "temperature", 24, issued_at=1010.0)
+    assert tracker.observe("r101", "temperature", 24.02, 1010.25) == 250.0
+
+    stats = tracker.stats(now=1020.0)
+    assert stats["converged"] == 2 and stats["pending"] == 0
+    assert stats["round_trip_ms"]["power"]["count"] == 1
+    assert stats["round_trip_ms"]["power"]["max"] == 2000.0
+
+
+def test_non_converged_and_superseded_commands():
+    """超时未收敛和被新命令覆盖的命令分别计数，发布失败的命令不计入"""
+    tracker = RoundTripTracker(timeout=30)
+    tracker.issue("r1", "power", True, issued_at=0.0)
+    tracker.issue("r2", "power", True, issued_at=5.0)
+    tracker.issue("r2", "power", False, issued_at=6.0)   # 覆盖r2上一条命令
+    tracker.issue("r3", "temperature", 22, issued_at=7.0)
+    tracker.cancel("r3", "temperature")
+
+    assert tracker.observe("r1", "power", True, 45.0) is None  # 已超时
+    stats = tracker.stats(now=100.0)
+    assert stats["issued"] == 3
+    assert stats["superseded"] == 1
+    assert stats["non_converged"] == 2
+    assert stats["convergence_ratio"] == 0.0
+
+
+def test_value_normalisation():
+    """电源状态兼容布尔、数字和on/off字符串，温度允许微小误差"""
+    assert values_match("power", True, "ON")
+    assert values_match("power", False, 0)
+    assert not values_match("power", True, "unknown")
+    assert values_match("temperature", 24, "24.0")
+    assert not values_match("temperature", 24, 25)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证工具组按需注册和启动导入耗时解析
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+
+import pytest
+
+from emqx_mcp_server.server import EMQXMCPServer
+from emqx_mcp_server.startup_profile import parse_importtime, summarize
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     _io
+import time:       300 |        500 |   encodings.utf_8
+import time:       200 |        700 | encodings
+import time:        50 |         50 |     paho.mqtt.enums
+import time:       400 |        450 |   paho.mqtt.client
+import time:      1000 |       1500 | emqx_mcp_server.mqtt_base
+[INFO] unrelated log line
+"""
+
+
+def test_parse_and_summarize_importtime():
+    """解析嵌套深度，按顶层包汇总自身耗时，只把顶层导入计入总耗时"""
+    records = parse_importtime(IMPORTTIME_OUTPUT)
+    assert [(r.name, r.depth) for r in records][:3] == [("_io", 2), ("encodings.utf_8", 1), ("encodings", 0)]
+    summary = summarize(records, top=2)
+    assert summary["total_ms"] == 2.2
+    assert summary["packages"] == [("emqx_mcp_server", 1.0), ("encodings", 0.5)]
+    assert summary["slowest"][0] == ("emqx_mcp_server.mqtt_base", 1.5, 1.0)
+
+
+def test_only_enabled_tool_groups_are_registered():
+    """只启用HTTP API工具组时不创建MQTT连接，也不注册MQTT工具（服务器指标工具总是注册）"""
+    server = EMQXMCPServer(tool_groups=["messages"])
+    try:
+        assert server.mqtt_connection is None
+        assert server.temperature_control_tools is None
+        assert server.eager_connect is False
+        names = {tool.name for tool in asyncio.run(server.mcp.list_tools())}
+        assert names == {"publish_mqtt_message", "publish_mqtt_messages", "get_server_metrics"}
+    finally:
+        server.log_pipeline.stop()
+
+
+def test_unknown_tool_group_is_rejected():
+    """配置了不存在的工具组时启动失败"""
+    with pytest.raises(ValueError, match="Unknown tool groups: weather"):
+        EMQXMCPServer(tool_groups=["messages", "weather"])
+
+
+def test_lifespan_shutdown_releases_mqtt_and_outbox(tmp_path, monkeypatch):
+    """服务器退出时断开MQTT连接并关闭发件箱文件"""
+    from emqx_mcp_server.command_outbox import CommandOutbox
+
+    server = EMQXMCPServer(tool_groups=["classroom"])
+    try:
+        tools = server.temperature_control_tools
+        tools.outbox = CommandOutbox(tools.logger, str(tmp_path / "outbox.jsonl"))
+        cleanups = []
+        monkeypatch.setattr(server.mqtt_connection, "cleanup", lambda: cleanups.append(True))
+        server.eager_connect = False
+
+        async def run():
+            async with server.mcp.settings.lifespan(server.mcp):
+                pass
+
+        asyncio.run(run())
+        assert cleanups == [True]
+        assert tools.outbox._file is None
+    finally:
+        server.log_pipeline.stop()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证MQTT主题字典树的通配符语义
+"""
+
+import sys
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from emqx_mcp_server.topic_trie import TopicIndex, TopicTrie, topic_matches
+
+TOPICS = [
+    "classroom/temperature",
+    "classroom/room_01/temperature",
+    "classroom/room_02/temperature",
+    "classroom/room_01/humidity",
+    "classroom/ac/power/status",
+    "classroom",
+    "$SYS/broker/uptime",
+]
+
+FILTERS = [
+    "classroom/+/temperature",
+    "classroom/#",
+    "classroom/+",
+    "+/+/humidity",
+    "#",
+    "classroom/ac/+/status",
+    "classroom/temperature",
+    "$SYS/#",
+]
+
+
+def test_index_matches_like_reference():
+    """TopicIndex的查询结果与逐个比较的参考实现一致"""
+    index = TopicIndex()
+    for topic in TOPICS:
+        index.add(topic)
+
+    for topic_filter in FILTERS:
+        expected = sorted(t for t in TOPICS if topic_matches(topic_filter, t))
+        assert sorted(index.match(topic_filter)) == expected, topic_filter
+
+
+def test_trie_dispatches_like_reference():
+    """TopicTrie的分发结果与逐个比较的参考实现一致"""
+    trie = TopicTrie()
+    for topic_filter in FILTERS:
+        trie.insert(topic_filter, topic_filter)
+
+    for topic in TOPICS:
+        expected = sorted(f for f in FILTERS if topic_matches(f, topic))
+        assert sorted(trie.match(topic)) == expected, topic
+
+
+def test_parent_level_and_system_topics():
+    """#匹配父层级本身，通配符不匹配$开头的主题"""
+    assert topic_matches("classroom/#", "classroom")
+    assert not topic_matches("#", "$SYS/broker/uptime")
+    assert not topic_matches("+/broker/uptime", "$SYS/broker/uptime")
+
+
+def test_remove_and_invalid_filters():
+    """移除消费者后不再匹配，非法过滤器被拒绝"""
+    trie = TopicTrie()
+    trie.insert("classroom/+/temperature", "a")
+    trie.insert("classroom/+/temperature", "b")
+    assert trie.remove("classroom/+/temperature", "a") == 1
+    assert trie.match("classroom/r1/temperature") == ["b"]
+    assert trie.remove("classroom/+/temperature") == 1
+    assert len(trie) == 0 and trie.filters() == []
+
+    with pytest.raises(ValueError):
+        trie.insert("classroom/#/temperature", "x")
+    with pytest.raises(ValueError):
+        TopicIndex().match("classroom/room+")
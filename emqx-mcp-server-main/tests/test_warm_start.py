@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+测试脚本：验证启动后查询等待第一条设备数据
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import asyncio
+import json
+import logging
+import time
+
+from emqx_mcp_server.connection_manager import MQTTConnectionManager
+from emqx_mcp_server.tools.temperature_control_tools import TemperatureControlTools
+
+LOGGER = logging.getLogger("test_warm_start")
+
+
+def _deliver(tools, topic, payload):
+    """模拟消息经网络线程解析、事件循环分发"""
+    received_at = time.time()
+    message_data = {"topic": topic, "payload": json.dumps(payload), "timestamp": "2024-01-01T00:00:00"}
+    tools._apply_latest_value(message_data, tools._parse_latest_value(message_data, received_at))
+
+
+def test_query_waits_for_first_value():
+    """尚无数据时等待第一条消息到达，随后立即返回"""
+    async def run():
+        tools = TemperatureControlTools(LOGGER, MQTTConnectionManager(LOGGER))
+        room = tools.layout.default_room
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, _deliver, tools, tools.topics["temperature"], {"temperature": 23.5})
+        waited_ms = await tools._await_first_value(room, ("temperature",), 5.0)
+        assert waited_ms is not None and waited_ms < 1000
+        assert tools.room_state.get(room, "temperature").value == 23.5
+        assert not tools._value_waiters
+        # 已有数据时不再等待
+        assert await tools._await_first_value(room, ("temperature",), 5.0) is None
+
+    asyncio.run(run())
+
+
+def test_wait_times_out_and_any_kind_counts():
+    """超时后返回并清理等待者；等待多种数据时任意一种到达即可"""
+    async def run():
+        tools = TemperatureControlTools(LOGGER, MQTTConnectionManager(LOGGER))
+        room = tools.layout.default_room
+        assert await tools._await_first_value(room, ("humidity",), 0.05) >= 50
+        assert not tools._value_waiters
+        assert await tools._await_first_value(room, ("humidity",), 0) is None
+
+        kinds = ("ac_power_status", "ac_temperature_status")
+        asyncio.get_running_loop().call_later(
+            0.05, _deliver, tools, tools.topics["ac_temperature_status"], {"target_temperature": 24})
+        assert await tools._await_first_value(room, kinds, 5.0) < 1000
+        assert not tools._value_waiters
+
+    asyncio.run(run())